@@ -56,18 +56,21 @@ class DeviceAdmin(admin.ModelAdmin):
         )
     status_indicator.short_description = 'Status'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('gateway', 'state')
+    
     def last_telemetry(self, obj):
-        telemetry = obj.telemetry.order_by('-timestamp').first()
-        if telemetry:
-            return telemetry.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        state = obj.current_state
+        if state:
+            return state.timestamp.strftime('%Y-%m-%d %H:%M:%S')
         return 'No data'
     last_telemetry.short_description = 'Last Data'
 
 
 @admin.register(Telemetry)
 class TelemetryAdmin(admin.ModelAdmin):
-    list_display = ['device_link', 'timestamp', 'payload_summary', 'gateway_info']
-    list_filter = ['timestamp', 'device__type', 'device__gateway']
+    list_display = ['device_link', 'timestamp', 'payload_summary', 'gateway_info', 'is_valid']
+    list_filter = ['timestamp', 'is_valid', 'device__type', 'device__gateway']
     search_fields = ['device__device_id', 'device__name', 'device__gateway__gateway_id']
     readonly_fields = ['timestamp', 'formatted_payload']
     date_hierarchy = 'timestamp'
@@ -108,7 +111,7 @@ class TelemetryAdmin(admin.ModelAdmin):
 
 @admin.register(DeviceModelDefinition)
 class DeviceModelDefinitionAdmin(admin.ModelAdmin):
-    list_display = ['model_id', 'name', 'version', 'device_count']
+    list_display = ['model_id', 'name', 'version', 'ingest_rate', 'ingest_burst', 'device_count']
     search_fields = ['model_id', 'name']
     readonly_fields = ['formatted_schema']
     
@@ -0,0 +1,142 @@
+"""
+PostgreSQL ``COPY`` bulk loading.
+
+``bulk_create`` sends parameterized ``INSERT`` statements: every value is a
+bind parameter the server parses and plans, which caps append-only writes
+well below what PostgreSQL can absorb. :func:`copy_insert` instead
+serializes the rows into an in-memory CSV buffer and streams it with
+psycopg2's ``copy_expert``.
+
+``COPY`` cannot skip conflicting rows, so with ``ignore_conflicts`` the
+rows are copied into a per-connection temporary staging table and moved
+with one ``INSERT ... SELECT ... ON CONFLICT DO NOTHING``, which keeps the
+telemetry dedup constraints working.
+
+On other databases, or without psycopg2, it falls back to ``bulk_create``.
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, Callable, List, Sequence
+
+from django.db import connection, models, transaction
+
+# NULL marker; a text value of exactly \N would load as NULL
+_NULL = "\\N"
+
+
+def copy_supported() -> bool:
+    """Return whether the default database can load rows with ``COPY``."""
+    if connection.vendor != "postgresql":
+        return False
+    try:
+        import psycopg2  # noqa: F401
+    except ImportError:  # pragma: no cover - psycopg 3 has a different COPY API
+        return False
+    return True
+
+
+def copy_fields(model: type) -> List[models.Field]:
+    """Return the columns loaded for ``model``: every concrete field but an auto primary key."""
+    return [
+        field for field in model._meta.concrete_fields
+        if not (field.primary_key and isinstance(field, models.AutoField))
+    ]
+
+
+def copy_insert(
+    model: type,
+    objs: Sequence[models.Model],
+    ignore_conflicts: bool = False,
+    chunk_size: int = 50000,
+) -> int:
+    """
+    Insert unsaved model instances with ``COPY``.
+
+    Field defaults and ``auto_now_add`` values are applied as ``bulk_create``
+    would; primary keys are not set on the instances. Rows are streamed in
+    chunks of ``chunk_size`` to bound the buffer's memory.
+
+    Returns:
+        The number of rows inserted (with ``ignore_conflicts``, conflicting
+        rows are not counted)
+    """
+    if not objs:
+        return 0
+    if not copy_supported():
+        model.objects.bulk_create(objs, batch_size=1000, ignore_conflicts=ignore_conflicts)
+        return len(objs)
+
+    fields = copy_fields(model)
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ", ".join(quote(field.column) for field in fields)
+    formatters = [_formatter(field) for field in fields]
+    options = f"(FORMAT csv, NULL '{_NULL}')"
+
+    # COPY loads every row or fails, so only the staged insert can skip rows
+    inserted = len(objs)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if ignore_conflicts:
+            staging = quote(f"copy_{model._meta.db_table}")
+            # Created once per connection, without the target's constraints and defaults
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} AS SELECT {columns} FROM {table} WITH NO DATA"
+            )
+            target = staging
+        else:
+            target = table
+
+        for start in range(0, len(objs), chunk_size):
+            buffer = _csv_buffer(objs[start:start + chunk_size], fields, formatters)
+            # Django does not wrap copy_expert; raise its DataError/IntegrityError like other queries
+            with connection.wrap_database_errors:
+                cursor.copy_expert(f"COPY {target} ({columns}) FROM STDIN WITH {options}", buffer)
+
+        if ignore_conflicts:
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {target} ON CONFLICT DO NOTHING"
+            )
+            inserted = cursor.rowcount
+            cursor.execute(f"TRUNCATE {target}")
+    return inserted
+
+
+def _csv_buffer(
+    objs: Sequence[models.Model],
+    fields: List[models.Field],
+    formatters: List[Callable[[Any], str]],
+) -> io.StringIO:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for obj in objs:
+        row = []
+        for field, format_value in zip(fields, formatters):
+            # Applies auto_now_add and returns the attribute value
+            value = field.pre_save(obj, True)
+            row.append(_NULL if value is None else format_value(value))
+        writer.writerow(row)
+    buffer.seek(0)
+    return buffer
+
+
+def _formatter(field: models.Field) -> Callable[[Any], str]:
+    if isinstance(field, models.JSONField):
+        encoder = field.encoder
+        return lambda value: json.dumps(value, cls=encoder)
+    if isinstance(field, models.BooleanField):
+        return lambda value: "t" if value else "f"
+    if isinstance(field, (models.DateTimeField, models.DateField)):
+        return _isoformat
+    if isinstance(field, models.FloatField):
+        return repr
+    return str
+
+
+def _isoformat(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
@@ -0,0 +1,179 @@
+"""
+Telemetry payload codecs.
+
+Devices publish JSON by default. Constrained gateways can instead send
+MessagePack (or CBOR) on the ``.bin`` variant of a topic, e.g.
+``devices/{id}/data.bin``, or on the plain topic with an MQTT v5
+``content-type`` property. Binary payloads may use small integer keys in
+place of field names; the mapping comes from ``x-key`` annotations on the
+properties of the device's model schema::
+
+    {"properties": {"temperature": {"type": "number", "x-key": 1}}}
+
+The binary codecs decode straight from the ``bytes`` paho hands over.
+``msgpack`` and ``cbor2`` are optional; without them the binary content
+types are rejected and JSON keeps working. ``NaN`` and infinite numbers are
+rejected by every codec: the database's JSON columns cannot store them.
+"""
+
+import json
+import math
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover - optional dependency
+    cbor2 = None
+
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_MSGPACK = "application/msgpack"
+CONTENT_TYPE_CBOR = "application/cbor"
+
+# Content type assumed for ``.bin`` topics without a content-type property
+DEFAULT_BINARY_CONTENT_TYPE = CONTENT_TYPE_MSGPACK
+
+BINARY_TOPIC_SUFFIX = ".bin"
+
+_ALIASES = {
+    "application/x-msgpack": CONTENT_TYPE_MSGPACK,
+    "application/vnd.msgpack": CONTENT_TYPE_MSGPACK,
+    "text/json": CONTENT_TYPE_JSON,
+}
+
+
+_SCALARS = frozenset({str, int, float, bool, type(None)})
+_KEYS = frozenset({str, int})
+
+
+class PayloadError(ValueError):
+    """Raised when a payload cannot be decoded into telemetry."""
+
+
+def _reject_constant(name: str) -> Any:
+    raise PayloadError(f"non-finite number {name}")
+
+
+def _decode_json(raw: bytes) -> Any:
+    # Faster than json.loads(bytes), which sniffs the UTF flavour first
+    return json.loads(raw.decode("utf-8"), parse_constant=_reject_constant)
+
+
+def _decode_msgpack(raw: bytes) -> Any:
+    if msgpack is None:
+        raise PayloadError("msgpack is not installed")
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+def _decode_cbor(raw: bytes) -> Any:
+    if cbor2 is None:
+        raise PayloadError("cbor2 is not installed")
+    return cbor2.loads(raw)
+
+
+DECODERS: Dict[str, Callable[[bytes], Any]] = {
+    CONTENT_TYPE_JSON: _decode_json,
+    CONTENT_TYPE_MSGPACK: _decode_msgpack,
+    CONTENT_TYPE_CBOR: _decode_cbor,
+}
+
+
+def normalize_content_type(content_type: Optional[str]) -> str:
+    """Lower-case a content type, drop parameters and resolve aliases; defaults to JSON."""
+    if not content_type:
+        return CONTENT_TYPE_JSON
+    base = content_type.split(";", 1)[0].strip().lower()
+    return _ALIASES.get(base, base)
+
+
+def is_binary(content_type: str) -> bool:
+    """Whether payloads of this (normalized) content type need :func:`make_jsonable`."""
+    return content_type != CONTENT_TYPE_JSON
+
+
+def decode_payload(raw: bytes, content_type: Optional[str] = None) -> Any:
+    """
+    Decode a raw MQTT payload.
+
+    Args:
+        raw: Payload bytes as received
+        content_type: MIME type of the payload, JSON when ``None``
+
+    Raises:
+        PayloadError: For unknown content types, missing optional codecs or
+            malformed payloads
+    """
+    if not raw:
+        return {}
+    decoder = DECODERS.get(content_type)
+    if decoder is None:
+        content_type = normalize_content_type(content_type)
+        decoder = DECODERS.get(content_type)
+    if decoder is None:
+        raise PayloadError(f"unsupported content type {content_type}")
+    try:
+        return decoder(raw)
+    except PayloadError:
+        raise
+    except Exception as e:
+        raise PayloadError(f"invalid {content_type} payload: {e!r}") from e
+
+
+def make_jsonable(value: Any) -> Any:
+    """
+    Convert a decoded binary payload into values a JSONField can store.
+
+    Integer map keys are kept (``json.dumps`` writes them as strings, and
+    :func:`expand_keys` names them once the device is known), other
+    non-string keys become strings and CBOR dates become ISO strings. Raw
+    byte strings, non-finite floats and other types JSON cannot represent
+    raise :class:`PayloadError`. Flat maps of scalars, the common case, are
+    returned as they are.
+    """
+    kind = type(value)
+    if kind is float and not math.isfinite(value):
+        raise PayloadError(f"non-finite number {value}")
+    if kind in _SCALARS:
+        return value
+    if kind is dict:
+        for key, item in value.items():
+            if type(item) not in _SCALARS or type(key) not in _KEYS:
+                break
+            if type(item) is float and not math.isfinite(item):
+                break
+        else:
+            return value
+        return {
+            key if type(key) in _KEYS else str(key): make_jsonable(item)
+            for key, item in value.items()
+        }
+    if kind is list or kind is tuple:
+        return [make_jsonable(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise PayloadError(f"unsupported value of type {kind.__name__}")
+
+
+def expand_keys(payload: Dict[Any, Any], key_map: Dict[int, str]) -> Dict[str, Any]:
+    """Replace integer keys of ``payload`` by their field names from ``key_map``."""
+    if not key_map:
+        return payload
+    return {key_map.get(key, key) if isinstance(key, int) else key: value for key, value in payload.items()}
+
+
+def schema_key_map(schema: Dict[str, Any]) -> Dict[int, str]:
+    """Build an integer key map from ``x-key`` annotations in a JSON schema's properties."""
+    key_map = {}
+    properties = schema.get("properties") if isinstance(schema, dict) else None
+    if not isinstance(properties, dict):
+        return key_map
+    for name, spec in properties.items():
+        key = spec.get("x-key") if isinstance(spec, dict) else None
+        if isinstance(key, int) and not isinstance(key, bool):
+            key_map[key] = name
+    return key_map
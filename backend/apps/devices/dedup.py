@@ -0,0 +1,129 @@
+"""
+Duplicate suppression for telemetry ingestion.
+
+QoS 1 redelivery and gateway retries send the same reading more than once.
+Each reading gets a message identity, which is checked against a bounded
+in-memory LRU on the hot path. A unique constraint on
+``(device, message_id, timestamp)`` catches whatever the LRU misses
+(evicted entries, redelivery to another worker), and the bulk insert skips
+those rows with ``ON CONFLICT DO NOTHING``; :func:`drop_stored` checks a
+batch against the table before it is written, so stored readings also stay
+out of the device state and live updates. The timestamp is part of the
+key because the telemetry table is partitioned by it, so the database only
+catches redeliveries that carry the same reading time; an explicit
+``msg_id`` reused with a different ``ts`` relies on the LRU alone.
+
+The identity is, in order of preference:
+
+* an explicit ``msg_id``/``message_id`` from the device,
+* ``<seq>@<ts>`` when the payload carries a sequence number and a timestamp,
+* a hash of the payload when it carries a timestamp.
+
+A payload with none of these has no identity and is never deduplicated: two
+identical readings without a timestamp may well be two real readings.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Optional, Sequence
+
+from .models import Telemetry
+from .timestamps import TIMESTAMP_KEYS
+
+if TYPE_CHECKING:
+    from .ingestion import TelemetryRecord
+
+MESSAGE_ID_KEYS = ("msg_id", "message_id")
+SEQUENCE_KEY = "seq"
+
+
+def message_identity(payload: Dict[str, Any]) -> Optional[str]:
+    """Return the identity of a reading (see module docs), or ``None`` if it has none."""
+    for key in MESSAGE_ID_KEYS:
+        value = payload.get(key)
+        if value is not None and value != "":
+            return str(value)[:64]
+
+    timestamp = next((payload[key] for key in TIMESTAMP_KEYS if key in payload), None)
+    if timestamp is None:
+        return None
+    sequence = payload.get(SEQUENCE_KEY)
+    if sequence is not None:
+        return f"{sequence}@{timestamp}"[:64]
+
+    canonical = json.dumps(_string_keys(payload), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def drop_stored(records: Sequence["TelemetryRecord"]) -> List["TelemetryRecord"]:
+    """
+    Return ``records`` without the readings already stored, or repeated in the batch.
+
+    One query over the batch's devices, identities and time span; readings
+    without an identity are always kept.
+    """
+    keyed = [record for record in records if record.message_id is not None]
+    if not keyed:
+        return list(records)
+    stored = set(
+        Telemetry.objects.filter(
+            device_id__in={record.device_pk for record in keyed},
+            message_id__in={record.message_id for record in keyed},
+            timestamp__gte=min(record.timestamp for record in keyed),
+            timestamp__lte=max(record.timestamp for record in keyed),
+        )
+        .order_by()
+        .values_list("device_id", "message_id", "timestamp")
+    )
+
+    fresh = []
+    for record in records:
+        if record.message_id is not None:
+            key = (record.device_pk, record.message_id, record.timestamp)
+            if key in stored:
+                continue
+            stored.add(key)
+        fresh.append(record)
+    return fresh
+
+
+def _string_keys(value: Any) -> Any:
+    # Binary payloads can mix integer and string keys, which sort_keys cannot
+    # compare; JSON writes every key as a string anyway
+    if isinstance(value, dict):
+        return {str(key): _string_keys(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_string_keys(item) for item in value]
+    return value
+
+
+class DuplicateFilter:
+    """
+    Bounded LRU of recently seen message identities.
+
+    :meth:`seen` records a key and reports whether it was already present,
+    so the first delivery passes and redeliveries within the window do not.
+    """
+
+    def __init__(self, capacity: int = 100000) -> None:
+        self.capacity = capacity
+        self._keys: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def seen(self, key: Hashable) -> bool:
+        """Record ``key``; return ``True`` if it was seen within the window."""
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                self.duplicates += 1
+                return True
+            self._keys[key] = None
+            if len(self._keys) > self.capacity:
+                self._keys.popitem(last=False)
+            return False
+
+    def __len__(self) -> int:
+        return len(self._keys)
@@ -0,0 +1,244 @@
+"""
+Multi-process MQTT ingestion.
+
+A supervisor spawns N worker processes, each running its own
+:class:`~apps.devices.mqtt_worker.MqttBridge` subscribed through MQTT v5
+shared subscriptions (``$share/<group>/devices/+/data`` and friends). The
+broker delivers every message to exactly one member of the group, so ingest
+scales across cores and hosts without double-processing. Workers report
+health and counters to the supervisor, which logs throughput and restarts
+workers that crash or stop reporting.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker(index: int, group: str, stats_queue, report_interval: float) -> None:
+    """
+    Entry point of one ingestion worker process.
+
+    Runs a shared-subscription bridge until SIGTERM/SIGINT and puts a stats
+    dict on ``stats_queue`` every ``report_interval`` seconds.
+    """
+    import django
+
+    django.setup()
+    from apps.devices.mqtt_worker import create_bridge
+
+    stopping = False
+
+    def _request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    from django.conf import settings
+
+    # Each worker slot owns a spool directory, so a restarted worker replays its predecessor's backlog
+    spool_dir = settings.MQTT.get("SPOOL", {}).get("DIR")
+    metrics_port = settings.MQTT.get("METRICS", {}).get("PORT")
+    bridge = create_bridge(
+        client_id=f"aiot-ingest-{group}-{index}-{os.getpid()}",
+        shared_group=group,
+        spool_dir=os.path.join(spool_dir, f"worker-{index}") if spool_dir else None,
+        metrics_port=metrics_port + index if metrics_port else None,
+    )
+    if not bridge.start():
+        raise SystemExit(1)
+
+    next_report = 0.0
+    try:
+        while not stopping:
+            now = time.monotonic()
+            if now >= next_report:
+                stats_queue.put({"worker": index, "pid": os.getpid(), "time": time.time(), **bridge.stats()})
+                next_report = now + report_interval
+            time.sleep(0.2)
+    finally:
+        bridge.stop()
+
+
+class WorkerHandle:
+    """Supervisor-side state for one worker slot."""
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.restarts = 0
+        self.started_at = 0.0
+        self.last_report: Dict[str, Any] = {}
+        self.last_report_at = 0.0
+        self.previous_report: Dict[str, Any] = {}
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class IngestSupervisor:
+    """
+    Spawn, monitor and restart shared-subscription ingestion workers.
+
+    A worker is restarted when its process exits or when it has not reported
+    for ``stale_after`` seconds. Restarts back off exponentially per slot, up
+    to ``max_backoff`` seconds.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        group: str = "aiot",
+        report_interval: float = 10.0,
+        stale_after: float = 60.0,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self.group = group
+        self.report_interval = report_interval
+        self.stale_after = stale_after
+        self.max_backoff = max_backoff
+
+        # spawn gives every worker fresh DB connections and paho state
+        self._context = multiprocessing.get_context("spawn")
+        self._stats_queue = self._context.Queue()
+        self._handles: List[WorkerHandle] = [WorkerHandle(i) for i in range(workers)]
+        self._stopping = False
+        self._restart_at: Dict[int, float] = {}
+
+    def run(self) -> None:
+        """Start all workers and supervise them until SIGTERM/SIGINT."""
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        for handle in self._handles:
+            self._spawn(handle)
+        logger.info(f"Ingest supervisor started {len(self._handles)} workers in shared group '{self.group}'")
+
+        next_summary = time.monotonic() + self.report_interval
+        try:
+            while not self._stopping:
+                self._drain_reports(timeout=1.0)
+                self._check_workers()
+                if time.monotonic() >= next_summary:
+                    self._log_summary()
+                    next_summary = time.monotonic() + self.report_interval
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Ask every worker to flush and exit, then wait for them."""
+        self._stopping = True
+        for handle in self._handles:
+            if handle.alive:
+                handle.process.terminate()
+        for handle in self._handles:
+            if handle.process is not None:
+                handle.process.join(timeout=30)
+                if handle.process.is_alive():
+                    logger.warning(f"Ingest worker {handle.index} did not exit in time; killing it")
+                    handle.process.kill()
+        logger.info("Ingest supervisor stopped")
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Return the last known health of every worker slot."""
+        return [
+            {
+                "worker": handle.index,
+                "alive": handle.alive,
+                "pid": handle.process.pid if handle.process else None,
+                "restarts": handle.restarts,
+                "report_age": time.monotonic() - handle.last_report_at if handle.last_report_at else None,
+                **handle.last_report,
+            }
+            for handle in self._handles
+        ]
+
+    def _request_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _spawn(self, handle: WorkerHandle) -> None:
+        handle.process = self._context.Process(
+            target=run_worker,
+            args=(handle.index, self.group, self._stats_queue, self.report_interval),
+            name=f"aiot-ingest-{handle.index}",
+        )
+        handle.process.start()
+        handle.started_at = time.monotonic()
+        handle.last_report_at = 0.0
+        handle.previous_report = {}
+        logger.info(f"Ingest worker {handle.index} started (pid {handle.process.pid})")
+
+    def _drain_reports(self, timeout: float) -> None:
+        try:
+            report = self._stats_queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            handle = self._handles[report["worker"]]
+            if handle.process is not None and report.get("pid") == handle.process.pid:
+                # A restarted worker counts from zero, so its predecessor's report is no baseline
+                same_process = handle.last_report.get("pid") == report["pid"]
+                handle.previous_report = handle.last_report if same_process else {}
+                handle.last_report = report
+                handle.last_report_at = time.monotonic()
+            try:
+                report = self._stats_queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _check_workers(self) -> None:
+        if self._stopping:
+            return
+        now = time.monotonic()
+        for handle in self._handles:
+            if handle.alive:
+                last_seen = handle.last_report_at or handle.started_at
+                if now - last_seen > self.stale_after:
+                    logger.error(f"Ingest worker {handle.index} stopped reporting; restarting it")
+                    handle.process.kill()
+                    handle.process.join(timeout=5)
+                else:
+                    continue
+
+            restart_at = self._restart_at.get(handle.index)
+            if restart_at is None:
+                exitcode = handle.process.exitcode if handle.process else None
+                backoff = min(2 ** handle.restarts, self.max_backoff)
+                logger.error(
+                    f"Ingest worker {handle.index} exited with code {exitcode}; restarting in {backoff:.0f}s"
+                )
+                self._restart_at[handle.index] = now + backoff
+            elif now >= restart_at:
+                del self._restart_at[handle.index]
+                handle.restarts += 1
+                self._spawn(handle)
+
+    def _log_summary(self) -> None:
+        total_msgs = 0.0
+        total_rows = 0.0
+        lines = []
+        for handle in self._handles:
+            current, previous = handle.last_report, handle.previous_report
+            msgs_rate = rows_rate = 0.0
+            if current and previous and current["time"] > previous["time"]:
+                elapsed = current["time"] - previous["time"]
+                msgs_rate = (current["messages_received"] - previous["messages_received"]) / elapsed
+                rows_rate = (current["rows_written"] - previous["rows_written"]) / elapsed
+            total_msgs += msgs_rate
+            total_rows += rows_rate
+            lines.append(
+                f"w{handle.index}:{'up' if handle.alive else 'down'}"
+                f"{'' if current.get('connected', False) else '(disconnected)'}"
+                f" {msgs_rate:.0f} msg/s pending={current.get('pending_rows', 0)}"
+                f" restarts={handle.restarts}"
+            )
+        logger.info(f"Ingest: {total_msgs:.0f} msg/s, {total_rows:.0f} rows/s | " + " | ".join(lines))
@@ -0,0 +1,404 @@
+"""
+Buffered telemetry ingestion for the MQTT bridge.
+
+Decoded device readings are queued by the MQTT network thread and written
+to the database by a single flusher thread in batches, so each flush costs a
+handful of queries instead of several round-trips per reading. Readings
+already stored are dropped first, and each batch upserts its devices'
+latest state (:mod:`apps.devices.state`) from the rest. Device
+and gateway liveness is not written here; see :mod:`apps.devices.liveness`.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+
+from .bulk_load import copy_insert, copy_supported
+from .dedup import drop_stored
+from .metrics import IngestMetrics
+from .models import Telemetry, TelemetryValue
+from .state import upsert_states
+from .telemetry_values import extract_values
+from .validation import validate_batch
+
+if TYPE_CHECKING:
+    from .spool import TelemetrySpool
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryRecord(NamedTuple):
+    """A decoded telemetry reading waiting to be written."""
+
+    device_pk: int
+    gateway_pk: int
+    device_id: str
+    gateway_id: str
+    device_name: str
+    device_type: str
+    payload: Dict[str, Any]
+    timestamp: datetime
+    received_at: datetime
+    message_id: Optional[str] = None
+    model_definition_id: Optional[int] = None
+
+
+class TelemetryPipeline:
+    """
+    Batch telemetry writer fed by the MQTT bridge.
+
+    Records are appended to a FIFO queue and flushed (with ``COPY`` on
+    PostgreSQL, ``bulk_create`` elsewhere) when either ``batch_size`` records
+    are pending or ``flush_interval`` seconds have passed since the oldest
+    pending record arrived. A single flusher thread
+    drains the queue in arrival order, so readings from one device are always
+    inserted in the order they were received.
+
+    With a :class:`~apps.devices.spool.TelemetrySpool` the queue lives on
+    disk instead: records are appended to the spool, the flusher reads up to
+    ``replay_batch_size`` of them at a time, and an insert that fails on a
+    connection error is retried with backoff rather than dropped, so a
+    database outage only grows the spool. Readings the database rejects go
+    to the spool's dead-letter file and the spool moves past them.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        max_pending: int = 50000,
+        spool: Optional["TelemetrySpool"] = None,
+        replay_batch_size: int = 5000,
+        max_retry_interval: float = 30.0,
+        metrics: Optional[IngestMetrics] = None,
+        on_commit: Optional[Callable[[List[TelemetryRecord]], None]] = None,
+        extract_metrics: bool = True,
+        use_copy: bool = True,
+        broadcast: bool = True,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spool = spool
+        self.replay_batch_size = replay_batch_size
+        self.max_retry_interval = max_retry_interval
+        self.metrics = metrics or IngestMetrics()
+        # Called with every batch once it is in the database (used by bench_ingest)
+        self.on_commit = on_commit
+        # Also write schema-declared numeric fields to the narrow TelemetryValue table
+        self.extract_metrics = extract_metrics
+        # Load rows with PostgreSQL COPY instead of parameterized INSERTs when available
+        self.use_copy = use_copy and copy_supported()
+        # Send flushed readings to WebSocket subscribers (off for historical imports)
+        self.broadcast = broadcast
+
+        self._queue: Deque[TelemetryRecord] = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._oldest_at: Optional[float] = None
+        self._stopping = threading.Event()
+
+        # Simple counters reported by get_bridge_status(); updated through _count()
+        self._counter_lock = threading.Lock()
+        self.rows_written = 0
+        self.invalid_rows = 0
+        self.values_written = 0
+        self.batches_written = 0
+        self.failed_batches = 0
+        self.stored_duplicates = 0
+        self.rejected_rows = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        """Start the flusher thread."""
+        if self._running:
+            return
+        if self.spool is not None:
+            self.spool.open()
+            # A backlog left by the previous run is flushed without waiting for new records
+            self._oldest_at = time.monotonic() if self.spool.unread else None
+        self._stopping.clear()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="telemetry-flusher", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Telemetry pipeline started - batch size {self.batch_size}, "
+            f"flush interval {self.flush_interval * 1000:.0f} ms"
+        )
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop the flusher thread.
+
+        In-memory records are written before returning; spooled ones that are
+        not committed yet stay on disk and are replayed on the next start.
+        """
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        self._stopping.set()
+
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+        if self.spool is not None:
+            # Whatever is not committed yet is replayed on the next start
+            if self.spool.uncommitted:
+                logger.warning(f"Telemetry pipeline stopped with {self.spool.uncommitted} readings left in the spool")
+            self.spool.close()
+        else:
+            # Anything left (e.g. the join timed out) is written from this thread
+            while self._queue:
+                self.write_batch(self._take_batch())
+        close_old_connections()
+        logger.info("Telemetry pipeline stopped")
+
+    def submit(self, record: TelemetryRecord) -> None:
+        """Queue a record for the next flush; see :meth:`submit_many`."""
+        self.submit_many([record])
+
+    def submit_many(self, records: List[TelemetryRecord]) -> None:
+        """
+        Queue records for the next flush, keeping them together and in order.
+
+        Blocks while ``max_pending`` records are already queued (or, with a
+        spool, while the spool is at its size cap), which pushes back on the
+        broker connection instead of growing without bound.
+        """
+        if not records:
+            return
+        with self._cond:
+            first = not self._queued()
+            if self.spool is not None:
+                self._append_to_spool(records)
+            else:
+                while self._running and len(self._queue) >= self.max_pending:
+                    self._cond.wait(timeout=self.flush_interval)
+                self._queue.extend(records)
+            if first:
+                self._oldest_at = time.monotonic()
+            # Wake the flusher to arm its timer, or to flush a full batch now
+            if first or self._queued() >= self.batch_size:
+                self._cond.notify_all()
+
+    def _append_to_spool(self, records: List[TelemetryRecord]) -> None:
+        # Called with self._cond held
+        while records:
+            records = records[self.spool.append(records):]
+            if not records:
+                return
+            if not self._running:
+                self._count(dropped=len(records))
+                logger.error(f"Telemetry spool is full; dropped {len(records)} readings during shutdown")
+                return
+            self._cond.wait(timeout=self.flush_interval)
+
+    @property
+    def pending(self) -> int:
+        """Number of records waiting to be written."""
+        if self.spool is not None:
+            return self.spool.uncommitted
+        return len(self._queue)
+
+    def _queued(self) -> int:
+        return self.spool.unread if self.spool is not None else len(self._queue)
+
+    def _take_batch(self) -> List[TelemetryRecord]:
+        with self._cond:
+            count = min(len(self._queue), self.batch_size)
+            batch = [self._queue.popleft() for _ in range(count)]
+            self._oldest_at = time.monotonic() if self._queue else None
+            self._cond.notify_all()
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._running:
+                    if self._queued() >= self.batch_size:
+                        break
+                    if self._oldest_at is not None:
+                        remaining = self._oldest_at + self.flush_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(timeout=remaining)
+                    else:
+                        self._cond.wait()
+                if not self._running:
+                    return
+
+            if self.spool is not None:
+                self._drain_spool()
+            else:
+                self.write_batch(self._take_batch())
+
+    def _drain_spool(self) -> None:
+        """Insert the next spooled batch, retrying connection errors until it succeeds or the pipeline stops."""
+        batch, position = self.spool.read(self.replay_batch_size)
+        with self._cond:
+            self._oldest_at = time.monotonic() if self.spool.unread else None
+
+        retry = self.flush_interval
+        while batch and not self.write_batch(batch):
+            logger.warning(f"Retrying {len(batch)} spooled telemetry rows in {retry:.1f}s")
+            if self._stopping.wait(retry):
+                return
+            retry = min(retry * 2, self.max_retry_interval)
+
+        self.spool.commit(position, len(batch))
+        with self._cond:
+            # Wake producers waiting for spool space
+            self._cond.notify_all()
+
+    def write_batch(self, batch: List[TelemetryRecord]) -> bool:
+        """
+        Write one batch of telemetry rows and broadcast it after commit; returns success.
+
+        Only connection errors (``OperationalError``, ``InterfaceError``) fail
+        the batch. Any other error splits it in halves until the offending
+        readings are isolated, so only those are lost; they are logged,
+        counted in ``rejected_rows`` and kept in the spool's dead-letter file.
+        """
+        if not batch:
+            return True
+
+        try:
+            fresh, rows = self._insert(batch)
+        except (OperationalError, InterfaceError) as e:
+            self._count(failed_batches=1)
+            self.metrics.error("insert")
+            logger.error(f"Error flushing telemetry batch of {len(batch)} rows: {e}")
+            close_old_connections()
+            return False
+        except Exception as e:
+            # Retrying would fail the same way, and with a spool block it for good
+            if len(batch) == 1:
+                self._reject(batch[0], e)
+                return True
+            middle = len(batch) // 2
+            logger.debug(f"Splitting a rejected telemetry batch of {len(batch)} rows: {e}")
+            return self.write_batch(batch[:middle]) and self.write_batch(batch[middle:])
+
+        if self.on_commit is not None:
+            try:
+                self.on_commit(batch)
+            except Exception as e:
+                logger.error(f"Error in telemetry commit callback: {e}")
+        if self.broadcast and fresh:
+            self._broadcast(fresh, rows)
+        return True
+
+    def _insert(self, batch: List[TelemetryRecord]) -> Tuple[List[TelemetryRecord], List[Telemetry]]:
+        """Insert the readings of ``batch`` not stored yet, with their device state; returns them and their rows."""
+        started = time.perf_counter()
+        # Redeliveries that got past the bridge's LRU are dropped before anything is
+        # written, so they neither count again nor overwrite the device state
+        fresh = drop_stored(batch)
+        lookup_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        try:
+            validity = validate_batch(fresh)
+        except Exception as e:
+            # A broken schema must not stop ingestion; the rows stay unvalidated
+            self.metrics.error("validate")
+            logger.error(f"Error validating telemetry batch of {len(fresh)} rows: {e}")
+            validity = [None] * len(fresh)
+        self.metrics.observe("validate", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        # Metric names are created outside the transaction so the cached ids survive a rollback
+        values = extract_values(fresh) if self.extract_metrics else []
+        rows = [
+            Telemetry(
+                device_id=record.device_pk,
+                timestamp=record.timestamp,
+                received_at=record.received_at,
+                payload=record.payload,
+                message_id=record.message_id,
+                is_valid=is_valid,
+            )
+            for record, is_valid in zip(fresh, validity)
+        ]
+        # A redelivery inserted by another worker since the check hits the unique constraints
+        with transaction.atomic():
+            if self.use_copy:
+                inserted = copy_insert(Telemetry, rows, ignore_conflicts=True)
+                values_inserted = copy_insert(TelemetryValue, values, ignore_conflicts=True)
+            else:
+                # bulk_create does not report the rows it skipped
+                Telemetry.objects.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+                if values:
+                    TelemetryValue.objects.bulk_create(values, batch_size=self.batch_size * 4, ignore_conflicts=True)
+                inserted, values_inserted = len(rows), len(values)
+            upsert_states(fresh)
+
+        self._count(
+            stored_duplicates=len(batch) - len(fresh),
+            rows_written=inserted,
+            values_written=values_inserted,
+            invalid_rows=validity.count(False),
+            batches_written=1,
+        )
+        self.metrics.observe("insert", lookup_time + time.perf_counter() - started)
+        self.metrics.flush_rows.observe(len(rows))
+        logger.debug(f"Flushed {inserted} telemetry rows")
+        return fresh, rows
+
+    def _count(self, **increments: int) -> None:
+        # write_batch runs on several threads at once under the asyncio bridge's consumers
+        with self._counter_lock:
+            for name, increment in increments.items():
+                setattr(self, name, getattr(self, name) + increment)
+
+    def _reject(self, record: TelemetryRecord, error: Exception) -> None:
+        self._count(rejected_rows=1)
+        self.metrics.error("rejected")
+        logger.error(f"Dropped a telemetry reading from {record.device_id} that cannot be written: {error}")
+        if self.spool is not None:
+            self.spool.dead_letter(record, error)
+
+    def _broadcast(self, batch: List[TelemetryRecord], rows: List[Telemetry]) -> None:
+        """Send the flushed readings to WebSocket subscribers."""
+        started = time.perf_counter()
+        try:
+            channel_layer = get_channel_layer()
+            if not channel_layer:
+                return
+            events = [
+                {
+                    "type": "telemetry.event",
+                    "data": {
+                        "device_id": record.device_id,
+                        "device_name": record.device_name,
+                        "device_type": record.device_type,
+                        "gateway_id": record.gateway_id,
+                        "timestamp": row.timestamp.isoformat(),
+                        "received_at": row.received_at.isoformat(),
+                        "payload": record.payload,
+                    },
+                }
+                for record, row in zip(batch, rows)
+            ]
+            # One event loop hop per batch rather than one per reading
+            async_to_sync(_group_send_all)(channel_layer, "telemetry", events)
+            self.metrics.observe("fanout", time.perf_counter() - started)
+        except Exception as e:
+            self.metrics.error("fanout")
+            logger.error(f"Error sending WebSocket update: {e}")
+
+
+async def _group_send_all(channel_layer, group: str, events: List[Dict[str, Any]]) -> None:
+    for event in events:
+        await channel_layer.group_send(group, event)
@@ -0,0 +1,119 @@
+"""
+Priority lanes for MQTT ingest.
+
+Control-plane messages (command responses, heartbeats, gateway status and
+discovery announcements) are few and latency sensitive; telemetry is bulk.
+When both are handled on one thread, a burst of readings delays every
+acknowledgement queued behind it. The bridge therefore routes each topic to
+a lane, and every lane has its own bounded queues and worker threads, so
+control traffic only waits for other control traffic.
+
+Within a lane messages are partitioned by device (or gateway) id, so one
+device's messages are still handled in arrival order.
+"""
+
+import logging
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+LANE_CONTROL = "control"
+LANE_TELEMETRY = "telemetry"
+LANES = (LANE_CONTROL, LANE_TELEMETRY)
+
+# Last topic level of control-plane messages; binary variants only exist for telemetry
+CONTROL_EVENTS = frozenset({"response", "heartbeat", "status", "discovery"})
+
+# (topic, raw payload, received at, content type) as read off the socket
+QueuedMessage = Tuple[str, bytes, datetime, Optional[str]]
+
+
+def lane_for(topic: str) -> str:
+    """Return the lane of an ingest topic."""
+    return LANE_CONTROL if topic.rsplit("/", 1)[-1] in CONTROL_EVENTS else LANE_TELEMETRY
+
+
+def partition_key(topic: str) -> str:
+    """Return the id whose messages must stay in order: the device, or the gateway for gateway topics."""
+    parts = topic.split("/", 4)
+    if parts[0] == "gw" and len(parts) > 3:
+        # Keep a device's v2 messages in order without pinning its whole gateway to one worker
+        return f"{parts[1]}/{parts[3]}"
+    return parts[1] if len(parts) > 1 else topic
+
+
+def partition(topic: str, partitions: int) -> int:
+    return zlib.crc32(partition_key(topic).encode()) % partitions
+
+
+class LanePool:
+    """
+    Worker threads draining one lane, each with its own bounded queue.
+
+    :meth:`submit` blocks while the chosen queue is full, which stalls the
+    caller (paho's network thread) and so pushes back on the broker.
+
+    Args:
+        lane: Lane name, used for thread names and logs
+        handle: Called with every queued message on a worker thread
+        workers: Number of worker threads (and queues)
+        queue_size: Capacity of each worker's queue
+    """
+
+    def __init__(
+        self,
+        lane: str,
+        handle: Callable[[QueuedMessage], None],
+        workers: int = 1,
+        queue_size: int = 10000,
+    ) -> None:
+        self.lane = lane
+        self.handle = handle
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self._queues: List[queue.Queue] = []
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(index,), name=f"mqtt-{self.lane}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.lane} lane with {self.workers} workers")
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Handle everything already queued, then stop the workers."""
+        for q in self._queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def submit(self, message: QueuedMessage) -> None:
+        self._queues[partition(message[0], self.workers)].put(message)
+
+    @property
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def _run(self, index: int) -> None:
+        q = self._queues[index]
+        try:
+            while True:
+                message = q.get()
+                if message is None:
+                    return
+                self.handle(message)
+        finally:
+            close_old_connections()
@@ -0,0 +1,160 @@
+"""
+Coalesced liveness writes for devices and gateways.
+
+Every heartbeat and reading marks its device and gateway as seen. Writing
+that per message produces a stream of single-row UPDATEs on the same rows,
+so the bridge records the latest time per row in memory and flushes them
+periodically as one set-based UPDATE per table.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .metrics import IngestMetrics
+from .models import Device, Gateway
+
+logger = logging.getLogger(__name__)
+
+
+class LivenessWriter:
+    """
+    In-memory aggregator of "last seen" times flushed on an interval.
+
+    ``touch_*`` calls never touch the database; only the flusher thread does.
+    Each flush writes at most ``chunk_size`` rows per statement.
+    """
+
+    def __init__(self, flush_interval: float = 5.0, chunk_size: int = 1000, metrics: Optional[IngestMetrics] = None) -> None:
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self.metrics = metrics or IngestMetrics()
+        self._lock = threading.Lock()
+        self._devices: Dict[int, datetime] = {}
+        self._gateways: Dict[int, datetime] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def touch_device(self, device_pk: int, gateway_pk: int, seen_at: Optional[datetime] = None) -> None:
+        """Record that a device (and therefore its gateway) was seen."""
+        seen_at = seen_at or timezone.now()
+        with self._lock:
+            _advance(self._devices, device_pk, seen_at)
+            _advance(self._gateways, gateway_pk, seen_at)
+
+    def touch_gateway(self, gateway_pk: int, seen_at: Optional[datetime] = None) -> None:
+        """Record that a gateway was seen."""
+        seen_at = seen_at or timezone.now()
+        with self._lock:
+            _advance(self._gateways, gateway_pk, seen_at)
+
+    @property
+    def pending(self) -> int:
+        """Number of rows waiting to be flushed."""
+        return len(self._devices) + len(self._gateways)
+
+    def start(self) -> None:
+        """Start the periodic flusher thread."""
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="liveness-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flusher thread and write anything still pending."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+        close_old_connections()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all pending liveness times, one UPDATE per table."""
+        with self._lock:
+            devices, self._devices = self._devices, {}
+            gateways, self._gateways = self._gateways, {}
+        if not devices and not gateways:
+            return
+
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                for chunk in _chunks(devices, self.chunk_size):
+                    _update_seen(Device, "last_telemetry", chunk, mark_online=True)
+                for chunk in _chunks(gateways, self.chunk_size):
+                    _update_seen(Gateway, "last_seen", chunk)
+            self.flushes += 1
+            self.metrics.observe("liveness", time.perf_counter() - started)
+            logger.debug(f"Flushed liveness for {len(devices)} devices and {len(gateways)} gateways")
+        except Exception as e:
+            self.failed_flushes += 1
+            self.metrics.error("liveness")
+            logger.error(f"Error flushing liveness updates: {e}")
+            close_old_connections()
+            # Put the times back so the next flush retries them
+            with self._lock:
+                for pk, seen_at in devices.items():
+                    _advance(self._devices, pk, seen_at)
+                for pk, seen_at in gateways.items():
+                    _advance(self._gateways, pk, seen_at)
+
+
+def _advance(seen: Dict[int, datetime], pk: int, seen_at: datetime) -> None:
+    current = seen.get(pk)
+    if current is None or seen_at > current:
+        seen[pk] = seen_at
+
+
+def _chunks(seen: Dict[int, datetime], size: int) -> Iterator[Dict[int, datetime]]:
+    items = list(seen.items())
+    for start in range(0, len(items), size):
+        yield dict(items[start:start + size])
+
+
+def _update_seen(model, field_name: str, seen: Dict[int, datetime], mark_online: bool = False) -> None:
+    """
+    Set ``field_name`` to the given time for each primary key in one statement.
+
+    On PostgreSQL this is ``UPDATE ... FROM (VALUES ...)`` and never moves a
+    row backwards; other databases fall back to ``UPDATE ... SET col = CASE``.
+    """
+    if connection.vendor == "postgresql":
+        table = connection.ops.quote_name(model._meta.db_table)
+        column = connection.ops.quote_name(model._meta.get_field(field_name).column)
+        values = ", ".join(["(%s, %s::timestamptz)"] * len(seen))
+        params = [value for pk, seen_at in seen.items() for value in (pk, seen_at)]
+        assignments = f"{column} = v.seen_at" + (", is_online = TRUE" if mark_online else "")
+        sql = (
+            f"UPDATE {table} AS t SET {assignments} "
+            f"FROM (VALUES {values}) AS v(id, seen_at) "
+            f"WHERE t.id = v.id AND (t.{column} IS NULL OR t.{column} < v.seen_at)"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+        return
+
+    # Portable fallback: a single UPDATE ... SET col = CASE id WHEN ... END
+    model.objects.filter(pk__in=list(seen)).update(
+        **{
+            field_name: Case(
+                *[When(pk=pk, then=Value(seen_at)) for pk, seen_at in seen.items()],
+                output_field=DateTimeField(),
+            )
+        },
+        **({"is_online": True} if mark_online else {}),
+    )
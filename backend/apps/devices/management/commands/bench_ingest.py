@@ -0,0 +1,289 @@
+import json
+import os
+import random
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+from channels.layers import channel_layers
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from apps.devices import codecs
+from apps.devices.models import Device, Gateway, Telemetry
+from apps.devices.mqtt_worker import create_bridge
+from apps.devices.stub_broker import StubBroker
+
+SENT_KEY = "bench_sent"
+
+
+class Command(BaseCommand):
+    help = (
+        'End-to-end ingest benchmark: publishes through an in-process MQTT broker stand-in into the real '
+        'bridge and database, reporting msgs/s, rows/s and publish-to-commit latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=100, help='Simulated devices')
+        parser.add_argument('--messages', type=int, default=20000, help='MQTT messages to publish')
+        parser.add_argument('--rate', type=float, default=0, help='Target messages/s across publishers (0 = unthrottled)')
+        parser.add_argument('--publishers', type=int, default=2, help='Publishing MQTT clients')
+        parser.add_argument('--fields', type=int, default=4, help='Numeric fields per reading')
+        parser.add_argument('--format', choices=['json', 'msgpack'], default='json', help='Payload encoding')
+        parser.add_argument(
+            '--batch', type=int, default=0,
+            help='Readings per gateways/<id>/batch message (0 = one reading per devices/<id>/data message)',
+        )
+        parser.add_argument('--qos', type=int, choices=[0, 1], default=1, help='Publish QoS')
+        parser.add_argument('--engine', choices=['thread', 'asyncio'], default=settings.MQTT.get("ENGINE", "thread"))
+        parser.add_argument('--batch-size', type=int, help='Pipeline flush size (defaults to MQTT INGEST settings)')
+        parser.add_argument('--spool-dir', default='', help='Enable the write-ahead spool in this directory')
+        parser.add_argument('--rate-limits', action='store_true', help='Keep ingest rate limits enabled')
+        parser.add_argument('--drain-timeout', type=float, default=60.0, help='Seconds to wait for rows to commit')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for payload values')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='JSON results of a previous run to compare against')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed fractional throughput drop / latency rise against --baseline',
+        )
+        parser.add_argument('--min-throughput', type=float, help='Fail below this many committed readings/s')
+        parser.add_argument('--max-p99-ms', type=float, help='Fail above this p99 publish-to-commit latency')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark gateway, devices and rows')
+
+    def handle(self, *args, **options):
+        if options['format'] == 'msgpack' and codecs.msgpack is None:
+            raise CommandError('msgpack is not installed')
+
+        mqtt_settings = {
+            **settings.MQTT,
+            "ENGINE": options['engine'],
+            "INGEST": {
+                **settings.MQTT.get("INGEST", {}),
+                **({"BATCH_SIZE": options['batch_size']} if options['batch_size'] else {}),
+            },
+            "RATE_LIMITS": {**settings.MQTT.get("RATE_LIMITS", {}), "ENABLED": options['rate_limits']},
+            "SPOOL": {**settings.MQTT.get("SPOOL", {}), "DIR": options['spool_dir']},
+            "METRICS": {**settings.MQTT.get("METRICS", {}), "PORT": 0},
+            # Nothing but the database: no Redis invalidation channel or channel layer
+            "REGISTRY": {**settings.MQTT.get("REGISTRY", {}), "INVALIDATION_CHANNEL": None},
+        }
+        channel_layer = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+        with override_settings(MQTT=mqtt_settings, CHANNEL_LAYERS=channel_layer):
+            channel_layers.backends.clear()
+            gateway, device_ids = self._create_fleet(options['devices'])
+            try:
+                results = self._run(options, gateway, device_ids)
+            finally:
+                if not options['keep']:
+                    self._delete_fleet(gateway)
+            channel_layers.backends.clear()
+
+        self._report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        self._check(results, options)
+
+    # -- fleet ---------------------------------------------------------------
+
+    def _create_fleet(self, count):
+        owner, _ = get_user_model().objects.get_or_create(username='bench-ingest')
+        gateway = Gateway.objects.create(owner=owner, gateway_id=f"bench-{os.getpid()}-{int(time.time())}")
+        device_ids = [f"{gateway.gateway_id}-d{index}" for index in range(count)]
+        Device.objects.bulk_create(
+            [Device(gateway=gateway, device_id=device_id, type=Device.DEVICE_TYPE_SENSOR) for device_id in device_ids],
+            batch_size=1000,
+        )
+        return gateway, device_ids
+
+    def _delete_fleet(self, gateway):
+        Telemetry.objects.filter(device__gateway=gateway).delete()
+        gateway.delete()
+
+    # -- run -----------------------------------------------------------------
+
+    def _run(self, options, gateway, device_ids):
+        broker = StubBroker()
+        port = broker.start()
+
+        latencies = []
+        committed = [0]
+        done = threading.Event()
+        lock = threading.Lock()
+        expected = options['messages'] * max(options['batch'], 1)
+
+        def on_commit(records):
+            now = time.perf_counter()
+            with lock:
+                latencies.extend(now - record.payload[SENT_KEY] for record in records if SENT_KEY in record.payload)
+                committed[0] += len(records)
+                if committed[0] >= expected:
+                    done.set()
+
+        bridge = create_bridge(broker_host="127.0.0.1", broker_port=port, client_id=f"bench-bridge-{os.getpid()}")
+        bridge.pipeline.on_commit = on_commit
+        if not bridge.start():
+            broker.stop()
+            raise CommandError('Bridge failed to start')
+        try:
+            if not broker.subscribed.wait(timeout=10):
+                raise CommandError('Bridge did not subscribe to the stub broker')
+
+            self.stdout.write(
+                f"Publishing {options['messages']:,} messages ({expected:,} readings) from "
+                f"{len(device_ids):,} devices, engine={options['engine']}, format={options['format']}"
+            )
+            started = time.perf_counter()
+            threads = [
+                threading.Thread(target=self._publish, args=(options, port, index, gateway, device_ids), daemon=True)
+                for index in range(options['publishers'])
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            published = time.perf_counter()
+
+            if not done.wait(timeout=options['drain_timeout']):
+                self.stderr.write(self.style.WARNING(
+                    f"Only {committed[0]:,} of {expected:,} readings committed within {options['drain_timeout']:.0f}s"
+                ))
+            finished = time.perf_counter()
+            stats = bridge.stats()
+        finally:
+            bridge.stop()
+            broker.stop()
+
+        elapsed = finished - started
+        rows = Telemetry.objects.filter(device__gateway=gateway).count()
+        latencies.sort()
+        stages = {
+            f"{stage}_p99_ms": round(histogram.quantile(0.99) * 1000, 3)
+            for stage, histogram in bridge.metrics.stages.items() if histogram.count
+        }
+        stages.update({
+            f"{lane}_wait_p99_ms": round(histogram.quantile(0.99) * 1000, 3)
+            for lane, histogram in bridge.metrics.lane_wait.items() if histogram.count
+        })
+        return {
+            "engine": options['engine'],
+            "format": options['format'],
+            "devices": len(device_ids),
+            "messages": options['messages'],
+            "readings": expected,
+            "batch": options['batch'],
+            "committed": committed[0],
+            "rows": rows,
+            "publish_seconds": round(published - started, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "messages_per_second": round(stats["messages_received"] / elapsed, 1),
+            "readings_per_second": round(committed[0] / elapsed, 1),
+            "rows_per_second": round(rows / elapsed, 1),
+            "latency_p50_ms": _percentile_ms(latencies, 0.50),
+            "latency_p99_ms": _percentile_ms(latencies, 0.99),
+            "latency_max_ms": _percentile_ms(latencies, 1.0),
+            "failed_batches": stats["failed_batches"],
+            **stages,
+        }
+
+    def _publish(self, options, port, index, gateway, device_ids):
+        """Publish this client's share of the messages, paced to its share of --rate."""
+        rng = random.Random(options['seed'] + index)
+        fields = [f"f{field}" for field in range(options['fields'])]
+        publishers = options['publishers']
+        count = options['messages'] // publishers + (1 if index < options['messages'] % publishers else 0)
+        interval = publishers / options['rate'] if options['rate'] else 0
+        binary = options['format'] == 'msgpack'
+        encode = codecs.msgpack.packb if binary else (lambda value: json.dumps(value).encode())
+
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"bench-pub-{os.getpid()}-{index}")
+        client.max_inflight_messages_set(1000)
+        client.connect("127.0.0.1", port, 60)
+        client.loop_start()
+        try:
+            started = time.perf_counter()
+            info = None
+            for sequence in range(count):
+                if interval:
+                    delay = started + sequence * interval - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                if options['batch']:
+                    readings = []
+                    for _ in range(options['batch']):
+                        values = {name: round(rng.uniform(0, 100), 2) for name in fields}
+                        values[SENT_KEY] = time.perf_counter()
+                        readings.append({"device_id": rng.choice(device_ids), "values": values})
+                    topic = f"gateways/{gateway.gateway_id}/batch"
+                    payload = readings
+                else:
+                    device_id = device_ids[(sequence * publishers + index) % len(device_ids)]
+                    topic = f"devices/{device_id}/data"
+                    payload = {name: round(rng.uniform(0, 100), 2) for name in fields}
+                    payload[SENT_KEY] = time.perf_counter()
+                info = client.publish(topic + (codecs.BINARY_TOPIC_SUFFIX if binary else ""), encode(payload), options['qos'])
+            if info is not None:
+                info.wait_for_publish(timeout=options['drain_timeout'])
+        finally:
+            client.loop_stop()
+            client.disconnect()
+
+    # -- output --------------------------------------------------------------
+
+    def _report(self, results):
+        self.stdout.write(
+            f"\n{results['committed']:,}/{results['readings']:,} readings committed "
+            f"({results['rows']:,} rows) in {results['elapsed_seconds']:.2f}s "
+            f"(publishing took {results['publish_seconds']:.2f}s)"
+        )
+        self.stdout.write(f"  messages/s   {results['messages_per_second']:>12,.0f}")
+        self.stdout.write(f"  readings/s   {results['readings_per_second']:>12,.0f}")
+        self.stdout.write(f"  rows/s       {results['rows_per_second']:>12,.0f}")
+        self.stdout.write(
+            f"  latency      p50 {results['latency_p50_ms']} ms  p99 {results['latency_p99_ms']} ms  "
+            f"max {results['latency_max_ms']} ms"
+        )
+        stages = [f"{key[:-7]} {value} ms" for key, value in results.items() if key.endswith("_p99_ms") and not key.startswith("latency")]
+        if stages:
+            self.stdout.write("  stage p99    " + "  ".join(stages))
+
+    def _check(self, results, options):
+        failures = []
+        if results['committed'] < results['readings']:
+            failures.append(f"{results['readings'] - results['committed']:,} readings were not committed")
+        if options['min_throughput'] and results['readings_per_second'] < options['min_throughput']:
+            failures.append(f"{results['readings_per_second']:,.0f} readings/s is below {options['min_throughput']:,.0f}")
+        if options['max_p99_ms'] and (results['latency_p99_ms'] or 0) > options['max_p99_ms']:
+            failures.append(f"p99 latency {results['latency_p99_ms']} ms is above {options['max_p99_ms']} ms")
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            tolerance = options['tolerance']
+            floor = baseline['readings_per_second'] * (1 - tolerance)
+            if results['readings_per_second'] < floor:
+                failures.append(
+                    f"throughput {results['readings_per_second']:,.0f}/s regressed from "
+                    f"{baseline['readings_per_second']:,.0f}/s (floor {floor:,.0f}/s)"
+                )
+            if baseline.get('latency_p99_ms') and results['latency_p99_ms'] is not None:
+                ceiling = baseline['latency_p99_ms'] * (1 + tolerance)
+                if results['latency_p99_ms'] > ceiling:
+                    failures.append(
+                        f"p99 latency {results['latency_p99_ms']} ms regressed from "
+                        f"{baseline['latency_p99_ms']} ms (ceiling {ceiling:.1f} ms)"
+                    )
+
+        if failures:
+            raise CommandError("Benchmark regression: " + "; ".join(failures))
+        self.stdout.write(self.style.SUCCESS("Benchmark passed"))
+
+
+def _percentile_ms(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return round(sorted_values[index] * 1000, 3)
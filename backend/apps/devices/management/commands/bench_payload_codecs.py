@@ -0,0 +1,77 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.devices import codecs
+
+
+class Command(BaseCommand):
+    help = 'Benchmark telemetry payload decoding: JSON vs MessagePack/CBOR (optionally with integer keys)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=100000, help='Payloads decoded per codec')
+        parser.add_argument('--fields', type=int, default=6, help='Readings per payload')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per codec; the best one is reported')
+
+    def handle(self, *args, **options):
+        names = ["temperature", "humidity", "pressure", "battery", "rssi", "co2", "lux", "voltage"]
+        names += [f"sensor_{i}" for i in range(len(names), options['fields'])]
+        names = names[:options['fields']]
+        key_map = {index + 1: name for index, name in enumerate(names)}
+
+        rng = random.Random(42)
+        readings = [
+            {name: round(rng.uniform(0, 100), 2) for name in names} | {"ts": 1760000000000 + i}
+            for i in range(1000)
+        ]
+        compact = [
+            {index: reading[name] for index, name in key_map.items()} | {"ts": reading["ts"]}
+            for reading in readings
+        ]
+
+        cases = [
+            ("json (old inline path)", [json.dumps(r).encode() for r in readings],
+             lambda raw: json.loads(raw.decode("utf-8"))),
+            ("json", [json.dumps(r).encode() for r in readings],
+             lambda raw: codecs.decode_payload(raw, codecs.CONTENT_TYPE_JSON)),
+        ]
+        if codecs.msgpack is not None:
+            cases += [
+                ("msgpack", [codecs.msgpack.packb(r) for r in readings],
+                 lambda raw: codecs.make_jsonable(codecs.decode_payload(raw, codecs.CONTENT_TYPE_MSGPACK))),
+                ("msgpack + int keys", [codecs.msgpack.packb(r) for r in compact],
+                 lambda raw: codecs.expand_keys(
+                     codecs.make_jsonable(codecs.decode_payload(raw, codecs.CONTENT_TYPE_MSGPACK)), key_map)),
+            ]
+        else:
+            self.stdout.write(self.style.WARNING('msgpack is not installed; skipping it'))
+        if codecs.cbor2 is not None:
+            cases += [
+                ("cbor", [codecs.cbor2.dumps(r) for r in readings],
+                 lambda raw: codecs.make_jsonable(codecs.decode_payload(raw, codecs.CONTENT_TYPE_CBOR))),
+                ("cbor + int keys", [codecs.cbor2.dumps(r) for r in compact],
+                 lambda raw: codecs.expand_keys(
+                     codecs.make_jsonable(codecs.decode_payload(raw, codecs.CONTENT_TYPE_CBOR)), key_map)),
+            ]
+        else:
+            self.stdout.write(self.style.WARNING('cbor2 is not installed; skipping it'))
+
+        messages = options['messages']
+        baseline = None
+        self.stdout.write(f"{'codec':<24}{'bytes/msg':>10}{'msgs/s':>14}{'vs json':>10}")
+        for label, payloads, decode in cases:
+            # The payloads must round-trip to the same readings before being timed
+            assert decode(payloads[0])["ts"] == readings[0]["ts"]
+            size = sum(len(p) for p in payloads) / len(payloads)
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                for i in range(messages):
+                    decode(payloads[i % len(payloads)])
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            rate = messages / best
+            baseline = baseline or rate
+            self.stdout.write(f"{label:<24}{size:>10.0f}{rate:>14,.0f}{rate / baseline:>9.2f}x")
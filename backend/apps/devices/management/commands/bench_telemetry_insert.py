@@ -0,0 +1,83 @@
+import os
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.devices import bulk_load
+from apps.devices.models import Device, Gateway, Telemetry
+
+
+class Command(BaseCommand):
+    help = 'Benchmark telemetry inserts: bulk_create vs PostgreSQL COPY at several batch sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='Rows inserted per method and batch size')
+        parser.add_argument(
+            '--batch-sizes', default='100,500,2000,10000',
+            help='Comma-separated rows per transaction',
+        )
+        parser.add_argument('--devices', type=int, default=100, help='Devices the rows are spread over')
+        parser.add_argument('--fields', type=int, default=6, help='Numeric fields per payload')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark gateway, devices and rows')
+
+    def handle(self, *args, **options):
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',') if size.strip()]
+        methods = [
+            ('bulk_create', lambda rows: Telemetry.objects.bulk_create(rows, batch_size=len(rows), ignore_conflicts=True)),
+        ]
+        if bulk_load.copy_supported():
+            methods += [
+                # What the ingest pipeline does: COPY into staging, INSERT ... ON CONFLICT DO NOTHING
+                ('copy + dedup', lambda rows: bulk_load.copy_insert(Telemetry, rows, ignore_conflicts=True)),
+                ('copy', lambda rows: bulk_load.copy_insert(Telemetry, rows)),
+            ]
+        else:
+            self.stdout.write(self.style.WARNING('COPY needs PostgreSQL with psycopg2; timing bulk_create only'))
+
+        owner, _ = get_user_model().objects.get_or_create(username='bench-ingest')
+        gateway = Gateway.objects.create(owner=owner, gateway_id=f"bench-copy-{os.getpid()}-{int(time.time())}")
+        Device.objects.bulk_create(
+            [Device(gateway=gateway, device_id=f"{gateway.gateway_id}-d{i}") for i in range(options['devices'])]
+        )
+        device_pks = list(Device.objects.filter(gateway=gateway).values_list('pk', flat=True))
+
+        try:
+            self.stdout.write(f"{'batch':>8}  {'method':<14}{'rows/s':>12}{'vs bulk_create':>16}")
+            for batch_size in batch_sizes:
+                baseline = None
+                for label, insert in methods:
+                    rows = self._rows(options['rows'], device_pks, options['fields'], f"{label}-{batch_size}")
+                    started = time.perf_counter()
+                    for start in range(0, len(rows), batch_size):
+                        with transaction.atomic():
+                            insert(rows[start:start + batch_size])
+                    rate = len(rows) / (time.perf_counter() - started)
+                    baseline = baseline or rate
+                    self.stdout.write(f"{batch_size:>8}  {label:<14}{rate:>12,.0f}{rate / baseline:>15.2f}x")
+                    if not options['keep']:
+                        Telemetry.objects.filter(device__gateway=gateway).delete()
+        finally:
+            if not options['keep']:
+                gateway.delete()
+
+    def _rows(self, count, device_pks, fields, run):
+        rng = random.Random(42)
+        start = timezone.now() - timedelta(days=30)
+        names = [f"sensor_{i}" for i in range(fields)]
+        return [
+            Telemetry(
+                device_id=device_pks[i % len(device_pks)],
+                timestamp=start + timedelta(milliseconds=i),
+                received_at=start + timedelta(milliseconds=i),
+                payload={name: round(rng.uniform(0, 100), 2) for name in names},
+                # Unique per run, so --keep never turns later runs into conflicts
+                message_id=f"{run}-{i}",
+                is_valid=True,
+            )
+            for i in range(count)
+        ]
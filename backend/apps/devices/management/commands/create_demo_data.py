@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from apps.devices.models import Device, Gateway, Telemetry
+from apps.devices.dedup import message_identity
+from apps.devices.ingestion import TelemetryPipeline, TelemetryRecord
+from apps.devices.models import Device, Gateway
 import random
 import json
 from datetime import datetime
@@ -81,6 +83,7 @@ class Command(BaseCommand):
         device_id = device.device_id
         
         # Create 10 sample records
+        records = []
         for i in range(10):
             if "TEMP" in device_id:
                 payload = {
@@ -112,6 +115,22 @@ class Command(BaseCommand):
                     "device_type": "generic"
                 }
             
-            Telemetry.objects.create(device=device, payload=payload)
-            
+            now = timezone.now()
+            records.append(TelemetryRecord(
+                device_pk=device.pk,
+                gateway_pk=device.gateway_id,
+                device_id=device_id,
+                gateway_id=device.gateway.gateway_id,
+                device_name=device.name,
+                device_type=device.type,
+                payload=payload,
+                timestamp=now,
+                received_at=now,
+                message_id=message_identity(payload),
+                model_definition_id=device.model_definition_id,
+            ))
+
+        # Written like live readings, so the device state and metric values are filled too
+        TelemetryPipeline(broadcast=False).write_batch(records)
+
         self.stdout.write(f'  📊 Created 10 telemetry records for {device_id}')
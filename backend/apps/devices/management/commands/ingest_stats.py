@@ -0,0 +1,172 @@
+import time
+import urllib.request
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.devices.lanes import LANES
+from apps.devices.metrics import PREFIX, STAGES, bucket_quantile, parse_samples
+
+
+class Command(BaseCommand):
+    help = 'Print a live summary of MQTT ingest throughput, errors and per-stage latency from the metrics endpoints'
+
+    def add_arguments(self, parser):
+        metrics = settings.MQTT.get("METRICS", {})
+        parser.add_argument(
+            '--url', action='append', default=[],
+            help='Metrics endpoint to scrape (repeatable); defaults to one per worker on MQTT_METRICS_PORT',
+        )
+        parser.add_argument('--host', default='127.0.0.1', help='Host of the default endpoints')
+        parser.add_argument('--port', type=int, default=metrics.get("PORT", 0), help='Metrics port of worker 0')
+        parser.add_argument(
+            '--workers', type=int, default=settings.MQTT.get("WORKERS", {}).get("COUNT", 1),
+            help='Number of workers (ports PORT .. PORT + workers - 1)',
+        )
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between summaries')
+        parser.add_argument('--once', action='store_true', help='Print totals since start once and exit')
+
+    def handle(self, *args, **options):
+        urls = options['url']
+        if not urls:
+            if not options['port']:
+                raise CommandError('No metrics endpoint: set MQTT_METRICS_PORT or pass --url')
+            urls = [
+                f"http://{options['host']}:{options['port'] + index}/metrics"
+                for index in range(options['workers'])
+            ]
+
+        previous = None
+        try:
+            while True:
+                current = self._scrape(urls)
+                self._summarize(current, previous, len(urls))
+                if options['once']:
+                    return
+                previous = current
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def _scrape(self, urls):
+        """Fetch every endpoint and add their samples together."""
+        totals, up = {}, 0
+        for url in urls:
+            try:
+                with urllib.request.urlopen(url, timeout=2) as response:
+                    samples = parse_samples(response.read().decode())
+            except OSError as e:
+                self.stderr.write(self.style.WARNING(f"{url}: {e}"))
+                continue
+            up += 1
+            for key, value in samples.items():
+                totals[key] = totals.get(key, 0.0) + value
+        return {"time": time.monotonic(), "up": up, "samples": totals}
+
+    def _summarize(self, current, previous, targets):
+        samples = current["samples"]
+        base = previous["samples"] if previous else {}
+        elapsed = current["time"] - previous["time"] if previous else None
+
+        def value(name, **labels):
+            return samples.get((f"{PREFIX}_{name}", frozenset(labels.items())), 0.0)
+
+        def delta(name, **labels):
+            key = (f"{PREFIX}_{name}", frozenset(labels.items()))
+            return samples.get(key, 0.0) - base.get(key, 0.0)
+
+        def rate(name, **labels):
+            return delta(name, **labels) / elapsed if elapsed else value(name, **labels)
+
+        unit = "/s" if elapsed else " total"
+        self.stdout.write(
+            f"\n{datetime.now():%Y-%m-%d %H:%M:%S}  endpoints {current['up']}/{targets} up"
+            f"{'' if elapsed else '  (since start)'}"
+        )
+        self.stdout.write(
+            f"messages {rate('messages_received_total'):,.0f}{unit}  "
+            f"bytes {_size(rate('bytes_received_total'))}{unit}  "
+            f"rows {rate('rows_written_total'):,.0f}{unit}  "
+            f"pending {value('pending_rows'):,.0f}  queue {value('queue_depth'):,.0f}  "
+            f"liveness {value('pending_liveness'):,.0f}"
+        )
+        self.stdout.write(
+            f"devices  legacy topics {rate('legacy_device_messages_total'):,.0f}{unit}  "
+            f"gw topics {rate('v2_device_messages_total'):,.0f}{unit}"
+        )
+
+        errors = sorted(
+            (dict(labels)["kind"], rate("errors_total", kind=dict(labels)["kind"]))
+            for name, labels in samples if name == f"{PREFIX}_errors_total"
+        )
+        errors = [(kind, count) for kind, count in errors if count]
+        precision = 1 if elapsed else 0
+        self.stdout.write(
+            "errors   " + ("  ".join(f"{kind} {count:,.{precision}f}{unit}" for kind, count in errors) or "none")
+        )
+
+        self.stdout.write(f"{'stage':<10}{'per s' if elapsed else 'count':>14}{'p50':>11}{'p99':>11}{'mean':>11}")
+        for stage in STAGES:
+            buckets = _buckets(samples, base, "stage_seconds", stage=stage)
+            count = delta("stage_seconds_count", stage=stage)
+            if not count:
+                continue
+            mean = delta("stage_seconds_sum", stage=stage) / count
+            self.stdout.write(
+                f"{stage:<10}{count / elapsed if elapsed else count:>14,.0f}"
+                f"{_duration(bucket_quantile(buckets, 0.5)):>11}"
+                f"{_duration(bucket_quantile(buckets, 0.99)):>11}{_duration(mean):>11}"
+            )
+
+        self.stdout.write(f"{'lane':<10}{'depth':>14}{'wait p99':>11}{'handle p99':>11}{'mean':>11}")
+        for lane in LANES:
+            count = delta("lane_handle_seconds_count", lane=lane)
+            if not count:
+                continue
+            wait = _buckets(samples, base, "lane_wait_seconds", lane=lane)
+            handle = _buckets(samples, base, "lane_handle_seconds", lane=lane)
+            self.stdout.write(
+                f"{lane:<10}{value(f'{lane}_queue_depth'):>14,.0f}{_duration(bucket_quantile(wait, 0.99)):>11}"
+                f"{_duration(bucket_quantile(handle, 0.99)):>11}"
+                f"{_duration(delta('lane_handle_seconds_sum', lane=lane) / count):>11}"
+            )
+
+        flushes = delta("flush_rows_count")
+        if flushes:
+            buckets = _buckets(samples, base, "flush_rows")
+            self.stdout.write(
+                f"flush size  mean {delta('flush_rows_sum') / flushes:,.0f}  "
+                f"p50 {bucket_quantile(buckets, 0.5):,.0f}  p99 {bucket_quantile(buckets, 0.99):,.0f} rows"
+            )
+
+
+def _buckets(samples, base, name, **labels):
+    """Cumulative (le, count) pairs of a histogram, minus those of the previous scrape."""
+    name = f"{PREFIX}_{name}_bucket"
+    buckets = []
+    for (sample, sample_labels), count in samples.items():
+        sample_labels = dict(sample_labels)
+        le = sample_labels.pop("le", None)
+        if sample != name or le is None or sample_labels != labels:
+            continue
+        buckets.append((float(le), count - base.get((sample, frozenset({**labels, "le": le}.items())), 0.0)))
+    return sorted(buckets)
+
+
+def _duration(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 0.001:
+        return f"{seconds * 1e6:.0f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
+
+
+def _size(count):
+    for unit in ("B", "KB", "MB"):
+        if count < 1024:
+            return f"{count:,.0f} {unit}"
+        count /= 1024
+    return f"{count:,.1f} GB"
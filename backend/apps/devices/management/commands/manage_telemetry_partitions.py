@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.devices import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming telemetry partitions and detach or drop expired ones (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        config = partitions.partition_settings()
+        parser.add_argument(
+            '--interval', choices=partitions.INTERVALS, default=config["INTERVAL"],
+            help='Range of each new partition',
+        )
+        parser.add_argument(
+            '--premake', type=int, default=config["PREMAKE"],
+            help='Partitions to keep ready after the current one',
+        )
+        parser.add_argument(
+            '--retention-days', type=int, default=config["RETENTION_DAYS"],
+            help='Expire partitions entirely older than this many days (0 keeps everything)',
+        )
+        parser.add_argument(
+            '--expire', choices=partitions.EXPIRE_ACTIONS, default=config["EXPIRE"],
+            help='Detach expired partitions (kept as plain tables) or drop them',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only print what would change')
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError('The telemetry table is not partitioned (PostgreSQL only, see migration 0009)')
+
+        result = partitions.manage_partitions(
+            dry_run=options['dry_run'],
+            interval=options['interval'],
+            premake=options['premake'],
+            retention_days=options['retention_days'],
+            action=options['expire'],
+        )
+        dry_run = options['dry_run']
+        expired = {'detach': 'Detached', 'drop': 'Dropped'}[options['expire']]
+        for name in result["created"]:
+            self.stdout.write(f"{'Would create' if dry_run else 'Created'} {name}")
+        for name in result["expired"]:
+            self.stdout.write(f"{'Would ' + options['expire'] if dry_run else expired} {name}")
+
+        attached = partitions.list_partitions()
+        if attached:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(attached)} partitions cover {attached[0].start:%Y-%m-%d} .. {attached[-1].end:%Y-%m-%d}"
+            ))
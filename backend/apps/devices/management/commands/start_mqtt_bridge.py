@@ -1,3 +1,7 @@
+import signal
+import time
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from apps.devices import mqtt_worker
 
@@ -5,14 +9,56 @@ from apps.devices import mqtt_worker
 class Command(BaseCommand):
     help = 'Start MQTT bridge worker'
 
+    def add_arguments(self, parser):
+        workers = settings.MQTT.get("WORKERS", {})
+        parser.add_argument(
+            '--workers', type=int, default=workers.get("COUNT", 1),
+            help='Number of ingestion processes on this host',
+        )
+        parser.add_argument(
+            '--group', default=workers.get("SHARED_GROUP", "aiot"),
+            help=(
+                'MQTT v5 shared subscription group joined by every worker, so replicas on other '
+                'hosts split the traffic instead of each processing it; "" subscribes directly'
+            ),
+        )
+        parser.add_argument(
+            '--report-interval', type=float, default=workers.get("REPORT_INTERVAL", 10.0),
+            help='Seconds between worker health/throughput reports',
+        )
+
     def handle(self, *args, **options):
+        if options['workers'] > 1:
+            from apps.devices.ingest_workers import IngestSupervisor
+
+            self.stdout.write(f"Starting {options['workers']} MQTT ingestion workers...")
+            IngestSupervisor(
+                workers=options['workers'],
+                group=options['group'],
+                report_interval=options['report_interval'],
+            ).run()
+            return
+
         self.stdout.write('Starting MQTT bridge...')
-        mqtt_worker.start_bridge_if_enabled()
-        if mqtt_worker.bridge:
-            self.stdout.write(
-                self.style.SUCCESS('MQTT bridge started successfully')
-            )
-        else:
+        # A single worker still joins the group: other containers may run the same command
+        mqtt_worker.start_bridge_if_enabled(shared_group=options['group'] or None)
+        if not mqtt_worker.bridge or not mqtt_worker.bridge.is_running:
             self.stdout.write(
                 self.style.ERROR('Failed to start MQTT bridge')
             )
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS('MQTT bridge started successfully')
+        )
+
+        # Keep the process alive until asked to stop, then flush buffered data
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        try:
+            while not stopping:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            mqtt_worker.stop_bridge()
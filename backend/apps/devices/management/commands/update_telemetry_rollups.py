@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apps.devices import rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold newly received telemetry into the 1m/1h/1d rollups and delete expired rollups'
+
+    def add_arguments(self, parser):
+        config = rollups.rollup_settings()
+        parser.add_argument(
+            '--batch-size', type=int, default=config["BATCH_SIZE"],
+            help='Raw readings consumed per transaction',
+        )
+        parser.add_argument(
+            '--max-batches', type=int, default=config["MAX_BATCHES"],
+            help='Transactions per run; raise it to catch up a backlog in one go',
+        )
+        parser.add_argument('--no-expire', action='store_true', help='Keep rollups past their retention')
+
+    def handle(self, *args, **options):
+        result = rollups.update_rollups(batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {result['readings']} readings into {result['rollups']} rollup rows"
+        ))
+        if not options['no_expire']:
+            deleted = rollups.expire_rollups()
+            if deleted:
+                self.stdout.write(f"Deleted {deleted} expired rollups")
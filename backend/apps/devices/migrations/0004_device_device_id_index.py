@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-16 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0003_devicemodeldefinition_alter_device_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['device_id'], name='devices_dev_device__e2c19e_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.13 on 2026-10-16 20:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def copy_timestamp_to_received_at(apps, schema_editor):
+    # Existing rows were stamped on arrival, so both columns mean the same thing
+    Telemetry = apps.get_model('devices', 'Telemetry')
+    Telemetry.objects.update(received_at=models.F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0004_device_device_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telemetry',
+            name='received_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the platform received this telemetry data'),
+        ),
+        migrations.RunPython(copy_timestamp_to_received_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='telemetry',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the reading was taken (device clock if supplied, otherwise arrival time)'),
+        ),
+        migrations.AddIndex(
+            model_name='telemetry',
+            index=models.Index(fields=['received_at'], name='devices_tel_receive_bd99e8_idx'),
+        ),
+    ]
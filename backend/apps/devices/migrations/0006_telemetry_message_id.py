@@ -0,0 +1,22 @@
+# Generated by Django 4.2.13 on 2026-10-16 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0005_telemetry_received_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telemetry',
+            name='message_id',
+            field=models.CharField(blank=True, help_text='Identity of the reading used to drop redelivered duplicates', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='telemetry',
+            constraint=models.UniqueConstraint(fields=('device', 'message_id'), name='unique_telemetry_message'),
+        ),
+    ]
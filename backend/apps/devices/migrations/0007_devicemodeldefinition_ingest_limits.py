@@ -0,0 +1,23 @@
+# Generated by Django 4.2.13 on 2026-10-16 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0006_telemetry_message_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicemodeldefinition',
+            name='ingest_burst',
+            field=models.PositiveIntegerField(blank=True, help_text='Readings a device of this model may send in a burst (overrides the default)', null=True),
+        ),
+        migrations.AddField(
+            model_name='devicemodeldefinition',
+            name='ingest_rate',
+            field=models.FloatField(blank=True, help_text='Sustained readings per second accepted from each device of this model (overrides the default)', null=True),
+        ),
+    ]
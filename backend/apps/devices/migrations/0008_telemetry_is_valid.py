@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0007_devicemodeldefinition_ingest_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telemetry',
+            name='is_valid',
+            field=models.BooleanField(blank=True, help_text='Whether the payload matched the device model schema at ingest (empty if never validated)', null=True),
+        ),
+    ]
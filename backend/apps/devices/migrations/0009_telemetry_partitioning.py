@@ -0,0 +1,143 @@
+# Generated by Django 4.2.13 on 2026-10-16 21:05
+
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+TABLE = "devices_telemetry"
+COLUMNS = '"id", "timestamp", "received_at", "payload", "message_id", "is_valid", "created_at", "device_id"'
+
+
+def _period_start(day, interval):
+    if interval == "week":
+        day -= timedelta(days=day.weekday())
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def _next_month(moment):
+    return moment.replace(year=moment.year + moment.month // 12, month=moment.month % 12 + 1, day=1)
+
+
+def _history_ranges(oldest, current):
+    """Month ranges covering ``[oldest, current)``, the last one cut short at ``current``."""
+    start = _period_start(oldest.date().replace(day=1), "day")
+    while start < current:
+        end = min(_next_month(start), current)
+        yield start, end
+        start = end
+
+
+def _add_indexes(schema_editor, model):
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+    for constraint in model._meta.constraints:
+        schema_editor.add_constraint(model, constraint)
+
+
+def partition_telemetry(apps, schema_editor):
+    """
+    Rebuild the telemetry table as range-partitioned by timestamp (PostgreSQL only).
+
+    Day or week partitions are created from the current period through the
+    next PREMAKE periods; later periods are created by
+    ``manage_telemetry_partitions``. Existing rows older than the current
+    period go into one partition per calendar month, so years of history
+    add a few dozen tables rather than thousands, and rows beyond the
+    premade range land in the default partition. Partitioned tables need
+    the partition key in every unique key, so the primary key becomes
+    ``(id, timestamp)`` and ids come from a plain sequence (identity
+    columns cannot be used).
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    config = getattr(settings, "TELEMETRY_PARTITIONS", {})
+    interval = config.get("INTERVAL", "day")
+    premake = config.get("PREMAKE", 7)
+    step = timedelta(days=7 if interval == "week" else 1)
+    model = apps.get_model("devices", "Telemetry")
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT min("timestamp") FROM {TABLE}')
+        oldest = cursor.fetchone()[0]
+    current = _period_start(datetime.now(dt_timezone.utc).date(), interval)
+    ranges = list(_history_ranges(oldest, current)) if oldest is not None else []
+    start = current
+    while start < current + step * (premake + 1):
+        ranges.append((start, start + step))
+        start += step
+
+    execute = schema_editor.execute
+    execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned")
+    execute(
+        f"""
+        CREATE TABLE {TABLE} (
+            "id" bigint NOT NULL,
+            "timestamp" timestamp with time zone NOT NULL,
+            "received_at" timestamp with time zone NOT NULL,
+            "payload" jsonb NOT NULL,
+            "message_id" varchar(64) NULL,
+            "is_valid" boolean NULL,
+            "created_at" timestamp with time zone NOT NULL,
+            "device_id" bigint NOT NULL
+                REFERENCES "devices_device" ("id") DEFERRABLE INITIALLY DEFERRED
+        ) PARTITION BY RANGE ("timestamp")
+        """
+    )
+    execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+    for start, end in ranges:
+        execute(
+            f"CREATE TABLE {TABLE}_p{start:%Y%m%d} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+
+    execute(f"INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {TABLE}_unpartitioned")
+    # Check the deferred foreign keys now; ALTER TABLE fails while their trigger events are pending
+    execute("SET CONSTRAINTS ALL IMMEDIATE")
+    # Frees the old sequence, index and constraint names
+    execute(f"DROP TABLE {TABLE}_unpartitioned")
+
+    execute(f"CREATE SEQUENCE {TABLE}_id_seq AS bigint OWNED BY {TABLE}.id")
+    execute(f"SELECT setval('{TABLE}_id_seq', coalesce((SELECT max(id) FROM {TABLE}), 0) + 1, false)")
+    execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+    execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY ("id", "timestamp")')
+    _add_indexes(schema_editor, model)
+
+
+def unpartition_telemetry(apps, schema_editor):
+    """Move all partitions back into one plain table."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    model = apps.get_model("devices", "Telemetry")
+
+    execute = schema_editor.execute
+    execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned")
+    execute(f"CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned INCLUDING DEFAULTS)")
+    execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    execute(f"INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {TABLE}_partitioned")
+    execute(f"DROP TABLE {TABLE}_partitioned CASCADE")
+    execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY ("id")')
+    execute(
+        f'ALTER TABLE {TABLE} ADD FOREIGN KEY ("device_id") '
+        f'REFERENCES "devices_device" ("id") DEFERRABLE INITIALLY DEFERRED'
+    )
+    _add_indexes(schema_editor, model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0008_telemetry_is_valid'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='telemetry',
+            name='unique_telemetry_message',
+        ),
+        migrations.AddConstraint(
+            model_name='telemetry',
+            constraint=models.UniqueConstraint(fields=('device', 'message_id', 'timestamp'), name='unique_telemetry_message'),
+        ),
+        migrations.RunPython(partition_telemetry, unpartition_telemetry),
+    ]
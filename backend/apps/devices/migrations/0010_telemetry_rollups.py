@@ -0,0 +1,50 @@
+# Generated by Django 4.2.13 on 2026-10-16 21:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0009_telemetry_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True)),
+                ('received_at', models.DateTimeField(blank=True, null=True)),
+                ('telemetry_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TelemetryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(help_text='Payload key of the metric', max_length=64)),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('bucket', models.DateTimeField(help_text='Start of the time bucket (UTC)')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sum', models.FloatField(default=0.0)),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('last', models.FloatField(help_text='Value of the newest reading in the bucket')),
+                ('last_at', models.DateTimeField(help_text='Timestamp of the newest reading in the bucket')),
+                ('device', models.ForeignKey(help_text='Device that reported the metric', on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='devices.device')),
+            ],
+            options={
+                'verbose_name': 'Telemetry rollup',
+                'verbose_name_plural': 'Telemetry rollups',
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['resolution', 'bucket'], name='devices_tel_resolut_701ae3_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='telemetryrollup',
+            constraint=models.UniqueConstraint(fields=('device', 'metric', 'resolution', 'bucket'), name='unique_telemetry_rollup'),
+        ),
+    ]
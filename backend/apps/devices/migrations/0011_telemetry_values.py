@@ -0,0 +1,42 @@
+# Generated by Django 4.2.13 on 2026-10-16 21:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0010_telemetry_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Metric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Payload key of the metric', max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TelemetryValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(help_text='When the reading was taken')),
+                ('value', models.FloatField()),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_values', to='devices.device')),
+                ('metric', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='values', to='devices.metric')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['metric', 'timestamp'], name='devices_tel_metric__d64c84_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='telemetryvalue',
+            constraint=models.UniqueConstraint(fields=('device', 'metric', 'timestamp'), name='unique_telemetry_value'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.13 on 2026-10-16 21:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_device_states(apps, schema_editor):
+    """Seed each device's state from its newest telemetry row and its row count."""
+    Device = apps.get_model("devices", "Device")
+    DeviceState = apps.get_model("devices", "DeviceState")
+    Telemetry = apps.get_model("devices", "Telemetry")
+
+    counts = dict(
+        Telemetry.objects.order_by().values("device_id").annotate(n=models.Count("id")).values_list("device_id", "n")
+    )
+    states = []
+    for device_pk in Device.objects.filter(pk__in=list(counts)).values_list("pk", flat=True).iterator():
+        latest = (
+            Telemetry.objects.filter(device_id=device_pk)
+            .order_by("-timestamp")
+            .values("payload", "timestamp", "received_at")
+            .first()
+        )
+        states.append(DeviceState(device_id=device_pk, last_values=latest["payload"], reading_count=counts[device_pk], **latest))
+        if len(states) >= 1000:
+            DeviceState.objects.bulk_create(states)
+            states = []
+    DeviceState.objects.bulk_create(states)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0011_telemetry_values'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceState',
+            fields=[
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='devices.device')),
+                ('payload', models.JSONField(help_text='Payload of the newest reading')),
+                ('timestamp', models.DateTimeField(help_text='When the newest reading was taken')),
+                ('received_at', models.DateTimeField(help_text='When the newest reading was received')),
+                ('last_values', models.JSONField(default=dict, help_text='Last known value of every payload key, merged across readings')),
+                ('reading_count', models.BigIntegerField(default=0, help_text='Readings ingested for this device')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Device state',
+                'verbose_name_plural': 'Device states',
+            },
+        ),
+        migrations.RunPython(seed_device_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.13 on 2026-10-16 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0012_device_state'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='rollupwatermark',
+            old_name='received_at',
+            new_name='created_at',
+        ),
+        migrations.AddIndex(
+            model_name='telemetry',
+            index=models.Index(fields=['created_at'], name='devices_tel_created_d6f822_idx'),
+        ),
+    ]
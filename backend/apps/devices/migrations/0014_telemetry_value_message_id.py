@@ -0,0 +1,26 @@
+# Generated by Django 4.2.13 on 2026-10-16 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0013_rollup_watermark_insert_order'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='telemetryvalue',
+            name='unique_telemetry_value',
+        ),
+        migrations.AddField(
+            model_name='telemetryvalue',
+            name='message_id',
+            field=models.CharField(blank=True, help_text='Identity of the source reading, as on its Telemetry row', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='telemetryvalue',
+            constraint=models.UniqueConstraint(fields=('device', 'metric', 'timestamp', 'message_id'), name='unique_telemetry_value'),
+        ),
+    ]
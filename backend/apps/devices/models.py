@@ -11,6 +11,7 @@ from django.utils import timezone
 from datetime import timedelta
 from typing import Dict, Any, Optional
 
+from .validation import validator_for
 
 User = get_user_model()
 
@@ -41,6 +42,16 @@ class DeviceModelDefinition(models.Model):
         default=dict,
         help_text="JSON schema defining the structure of telemetry data"
     )
+    ingest_rate = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Sustained readings per second accepted from each device of this model (overrides the default)"
+    )
+    ingest_burst = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Readings a device of this model may send in a burst (overrides the default)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -54,7 +65,10 @@ class DeviceModelDefinition(models.Model):
 
     def validate_payload(self, payload: Dict[str, Any]) -> bool:
         """
-        Validate a telemetry payload against this model's schema.
+        Validate a telemetry payload against this model's JSON schema.
+        
+        The compiled validator is cached per model_id, version and
+        updated_at, so an edit saved by any process takes effect here.
         
         Args:
             payload: The telemetry data to validate
@@ -62,12 +76,7 @@ class DeviceModelDefinition(models.Model):
         Returns:
             bool: True if payload is valid, False otherwise
         """
-        # Basic validation - can be extended with jsonschema
-        if not self.schema:
-            return True
-            
-        required_fields = self.schema.get('required', [])
-        return all(field in payload for field in required_fields)
+        return validator_for(self.model_id, self.version, self.updated_at, self.schema)(payload)
 
 
 class Gateway(models.Model):
@@ -212,6 +221,10 @@ class Device(models.Model):
         verbose_name = "Device"
         verbose_name_plural = "Devices"
         ordering = ['gateway__name', 'name', 'device_id']
+        indexes = [
+            # MQTT topics carry only device_id; the unique index leads with gateway
+            models.Index(fields=["device_id"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name or self.device_id} ({self.gateway.name or self.gateway.gateway_id})"
@@ -231,6 +244,14 @@ class Device(models.Model):
         """Return the most recent telemetry record for this device."""
         return self.telemetry.first()
 
+    @property
+    def current_state(self) -> Optional['DeviceState']:
+        """Return the latest known state of this device, or ``None`` before its first reading."""
+        try:
+            return self.state
+        except DeviceState.DoesNotExist:
+            return None
+
     def get_telemetry_since(self, since: timezone.datetime) -> models.QuerySet:
         """Get telemetry data since a specific timestamp."""
         return self.telemetry.filter(timestamp__gte=since)
@@ -268,21 +289,46 @@ class Telemetry(models.Model):
         help_text="Device that generated this telemetry data"
     )
     timestamp = models.DateTimeField(
-        auto_now_add=True,
-        help_text="When this telemetry data was received"
+        default=timezone.now,
+        help_text="When the reading was taken (device clock if supplied, otherwise arrival time)"
+    )
+    received_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="When the platform received this telemetry data"
     )
     payload = models.JSONField(
         help_text="The actual telemetry data as JSON"
     )
+    message_id = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text="Identity of the reading used to drop redelivered duplicates"
+    )
+    is_valid = models.BooleanField(
+        null=True,
+        blank=True,
+        help_text="Whether the payload matched the device model schema at ingest (empty if never validated)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = "Telemetry"
         verbose_name_plural = "Telemetry"
         ordering = ['-timestamp']
+        constraints = [
+            # On PostgreSQL the table is partitioned by timestamp (see
+            # apps.devices.partitions), and unique keys must include it
+            models.UniqueConstraint(fields=["device", "message_id", "timestamp"], name="unique_telemetry_message"),
+        ]
+        # Late (buffered) readings land in the middle of the B-tree indexes
+        # below, which handle that fine; arrival order lives in received_at
         indexes = [
             models.Index(fields=["timestamp"]),
             models.Index(fields=["device", "-timestamp"]),
+            models.Index(fields=["received_at"]),
+            # Rollups consume rows in insert order (see apps.devices.rollups)
+            models.Index(fields=["created_at"]),
         ]
 
     def __str__(self) -> str:
@@ -294,7 +340,12 @@ class Telemetry(models.Model):
         return timezone.now() - self.timestamp
 
     def validate_against_schema(self) -> bool:
-        """Validate this telemetry against the device's model definition schema."""
+        """
+        Validate this telemetry against the device's model definition schema.
+        
+        Ingest stores the result in ``is_valid``; this re-checks the payload
+        against the current schema.
+        """
         if not self.device.model_definition:
             return True
         return self.device.model_definition.validate_payload(self.payload)
@@ -308,3 +359,169 @@ class Telemetry(models.Model):
         return key in self.payload
 
 
+
+
+class TelemetryRollup(models.Model):
+    """
+    Aggregate of one numeric telemetry metric of a device over a time bucket.
+
+    Maintained incrementally from raw telemetry by ``apps.devices.rollups``,
+    so range queries over long periods read one row per bucket instead of
+    every raw reading.
+    """
+
+    RESOLUTION_MINUTE = "1m"
+    RESOLUTION_HOUR = "1h"
+    RESOLUTION_DAY = "1d"
+
+    RESOLUTION_CHOICES = [
+        (RESOLUTION_MINUTE, "1 minute"),
+        (RESOLUTION_HOUR, "1 hour"),
+        (RESOLUTION_DAY, "1 day"),
+    ]
+
+    device = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name="rollups",
+        help_text="Device that reported the metric"
+    )
+    metric = models.CharField(max_length=64, help_text="Payload key of the metric")
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField(help_text="Start of the time bucket (UTC)")
+    count = models.PositiveIntegerField(default=0)
+    sum = models.FloatField(default=0.0)
+    min = models.FloatField()
+    max = models.FloatField()
+    last = models.FloatField(help_text="Value of the newest reading in the bucket")
+    last_at = models.DateTimeField(help_text="Timestamp of the newest reading in the bucket")
+
+    class Meta:
+        verbose_name = "Telemetry rollup"
+        verbose_name_plural = "Telemetry rollups"
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=["device", "metric", "resolution", "bucket"], name="unique_telemetry_rollup"
+            ),
+        ]
+        indexes = [
+            # Retention deletes whole resolutions by age
+            models.Index(fields=["resolution", "bucket"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.device_id} {self.metric} {self.resolution} @ {self.bucket}"
+
+    @property
+    def avg(self) -> Optional[float]:
+        """Return the mean value over the bucket."""
+        return self.sum / self.count if self.count else None
+
+
+class RollupWatermark(models.Model):
+    """
+    Position up to which raw telemetry has been folded into rollups.
+
+    Telemetry is consumed in ``(created_at, id)`` order, i.e. by when rows
+    were inserted, so readings that arrive late or are replayed from the
+    spool with an old timestamp are still counted.
+    """
+
+    name = models.CharField(max_length=32, unique=True)
+    created_at = models.DateTimeField(null=True, blank=True)
+    telemetry_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} @ {self.created_at}"
+
+
+class Metric(models.Model):
+    """
+    Dictionary of metric names stored in :class:`TelemetryValue`.
+
+    Values reference their metric by a small integer instead of repeating
+    the name on every row.
+    """
+
+    name = models.CharField(max_length=64, unique=True, help_text="Payload key of the metric")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class TelemetryValue(models.Model):
+    """
+    One numeric reading of one metric, extracted from a telemetry payload.
+
+    A narrow, typed copy of the numeric fields declared in the device
+    model's schema, so analytics can aggregate a double column and index by
+    metric instead of casting JSON per row. Written by ingestion alongside
+    the raw :class:`Telemetry` row.
+    """
+
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="metric_values")
+    metric = models.ForeignKey(Metric, on_delete=models.PROTECT, related_name="values")
+    timestamp = models.DateTimeField(help_text="When the reading was taken")
+    value = models.FloatField()
+    message_id = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text="Identity of the source reading, as on its Telemetry row"
+    )
+
+    class Meta:
+        constraints = [
+            # Drops exactly the redeliveries the Telemetry constraint drops, so distinct
+            # readings sharing a timestamp keep their values; ingest inserts with
+            # ON CONFLICT DO NOTHING. Timestamp comes before message_id for range scans.
+            models.UniqueConstraint(
+                fields=["device", "metric", "timestamp", "message_id"], name="unique_telemetry_value"
+            ),
+        ]
+        indexes = [
+            # Fleet-wide queries on one metric
+            models.Index(fields=["metric", "timestamp"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.device_id} {self.metric_id} @ {self.timestamp} = {self.value}"
+
+
+class DeviceState(models.Model):
+    """
+    Latest known state of a device, one row per device.
+
+    Upserted by ingestion with every flushed batch (see
+    ``apps.devices.state``), so device lists and dashboards read current
+    values with a join instead of querying the telemetry history.
+    """
+
+    device = models.OneToOneField(
+        Device,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="state",
+    )
+    payload = models.JSONField(help_text="Payload of the newest reading")
+    timestamp = models.DateTimeField(help_text="When the newest reading was taken")
+    received_at = models.DateTimeField(help_text="When the newest reading was received")
+    last_values = models.JSONField(
+        default=dict,
+        help_text="Last known value of every payload key, merged across readings"
+    )
+    reading_count = models.BigIntegerField(default=0, help_text="Readings ingested for this device")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Device state"
+        verbose_name_plural = "Device states"
+
+    def __str__(self) -> str:
+        return f"{self.device_id} @ {self.timestamp}"
@@ -0,0 +1,363 @@
+"""
+asyncio implementation of the MQTT bridge.
+
+The threaded :class:`~apps.devices.mqtt_worker.MqttBridge` decodes and
+resolves every message on paho's network thread, so a slow database stalls
+the network loop and the broker eventually drops the connection. Here paho's
+socket is driven by an asyncio event loop that does nothing but read,
+queue and acknowledge. Consumer tasks pull batches from bounded queues and
+run the decode/resolve/insert work on a dedicated thread pool.
+
+Control-plane topics (responses, heartbeats, status, discovery) get their
+own queues, consumers and thread pool, so they never wait behind telemetry
+batches being inserted.
+
+When a queue is full the bridge stops reading from the socket, so TCP flow
+control pushes back on the broker instead of memory growing without bound.
+Messages paho had already read when the pause kicked in go to a small
+per-queue overflow list; past ``overflow_limit`` they are dropped and
+counted.
+"""
+
+import asyncio
+import logging
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+
+import paho.mqtt.client as mqtt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .ingestion import TelemetryRecord
+from .lanes import LANE_CONTROL, LANE_TELEMETRY, QueuedMessage, lane_for, partition
+from .mqtt_worker import MqttBridge, _content_type
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMqttBridge(MqttBridge):
+    """
+    MQTT bridge running paho on an asyncio loop with bounded queues.
+
+    Telemetry is partitioned across ``consumers`` queues by device id, so
+    every device's readings are still written in arrival order; control
+    topics are partitioned the same way across the control lane's own
+    queues. It keeps the
+    :class:`MqttBridge` interface (``start``/``stop``/``publish``/``stats``);
+    the event loop runs in its own thread.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        config = settings.MQTT.get("ASYNC", {})
+        self.consumers = config.get("CONSUMERS", 4)
+        self.queue_size = config.get("QUEUE_SIZE", 10000)
+        self.overflow_limit = config.get("OVERFLOW_LIMIT", 1000)
+        # Reads resume once every queue is at or below this fraction of its size
+        self.resume_ratio = config.get("RESUME_RATIO", 0.5)
+        control = self.lanes_config.get("CONTROL", {})
+        self.control_consumers = control.get("WORKERS", 1) if self.lanes_config.get("ENABLED", True) else 0
+        self.control_queue_size = control.get("QUEUE_SIZE", 10000)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queues: List[asyncio.Queue] = []
+        self._overflow: List[Deque[QueuedMessage]] = []
+        self._tasks: List[asyncio.Task] = []
+        self._executor = ThreadPoolExecutor(max_workers=self.consumers, thread_name_prefix="mqtt-ingest")
+        self._control_executor = (
+            ThreadPoolExecutor(max_workers=self.control_consumers, thread_name_prefix="mqtt-control")
+            if self.control_consumers else None
+        )
+        self._batch = threading.local()
+        self._stopped: Optional[asyncio.Event] = None
+        self._started = threading.Event()
+        self._socket: Optional[socket.socket] = None
+        self._paused = False
+
+        self.overflowed = 0
+        self.dropped = 0
+        self.pauses = 0
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self) -> bool:
+        """Connect and start the event loop thread; returns whether it is running."""
+        if self._running:
+            logger.warning("MQTT Bridge is already running")
+            return True
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run_event_loop, name="mqtt-asyncio", daemon=True)
+        self._thread.start()
+        self._started.wait(timeout=30)
+        return self._running
+
+    def stop(self):
+        if not self._running or self._loop is None:
+            return
+        self._running = False
+        if self._thread and self._thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+            self._thread.join(timeout=30)
+        self._executor.shutdown(wait=True)
+        if self._control_executor is not None:
+            self._control_executor.shutdown(wait=True)
+        self.pipeline.stop()
+        self.liveness.stop()
+        self.invalidation_listener.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        logger.info("MQTT Bridge stopped")
+
+    def _run_event_loop(self) -> None:
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            logger.error(f"MQTT asyncio bridge crashed: {e}")
+        finally:
+            self._running = False
+            self._started.set()
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        # Telemetry queues first, then the control lane's
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.consumers)]
+        self._queues += [asyncio.Queue(maxsize=self.control_queue_size) for _ in range(self.control_consumers)]
+        self._overflow = [deque() for _ in self._queues]
+
+        protocol = mqtt.MQTTv5 if self.shared_group else mqtt.MQTTv311
+        self._client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id, protocol=protocol)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+        self._client.on_socket_open = self._on_socket_open
+        self._client.on_socket_close = self._on_socket_close
+        self._client.on_socket_register_write = self._on_socket_register_write
+        self._client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        try:
+            await self._loop.run_in_executor(None, self._warm_up)
+            await self._loop.run_in_executor(
+                None, self._client.connect, self.broker_host, self.broker_port, self.keepalive
+            )
+        except Exception as e:
+            logger.error(f"Failed to start MQTT Bridge: {e}")
+            self._running = False
+            self._started.set()
+            return
+
+        self._tasks = [asyncio.create_task(self._consume(index)) for index in range(len(self._queues))]
+        self._tasks.append(asyncio.create_task(self._misc_loop()))
+        logger.info(
+            f"MQTT Bridge started (asyncio, {self.consumers} consumers, queue size {self.queue_size}, "
+            f"{self.control_consumers} control consumers)"
+        )
+        self._started.set()
+
+        await self._stopped.wait()
+
+    def _warm_up(self) -> None:
+        self.invalidation_listener.start()
+        registry.warm()
+        self.liveness.start()
+        if self.pipeline.spool is not None:
+            self.pipeline.start()
+        self._start_metrics_server()
+        close_old_connections()
+
+    async def _shutdown(self) -> None:
+        """Stop reading, write everything already queued, then end the loop."""
+        self._pause_reading()
+        if self._client is not None:
+            self._client.disconnect()
+
+        # Overflow is moved into the queues by the consumers; a None ends each consumer
+        for index, queue in enumerate(self._queues):
+            while self._overflow[index]:
+                await asyncio.sleep(0.01)
+            await queue.put(None)
+        await asyncio.gather(*self._tasks[:len(self._queues)], return_exceptions=True)
+        for task in self._tasks[len(self._queues):]:
+            task.cancel()
+        self._stopped.set()
+
+    # -- paho socket integration ---------------------------------------------
+
+    # paho fires these from whichever thread connects or publishes, but the
+    # event loop's reader/writer registry may only be touched from its own thread
+
+    def _in_loop(self, callback, *args) -> None:
+        if threading.current_thread() is self._thread:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(self, client, userdata, sock) -> None:
+        self._in_loop(self._watch_socket, sock)
+
+    def _watch_socket(self, sock) -> None:
+        self._socket = sock
+        self._paused = False
+        self._loop.add_reader(sock, self._client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock) -> None:
+        self._in_loop(self._unwatch_socket, sock)
+
+    def _unwatch_socket(self, sock) -> None:
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+        if self._socket is sock:
+            self._socket = None
+
+    def _on_socket_register_write(self, client, userdata, sock) -> None:
+        self._in_loop(self._loop.add_writer, sock, self._client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock) -> None:
+        self._in_loop(self._loop.remove_writer, sock)
+
+    async def _misc_loop(self) -> None:
+        """Keepalive pings and reconnects, which paho's loop() normally does."""
+        while True:
+            await asyncio.sleep(1)
+            if self._client.loop_misc() == mqtt.MQTT_ERR_NO_CONN and self._running:
+                try:
+                    await self._loop.run_in_executor(None, self._client.reconnect)
+                except Exception as e:
+                    logger.warning(f"MQTT Bridge reconnect failed: {e}")
+                    await asyncio.sleep(5)
+
+    def _pause_reading(self) -> None:
+        if not self._paused and self._socket is not None:
+            self._loop.remove_reader(self._socket)
+            self._paused = True
+            self.pauses += 1
+            logger.debug("MQTT Bridge: ingest queues full, pausing socket reads")
+
+    def _maybe_resume_reading(self) -> None:
+        if not self._paused or not self._running or self._socket is None:
+            return
+        if any(self._overflow) or any(q.qsize() > q.maxsize * self.resume_ratio for q in self._queues):
+            return
+        self._loop.add_reader(self._socket, self._client.loop_read)
+        self._paused = False
+        logger.debug("MQTT Bridge: resuming socket reads")
+
+    # -- receive path --------------------------------------------------------
+
+    def _on_message(self, client, userdata, msg):
+        """Queue the raw message; runs on the event loop and never blocks."""
+        self.messages_received += 1
+        self.bytes_received += len(msg.payload)
+        if self.control_consumers and lane_for(msg.topic) == LANE_CONTROL:
+            index = self.consumers + partition(msg.topic, self.control_consumers)
+        else:
+            index = partition(msg.topic, self.consumers)
+        item = (msg.topic, msg.payload, timezone.now(), _content_type(msg))
+
+        overflow = self._overflow[index]
+        queue = self._queues[index]
+        if not overflow:
+            try:
+                queue.put_nowait(item)
+                if queue.full():
+                    self._pause_reading()
+                return
+            except asyncio.QueueFull:
+                self._pause_reading()
+
+        # Already read from the socket before the pause took effect
+        if len(overflow) < self.overflow_limit:
+            overflow.append(item)
+            self.overflowed += 1
+        else:
+            self.dropped += 1
+            self.metrics.error("overflow")
+            logger.warning(f"MQTT Bridge: ingest overflow full, dropped message on {msg.topic}")
+
+    async def _consume(self, index: int) -> None:
+        queue = self._queues[index]
+        if index < self.consumers:
+            lane, executor = LANE_TELEMETRY, self._executor
+        else:
+            lane, executor = LANE_CONTROL, self._control_executor
+        batch_size = self.pipeline.batch_size
+        flush_interval = self.pipeline.flush_interval
+
+        while True:
+            item = await queue.get()
+            done = item is None
+            batch: List[QueuedMessage] = [] if done else [item]
+            deadline = self._loop.time() + flush_interval
+            while not done and len(batch) < batch_size:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - self._loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    done = True
+                else:
+                    batch.append(item)
+
+            self._refill(index)
+            self._maybe_resume_reading()
+            if batch:
+                await sync_to_async(self._process_batch, thread_sensitive=False, executor=executor)(lane, batch)
+            if done:
+                return
+
+    def _refill(self, index: int) -> None:
+        """Move overflowed messages back into their queue, oldest first."""
+        overflow = self._overflow[index]
+        queue = self._queues[index]
+        while overflow and not queue.full():
+            queue.put_nowait(overflow.popleft())
+
+    def _process_batch(self, lane: str, batch: List[QueuedMessage]) -> None:
+        """Decode, resolve and insert one batch taken off ``lane``; runs on that lane's executor."""
+        self._batch.records = []
+        try:
+            for message in batch:
+                self._process_queued(lane, message)
+            if self.pipeline.spool is not None:
+                # The spool decouples ingest from the database; its flusher inserts
+                self.pipeline.submit_many(self._batch.records)
+            else:
+                self.pipeline.write_batch(self._batch.records)
+        finally:
+            self._batch.records = []
+
+    def _emit(self, records: List[TelemetryRecord]) -> None:
+        self._batch.records.extend(records)
+
+    # -- reporting -----------------------------------------------------------
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "telemetry_queue_depth": sum(q.qsize() for q in self._queues[:self.consumers]),
+            "control_queue_depth": sum(q.qsize() for q in self._queues[self.consumers:]),
+            "pending_rows": self.queue_depth,
+            "queue_depth": self.queue_depth,
+            "overflow_depth": sum(len(o) for o in self._overflow),
+            "overflowed": self.overflowed,
+            "dropped": self.dropped,
+            "pauses": self.pauses,
+            "paused": self._paused,
+        }
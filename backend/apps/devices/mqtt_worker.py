@@ -1,102 +1,719 @@
-import logging
+"""
+MQTT Bridge for AIoT Smart System.
+
+This module provides MQTT communication capabilities for the IoT platform,
+handling device data ingestion, command publishing, and real-time communication
+between the platform and IoT gateways/devices.
+"""
+
 import json
+import logging
+import os
 import threading
 import time
-from typing import Optional, Dict, Any
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
 
 import paho.mqtt.client as mqtt
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .codecs import (
+    DEFAULT_BINARY_CONTENT_TYPE,
+    PayloadError,
+    decode_payload,
+    expand_keys,
+    is_binary,
+    make_jsonable,
+    normalize_content_type,
+)
+from .dedup import DuplicateFilter, message_identity
+from .ingestion import TelemetryPipeline, TelemetryRecord
+from .lanes import LANES, LanePool, QueuedMessage, lane_for
+from .liveness import LivenessWriter
+from .metrics import IngestMetrics, MetricsServer
+from .models import Device, DeviceModelDefinition
+from .ratelimit import limiter_from_settings
+from .registry import DeviceEntry, GatewayEntry, InvalidationListener, publish_invalidation, registry
+from .router import RouteHandler, TopicRouter
+from .spool import spool_from_settings
+from .timestamps import reading_time
 
 logger = logging.getLogger(__name__)
 
+# Device topic layouts: legacy ``devices/{device_id}/...`` needs a global
+# lookup of an id that is only unique per gateway; v2
+# ``gw/{gateway_id}/dev/{device_id}/...`` names the composite key directly
+SCHEME_LEGACY = "legacy"
+SCHEME_V2 = "v2"
+
+DEVICE_TYPES = frozenset(choice for choice, _ in Device.DEVICE_TYPES)
+
+DEVICE_ID_MAX_LENGTH = Device._meta.get_field("device_id").max_length
+
+
+def payload_device_id(value: Any) -> Optional[str]:
+    """
+    Return a device id taken from a payload, or ``None`` if it cannot be stored.
+
+    Strings and integers are accepted; empty, overlong and other values
+    (objects, arrays, booleans) are not, so one bad entry is skipped instead
+    of failing the insert of everything sent with it.
+    """
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        return None
+    device_id = str(value)
+    if not device_id or len(device_id) > DEVICE_ID_MAX_LENGTH:
+        return None
+    return device_id
+
+
+def payload_device_fields(payload: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Return the ``type``, ``model`` and ``name`` a gateway reports for a device, made storable.
+
+    Types other than :attr:`Device.DEVICE_TYPES` become sensors and texts
+    are cut to their column size, so a device can always be created from them.
+    """
+    device_type = payload.get("type")
+    # An unhashable type (array, object) cannot be looked up in DEVICE_TYPES
+    known_type = isinstance(device_type, str) and device_type in DEVICE_TYPES
+    return {
+        "type": device_type if known_type else Device.DEVICE_TYPE_SENSOR,
+        "model": str(payload.get("model") or "")[:Device._meta.get_field("model").max_length],
+        "name": str(payload.get("name") or "")[:Device._meta.get_field("name").max_length],
+    }
+
 
 class MqttBridge:
-    def __init__(self, broker_host='localhost', broker_port=1883, client_id='aiot_backend'):
-        self.broker_host = broker_host
-        self.broker_port = broker_port
-        self.client_id = client_id
-        self._client = None
+    """
+    MQTT Bridge class for handling IoT device communication.
+
+    This class manages the MQTT connection, subscribes to device topics,
+    and processes incoming messages from IoT devices and gateways. Messages
+    are handled on the worker threads of their priority lane (see
+    :mod:`~apps.devices.lanes`); telemetry is handed to a
+    :class:`TelemetryPipeline` and written in batches.
+    """
+
+    def __init__(
+        self,
+        broker_host: Optional[str] = None,
+        broker_port: Optional[int] = None,
+        client_id: Optional[str] = None,
+        shared_group: Optional[str] = None,
+        spool_dir: Optional[str] = None,
+        metrics_port: Optional[int] = None,
+    ) -> None:
+        """
+        Initialize the MQTT bridge with configuration from Django settings.
+
+        Args:
+            broker_host: Broker host, defaults to ``MQTT['HOST']``
+            broker_port: Broker port, defaults to ``MQTT['PORT']``
+            client_id: MQTT client id, unique per process by default
+            shared_group: Subscribe through ``$share/<group>/...`` so the broker
+                load-balances messages across every bridge in the group
+            spool_dir: Write-ahead spool directory, defaults to
+                ``MQTT['SPOOL']['DIR']``; no spool when both are empty
+            metrics_port: Port of the Prometheus metrics endpoint, defaults
+                to ``MQTT['METRICS']['PORT']``; not served when both are empty
+        """
+        self.broker_host = broker_host or settings.MQTT.get("HOST", "localhost")
+        self.broker_port = int(broker_port or settings.MQTT.get("PORT", 1883))
+        self.client_id = client_id or f"aiot-backend-{os.getpid()}-{int(time.time())}"
+        self.keepalive = settings.MQTT.get("KEEPALIVE", 60)
+        self.qos = settings.MQTT.get("QOS", 1)
+        self.shared_group = shared_group
+
+        self.metrics = IngestMetrics()
+        metrics_config = settings.MQTT.get("METRICS", {})
+        metrics_port = metrics_port or metrics_config.get("PORT")
+        self.metrics_server = (
+            MetricsServer(self._render_metrics, int(metrics_port), metrics_config.get("HOST", "0.0.0.0"))
+            if metrics_port else None
+        )
+
+        ingest = settings.MQTT.get("INGEST", {})
+        self.pipeline = TelemetryPipeline(
+            batch_size=ingest.get("BATCH_SIZE", 500),
+            flush_interval=ingest.get("FLUSH_INTERVAL", 0.05),
+            max_pending=ingest.get("MAX_PENDING", 50000),
+            spool=spool_from_settings(spool_dir),
+            replay_batch_size=settings.MQTT.get("SPOOL", {}).get("REPLAY_BATCH_SIZE", 5000),
+            metrics=self.metrics,
+            extract_metrics=ingest.get("EXTRACT_METRICS", True),
+            use_copy=ingest.get("COPY", True),
+        )
+        self.max_batch_readings = ingest.get("MAX_BATCH_READINGS", 5000)
+
+        self.liveness = LivenessWriter(
+            flush_interval=settings.MQTT.get("LIVENESS", {}).get("FLUSH_INTERVAL", 5.0),
+            metrics=self.metrics,
+        )
+        self.invalidation_listener = InvalidationListener()
+        self.rate_limiter = limiter_from_settings()
+        self.duplicates = DuplicateFilter(settings.MQTT.get("DEDUP", {}).get("LRU_SIZE", 100000))
+
+        self.lanes_config = settings.MQTT.get("LANES", {})
+        self.lane_pools: Dict[str, LanePool] = {}
+
+        timestamps = settings.MQTT.get("TIMESTAMPS", {})
+        self.max_future_skew = timestamps.get("MAX_FUTURE_SKEW", 300)
+        self.max_age = timestamps.get("MAX_AGE", 7 * 24 * 3600)
+
+        self._client: Optional[mqtt.Client] = None
         self._connected = False
         self._running = False
-        self._thread = None
-        
-    def _on_connect(self, client, userdata, flags, rc):
-        if rc == 0:
+        self._thread: Optional[threading.Thread] = None
+
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.rejected_timestamps = 0
+        self.batch_readings = 0
+        self.decode_errors = 0
+        self.discovered_devices = 0
+        self.device_messages = {SCHEME_LEGACY: 0, SCHEME_V2: 0}
+        self.router = self._build_router()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code == 0:
             self._connected = True
             logger.info(f"MQTT Bridge connected to {self.broker_host}:{self.broker_port}")
-            client.subscribe("devices/+/response")
-            client.subscribe("devices/+/data")
-            client.subscribe("devices/+/heartbeat")
-            client.subscribe("gateways/+/status")
+            prefix = f"$share/{self.shared_group}/" if self.shared_group else ""
+            client.subscribe([(prefix + topic, self.qos) for topic in self.router.patterns()])
         else:
-            logger.error(f"MQTT Bridge connection failed with code {rc}")
-            
-    def _on_disconnect(self, client, userdata, rc):
+            logger.error(f"MQTT Bridge connection failed with code {reason_code}")
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
         self._connected = False
-        logger.warning(f"MQTT Bridge disconnected with code {rc}")
-        
+        logger.warning(f"MQTT Bridge disconnected with code {reason_code}")
+
     def _on_message(self, client, userdata, msg):
+        """
+        Handle incoming MQTT messages from devices and gateways.
+
+        Runs on the paho network thread, so it only decodes and routes;
+        telemetry rows are written later by the pipeline's flusher thread.
+        """
+        self.messages_received += 1
+        self.bytes_received += len(msg.payload)
+        message = (msg.topic, msg.payload, timezone.now(), _content_type(msg))
+        lane = lane_for(msg.topic)
+        if lane in self.lane_pools:
+            self.lane_pools[lane].submit(message)
+        else:
+            self._process_queued(lane, message)
+
+    def _process_queued(self, lane: str, message: QueuedMessage) -> None:
+        """Process one message taken off ``lane``, recording its queue wait and handling time."""
+        topic, raw, received_at, content_type = message
+        started = time.perf_counter()
+        waited = (timezone.now() - received_at).total_seconds()
+        self._process_message(topic, raw, received_at, content_type)
+        self.metrics.observe_lane(lane, waited, time.perf_counter() - started)
+
+    def _build_router(self) -> TopicRouter:
+        """
+        Register a handler per ingest topic; the patterns are also what the bridge subscribes to.
+
+        Further topics can be routed with ``bridge.router.add(...)`` before
+        :meth:`start`. ``.bin`` variants default to MessagePack payloads.
+        """
+        router = TopicRouter()
+        binary = DEFAULT_BINARY_CONTENT_TYPE
+        device_events = (
+            ("data", self._handle_device_data),
+            ("heartbeat", self._handle_device_heartbeat),
+            ("response", self._handle_device_response),
+        )
+        for event, handler in device_events:
+            router.add(f"devices/+/{event}", self._device_route(SCHEME_LEGACY, handler))
+            router.add(f"gw/+/dev/+/{event}", self._device_route(SCHEME_V2, handler))
+        router.add("devices/+/data.bin", self._device_route(SCHEME_LEGACY, self._handle_device_data), binary)
+        router.add("gw/+/dev/+/data.bin", self._device_route(SCHEME_V2, self._handle_device_data), binary)
+
+        router.add("gateways/+/status", self._gateway_route(self._handle_gateway_status))
+        router.add("gateways/+/discovery", self._gateway_route(self._handle_gateway_discovery))
+        # Batches are arrays, checked by the handler
+        router.add("gateways/+/batch", self._gateway_route(self._handle_gateway_batch), object_payload=False)
+        router.add(
+            "gateways/+/batch.bin", self._gateway_route(self._handle_gateway_batch), binary, object_payload=False
+        )
+        return router
+
+    def _device_route(self, scheme: str, handler: Callable[..., None]) -> RouteHandler:
+        """Adapt a device handler to a route of the legacy or gateway-qualified topic layout."""
+        counts = self.device_messages
+
+        if scheme == SCHEME_V2:
+            def route(params, payload, received_at):
+                counts[SCHEME_V2] += 1
+                handler(params[1], payload, received_at, params[0])
+        else:
+            def route(params, payload, received_at):
+                counts[SCHEME_LEGACY] += 1
+                handler(params[0], payload, received_at)
+        return route
+
+    @staticmethod
+    def _gateway_route(handler: Callable[..., None]) -> RouteHandler:
+        """Adapt a gateway handler to its ``gateways/{gateway_id}/...`` route."""
+        return lambda params, payload, received_at: handler(params[0], payload, received_at)
+
+    def _process_message(
+        self,
+        topic: str,
+        raw: bytes,
+        received_at: datetime,
+        content_type: Optional[str] = None,
+    ) -> None:
+        """
+        Decode one message received at ``received_at`` and dispatch it to its route.
+
+        ``content_type`` is the MQTT v5 content-type property, if any; without
+        one the route's default applies. Topics without a route are only
+        counted (``unmatched_topics``).
+        """
+        started = time.perf_counter()
         try:
-            topic = msg.topic
-            payload = json.loads(msg.payload.decode('utf-8'))
-            logger.debug(f"MQTT message received: {topic} = {payload}")
+            matched = self.router.match(topic)
+            if matched is None:
+                return
+            route, params = matched
+            content_type = normalize_content_type(content_type or route.content_type)
+
+            try:
+                payload = decode_payload(raw, content_type)
+                if is_binary(content_type):
+                    payload = make_jsonable(payload)
+            except PayloadError as e:
+                self.decode_errors += 1
+                self.metrics.error("decode")
+                logger.error(f"Failed to decode payload on {topic}: {e}")
+                return
+            self.metrics.observe("decode", time.perf_counter() - started)
+            if route.object_payload and not isinstance(payload, dict):
+                self.metrics.error("payload")
+                logger.warning(f"Ignoring non-object payload on {topic}")
+                return
+
+            route.handler(params, payload, received_at)
+
         except Exception as e:
-            logger.error(f"Error processing MQTT message: {e}")
-            
-    def start(self):
+            self.metrics.error("handler")
+            logger.error(f"Error processing MQTT message from {topic}: {e}")
+        finally:
+            self.metrics.observe("handle", time.perf_counter() - started)
+
+    def _handle_device_response(
+        self,
+        device_id: str,
+        payload: dict,
+        received_at: datetime,
+        gateway_id: Optional[str] = None,
+    ) -> None:
+        """Command responses are only relayed by the broker for now."""
+        logger.debug(f"Response from device {device_id}: {payload.get('command_id')}")
+
+    def _resolve_device(
+        self,
+        device_id: str,
+        payload: dict,
+        source: str,
+        gateway_id: Optional[str] = None,
+    ) -> Optional[DeviceEntry]:
+        """
+        Resolve a device through the registry, auto-creating it under a known gateway.
+
+        With ``gateway_id`` from a v2 topic the device is looked up by its
+        composite key. Legacy topics fall back to the first device with that
+        id and take the gateway for auto-creation from the payload.
+        """
+        if gateway_id is not None:
+            entry = registry.get_gateway_device(gateway_id, device_id)
+        else:
+            entry = registry.get_device(device_id)
+            gateway_id = payload.get("gateway_id")
+        if entry:
+            return entry
+
+        if not gateway_id:
+            logger.warning(f"{source.capitalize()} without gateway_id: {device_id}")
+            return None
+
+        gateway = registry.get_gateway(gateway_id)
+        if not gateway:
+            logger.warning(f"{source.capitalize()} from unknown gateway: {gateway_id}")
+            return None
+        return self._create_gateway_device(gateway, device_id, payload, source)
+
+    def _handle_device_heartbeat(
+        self,
+        device_id: str,
+        payload: dict,
+        received_at: datetime,
+        gateway_id: Optional[str] = None,
+    ) -> None:
+        """Process device heartbeat messages."""
+        try:
+            entry = self._resolve_device(device_id, payload, "heartbeat", gateway_id)
+            if entry:
+                self.liveness.touch_device(entry.device_pk, entry.gateway_pk, received_at)
+                logger.debug(f"Recorded heartbeat for device {device_id}")
+        except Exception as e:
+            logger.error(f"Error processing heartbeat for {device_id}: {e}")
+
+    def _handle_device_data(
+        self,
+        device_id: str,
+        payload: dict,
+        received_at: datetime,
+        gateway_id: Optional[str] = None,
+    ) -> None:
+        """Resolve the sending device and queue its reading for the next batch."""
+        try:
+            started = time.perf_counter()
+            entry = self._resolve_device(device_id, payload, "telemetry", gateway_id)
+            self.metrics.observe("lookup", time.perf_counter() - started)
+            if not entry:
+                self.metrics.error("unknown_device")
+                return
+            self.liveness.touch_device(entry.device_pk, entry.gateway_pk, received_at)
+
+            # Auto-link model definition if the device announces one
+            model_id = payload.get("model_id")
+            if model_id and not entry.model_definition_id:
+                model_def = DeviceModelDefinition.objects.filter(model_id=model_id).first()
+                if model_def:
+                    device = Device.objects.get(pk=entry.device_pk)
+                    device.model_definition = model_def
+                    device.save(update_fields=["model_definition", "updated_at"])
+                    logger.info(f"Auto-linked device {device_id} to model {model_id}")
+                    entry = registry.get_gateway_device(entry.gateway_id, entry.device_id) or entry
+
+            payload = self._expand_keys(entry, payload)
+            timestamp, rejected = reading_time(payload, received_at, self.max_future_skew, self.max_age)
+            if rejected:
+                self.rejected_timestamps += 1
+
+            message_id = message_identity(payload)
+            if message_id is not None and self.duplicates.seen((entry.device_pk, message_id)):
+                logger.debug(f"Dropped duplicate reading {message_id} from {device_id}")
+                return
+            # After the duplicate check, so redeliveries do not use up the device's budget
+            if not self._within_rate_limit(entry):
+                return
+
+            self._emit([TelemetryRecord(
+                device_pk=entry.device_pk,
+                gateway_pk=entry.gateway_pk,
+                device_id=entry.device_id,
+                gateway_id=entry.gateway_id,
+                device_name=entry.name,
+                device_type=entry.type,
+                payload=payload,
+                timestamp=timestamp,
+                received_at=received_at,
+                message_id=message_id,
+                model_definition_id=entry.model_definition_id,
+            )])
+        except Exception as e:
+            self.metrics.error("handler")
+            logger.error(f"Error processing telemetry for {device_id}: {e}")
+
+    def _handle_gateway_batch(self, gateway_id: str, readings: Any, received_at: datetime) -> None:
+        """
+        Process many readings sent by a gateway in one message.
+
+        The payload is a JSON array of ``{"device_id", "ts", "values"}``
+        objects. Devices are resolved within the sending gateway (ids are only
+        unique per gateway) and unknown ones are auto-created there; all
+        readings are then queued together so they share one bulk insert.
+        """
+        if not isinstance(readings, list):
+            logger.warning(f"Ignoring gateway batch from {gateway_id}: payload is not an array")
+            return
+        if len(readings) > self.max_batch_readings:
+            logger.warning(
+                f"Ignoring gateway batch from {gateway_id}: {len(readings)} readings "
+                f"exceeds the limit of {self.max_batch_readings}"
+            )
+            return
+
+        try:
+            gateway = registry.get_gateway(gateway_id)
+            if not gateway:
+                self.metrics.error("unknown_gateway")
+                logger.warning(f"Batch from unknown gateway: {gateway_id}")
+                return
+            self.liveness.touch_gateway(gateway.gateway_pk, received_at)
+
+            records = []
+            for reading in readings:
+                try:
+                    record = self._batch_record(gateway, reading, received_at)
+                except Exception as e:
+                    # One bad reading must not cost the rest of the batch
+                    self.metrics.error("handler")
+                    logger.error(f"Error processing a reading in batch from gateway {gateway_id}: {e}")
+                    continue
+                if record is not None:
+                    records.append(record)
+
+            self.batch_readings += len(records)
+            self._emit(records)
+            logger.debug(f"Queued {len(records)} of {len(readings)} readings from gateway {gateway_id}")
+        except Exception as e:
+            self.metrics.error("handler")
+            logger.error(f"Error processing batch from gateway {gateway_id}: {e}")
+
+    def _batch_record(self, gateway: GatewayEntry, reading: Any, received_at: datetime) -> Optional[TelemetryRecord]:
+        """Turn one reading of a gateway batch into a record, or ``None`` if it is skipped."""
+        gateway_id = gateway.gateway_id
+        device_id = payload_device_id(reading.get("device_id")) if isinstance(reading, dict) else None
+        if device_id is None:
+            logger.debug(f"Skipping reading without a valid device_id in batch from {gateway_id}")
+            return None
+        values = reading.get("values")
+        if not isinstance(values, dict):
+            logger.debug(f"Skipping reading without values in batch from {gateway_id}")
+            return None
+
+        started = time.perf_counter()
+        entry = registry.get_gateway_device(gateway_id, device_id)
+        if entry is None:
+            entry = self._create_gateway_device(gateway, device_id, reading, "batch")
+        self.metrics.observe("lookup", time.perf_counter() - started)
+        if entry is None:
+            self.metrics.error("unknown_device")
+            return None
+        self.liveness.touch_device(entry.device_pk, entry.gateway_pk, received_at)
+
+        values = self._expand_keys(entry, values)
+        timestamp, rejected = reading_time(reading, received_at, self.max_future_skew, self.max_age)
+        if rejected:
+            self.rejected_timestamps += 1
+        message_id = message_identity(reading)
+        if message_id is not None and self.duplicates.seen((entry.device_pk, message_id)):
+            return None
+        # After the duplicate check, so redeliveries do not use up the device's budget
+        if not self._within_rate_limit(entry):
+            return None
+
+        return TelemetryRecord(
+            device_pk=entry.device_pk,
+            gateway_pk=entry.gateway_pk,
+            device_id=entry.device_id,
+            gateway_id=entry.gateway_id,
+            device_name=entry.name,
+            device_type=entry.type,
+            payload=values,
+            timestamp=timestamp,
+            received_at=received_at,
+            message_id=message_id,
+            model_definition_id=entry.model_definition_id,
+        )
+
+    def _create_gateway_device(
+        self,
+        gateway: GatewayEntry,
+        device_id: str,
+        reading: dict,
+        source: str,
+    ) -> Optional[DeviceEntry]:
+        """Auto-create a device first seen on ``gateway``, described by ``reading``."""
+        with transaction.atomic():
+            _, created = Device.objects.get_or_create(
+                gateway_id=gateway.gateway_pk,
+                device_id=device_id,
+                defaults={**payload_device_fields(reading), "is_online": True},
+            )
+        if created:
+            logger.info(f"Auto-created device {device_id} on gateway {gateway.gateway_id} from {source}")
+        # post_save dropped the negative entry, so this loads the new row
+        return registry.get_gateway_device(gateway.gateway_id, device_id)
+
+    def _handle_gateway_discovery(self, gateway_id: str, payload: dict, received_at: datetime) -> None:
+        """
+        Upsert a gateway's full device inventory from its discovery announcement.
+
+        The payload answers a ``gateways/{id}/discover`` request with
+        ``{"request_id", "devices": [{"device_id", "type", "model", "name"}, ...]}``.
+        Every device is written by one ``INSERT ... ON CONFLICT DO UPDATE``:
+        type and model follow the announcement, while names are only set on
+        new devices so renames made in the platform survive. Devices missing
+        from the inventory are left as they are.
+        """
+        devices = payload.get("devices")
+        if not isinstance(devices, list):
+            logger.warning(f"Ignoring discovery from {gateway_id}: devices is not an array")
+            return
+        if len(devices) > self.max_batch_readings:
+            logger.warning(
+                f"Ignoring discovery from {gateway_id}: {len(devices)} devices "
+                f"exceeds the limit of {self.max_batch_readings}"
+            )
+            return
+
+        try:
+            gateway = registry.get_gateway(gateway_id)
+            if not gateway:
+                self.metrics.error("unknown_gateway")
+                logger.warning(f"Discovery from unknown gateway: {gateway_id}")
+                return
+            self.liveness.touch_gateway(gateway.gateway_pk, received_at)
+
+            rows: Dict[str, Device] = {}
+            for announced in devices:
+                device_id = payload_device_id(announced.get("device_id")) if isinstance(announced, dict) else None
+                if device_id is None:
+                    logger.debug(f"Skipping device without a valid device_id in discovery from {gateway_id}")
+                    continue
+                # Later duplicates win; one statement cannot update a row twice
+                rows[device_id] = Device(
+                    gateway_id=gateway.gateway_pk,
+                    device_id=device_id,
+                    is_online=True,
+                    **payload_device_fields(announced),
+                )
+            if not rows:
+                return
+
+            Device.objects.bulk_create(
+                list(rows.values()),
+                update_conflicts=True,
+                unique_fields=["gateway", "device_id"],
+                update_fields=["type", "model", "updated_at"],
+            )
+            # bulk_create sends no post_save: drop stale entries here and in
+            # other processes, then cache the whole inventory in one query
+            publish_invalidation("gateway", pk=gateway.gateway_pk, key=gateway_id)
+            for entry in registry.load_gateway(gateway_id):
+                if entry.device_id in rows:
+                    self.liveness.touch_device(entry.device_pk, entry.gateway_pk, received_at)
+
+            self.discovered_devices += len(rows)
+            logger.info(f"Discovery from gateway {gateway_id}: upserted {len(rows)} devices")
+        except Exception as e:
+            self.metrics.error("handler")
+            logger.error(f"Error processing discovery from gateway {gateway_id}: {e}")
+
+    def _within_rate_limit(self, entry: DeviceEntry) -> bool:
+        """Take a rate limit token for one reading; ``False`` means it is dropped."""
+        if self.rate_limiter is None:
+            return True
+        override = None
+        if entry.model_definition_id is not None:
+            model = registry.get_model(entry.model_definition_id)
+            override = (model.ingest_rate, model.ingest_burst)
+        return self.rate_limiter.allow(entry, override)
+
+    def _expand_keys(self, entry: DeviceEntry, payload: Dict[Any, Any]) -> Dict[Any, Any]:
+        """Name the integer keys of a binary payload using the device model's key map."""
+        if entry.model_definition_id is None or not any(isinstance(key, int) for key in payload):
+            return payload
+        return expand_keys(payload, registry.get_key_map(entry.model_definition_id))
+
+    def _emit(self, records: List[TelemetryRecord]) -> None:
+        """Hand decoded readings to the writer."""
+        self.pipeline.submit_many(records)
+
+    def _handle_gateway_status(self, gateway_id: str, payload: dict, received_at: datetime) -> None:
+        """Process gateway status messages."""
+        try:
+            gateway = registry.get_gateway(gateway_id)
+            if gateway:
+                self.liveness.touch_gateway(gateway.gateway_pk, received_at)
+                logger.debug(f"Recorded status for gateway {gateway_id}")
+            else:
+                logger.debug(f"Status from unknown gateway: {gateway_id}")
+        except Exception as e:
+            logger.error(f"Error processing gateway status for {gateway_id}: {e}")
+
+    def start(self) -> bool:
+        """Connect and start ingesting; returns whether the bridge is running."""
         if self._running:
             logger.warning("MQTT Bridge is already running")
-            return
-            
+            return True
+
         try:
-            self._client = mqtt.Client()
-            self._client._client_id = self.client_id
+            # Shared subscriptions are an MQTT v5 feature
+            protocol = mqtt.MQTTv5 if self.shared_group else mqtt.MQTTv311
+            self._client = mqtt.Client(
+                mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id, protocol=protocol
+            )
             self._client.on_connect = self._on_connect
             self._client.on_disconnect = self._on_disconnect
             self._client.on_message = self._on_message
-            
-            self._client.connect(self.broker_host, self.broker_port, 60)
-            
+
+            self._client.connect(self.broker_host, self.broker_port, self.keepalive)
+
+            # Resolve topics from memory and keep the cache in step with other processes
+            self.invalidation_listener.start()
+            registry.warm()
+            self.pipeline.start()
+            self.liveness.start()
+            self._start_lanes()
+            self._start_metrics_server()
             self._running = True
             self._thread = threading.Thread(target=self._run_loop, daemon=True)
             self._thread.start()
-            
+
             logger.info("MQTT Bridge started")
-            
+
         except Exception as e:
             logger.error(f"Failed to start MQTT Bridge: {e}")
             self._running = False
-            
+
+        return self._running
+
     def _run_loop(self):
         while self._running:
             try:
-                self._client.loop(timeout=1.0)
+                rc = self._client.loop(timeout=1.0)
+                if rc != mqtt.MQTT_ERR_SUCCESS and self._running:
+                    # loop() does not reconnect by itself
+                    time.sleep(1)
+                    self._client.reconnect()
             except Exception as e:
                 logger.error(f"MQTT loop error: {e}")
                 time.sleep(1)
-                
+
     def stop(self):
         if not self._running:
             return
-            
+
         self._running = False
-        
+
         if self._client:
             self._client.disconnect()
-            
+
         if self._thread:
             self._thread.join(timeout=5)
-            
+
+        # Write whatever is still buffered once no more messages can arrive
+        for pool in self.lane_pools.values():
+            pool.stop()
+        self.pipeline.stop()
+        self.liveness.stop()
+        self.invalidation_listener.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
         logger.info("MQTT Bridge stopped")
-        
+
     def publish(self, topic, payload, qos=1):
         if not self._connected or not self._client:
             logger.error("MQTT Bridge not connected - cannot publish message")
             return False
-            
+
         try:
-            message_json = json.dumps(payload)
+            message_json = json.dumps(payload, default=str)
             result = self._client.publish(topic, message_json, qos)
-            
+
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
                 logger.info(f"MQTT message published: {topic}")
                 logger.debug(f"MQTT payload: {message_json}")
@@ -104,35 +721,258 @@ class MqttBridge:
             else:
                 logger.error(f"Failed to publish MQTT message: {result.rc}")
                 return False
-                
+
         except Exception as e:
             logger.error(f"Error publishing MQTT message: {e}")
             return False
-            
+
     @property
     def is_connected(self):
         return self._connected
 
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def stats(self) -> Dict[str, Any]:
+        """Return connection state and ingest counters for health reporting."""
+        return {
+            "connected": self._connected,
+            "messages_received": self.messages_received,
+            "bytes_received": self.bytes_received,
+            "pending_rows": self.pipeline.pending,
+            "rows_written": self.pipeline.rows_written,
+            "invalid_rows": self.pipeline.invalid_rows,
+            "metric_values_written": self.pipeline.values_written,
+            "batches_written": self.pipeline.batches_written,
+            "failed_batches": self.pipeline.failed_batches,
+            "stored_duplicates": self.pipeline.stored_duplicates,
+            "rejected_rows": self.pipeline.rejected_rows,
+            "pending_liveness": self.liveness.pending,
+            "rejected_timestamps": self.rejected_timestamps,
+            "batch_readings": self.batch_readings,
+            "decode_errors": self.decode_errors,
+            "unmatched_topics": self.router.unmatched,
+            "discovered_devices": self.discovered_devices,
+            **{f"{scheme}_device_messages": count for scheme, count in self.device_messages.items()},
+            **{f"{lane}_queue_depth": pool.depth for lane, pool in self.lane_pools.items()},
+            "duplicates": self.duplicates.duplicates,
+            **(self.rate_limiter.stats() if self.rate_limiter is not None else {}),
+            **(self.pipeline.spool.stats() if self.pipeline.spool is not None else {}),
+        }
+
+    def _start_lanes(self) -> None:
+        """Start a worker pool per priority lane, unless lanes are disabled."""
+        if not self.lanes_config.get("ENABLED", True):
+            return
+        for lane in LANES:
+            config = self.lanes_config.get(lane.upper(), {})
+            pool = LanePool(
+                lane,
+                partial(self._process_queued, lane),
+                workers=config.get("WORKERS", 1),
+                queue_size=config.get("QUEUE_SIZE", 10000),
+            )
+            pool.start()
+            self.lane_pools[lane] = pool
+
+    def _start_metrics_server(self) -> None:
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+
+    def _render_metrics(self) -> str:
+        """Render stage histograms and :meth:`stats` for the metrics endpoint."""
+        return self.metrics.render(self.stats())
+
+
+def _content_type(msg) -> Optional[str]:
+    """Return the MQTT v5 content-type property of a message, if it has one."""
+    properties = getattr(msg, "properties", None)
+    return getattr(properties, "ContentType", None) if properties is not None else None
+
+
+class MqttPublisher:
+    """
+    Publish-only MQTT client for API/ASGI processes.
+
+    Unlike :class:`MqttBridge` it subscribes to nothing and ingests nothing;
+    it only sends commands and discovery requests. It connects lazily on the
+    first publish and lets paho's own thread handle keepalive and reconnects.
+    """
+
+    def __init__(self, broker_host: Optional[str] = None, broker_port: Optional[int] = None) -> None:
+        self.broker_host = broker_host or settings.MQTT.get("HOST", "localhost")
+        self.broker_port = int(broker_port or settings.MQTT.get("PORT", 1883))
+        self.client_id = f"aiot-api-{os.getpid()}-{int(time.time())}"
+        self.keepalive = settings.MQTT.get("KEEPALIVE", 60)
+        self.connect_timeout = settings.MQTT.get("PUBLISH_CONNECT_TIMEOUT", 2.0)
+
+        self._client: Optional[mqtt.Client] = None
+        self._connected = threading.Event()
+        self._lock = threading.Lock()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code == 0:
+            self._connected.set()
+            logger.info(f"MQTT publisher connected to {self.broker_host}:{self.broker_port}")
+        else:
+            logger.error(f"MQTT publisher connection failed with code {reason_code}")
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        self._connected.clear()
+        logger.warning(f"MQTT publisher disconnected with code {reason_code}")
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                return
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id)
+            client.on_connect = self._on_connect
+            client.on_disconnect = self._on_disconnect
+            client.connect_async(self.broker_host, self.broker_port, self.keepalive)
+            client.loop_start()
+            self._client = client
+
+    def publish(self, topic, payload, qos=1):
+        try:
+            self._ensure_started()
+            if not self._connected.wait(timeout=self.connect_timeout):
+                logger.error("MQTT publisher not connected - cannot publish message")
+                return False
+
+            message_json = json.dumps(payload, default=str)
+            result = self._client.publish(topic, message_json, qos)
+
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                logger.info(f"MQTT message published: {topic}")
+                logger.debug(f"MQTT payload: {message_json}")
+                return True
+            else:
+                logger.error(f"Failed to publish MQTT message: {result.rc}")
+                return False
+
+        except Exception as e:
+            logger.error(f"Error publishing MQTT message: {e}")
+            return False
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._client is None:
+                return
+            self._client.disconnect()
+            self._client.loop_stop()
+            self._client = None
+            self._connected.clear()
+
+    @property
+    def is_connected(self):
+        return self._connected.is_set()
+
+
+# Process roles selected by MQTT['ROLE']
+ROLE_PUBLISH = "publish"  # API/ASGI processes: publish commands only
+ROLE_INGEST = "ingest"    # dedicated workers: subscribe and ingest
+ROLE_ALL = "all"          # single-process setups: both in the same process
 
 bridge = None
+publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_role() -> str:
+    """Return this process's MQTT role from settings."""
+    return settings.MQTT.get("ROLE", ROLE_PUBLISH)
+
 
+def start_for_role():
+    """
+    Start what this process's role needs at boot.
 
-def start_bridge_if_enabled():
+    Called from ASGI startup and the first request. Publish-only processes
+    start nothing here; their client connects on first use.
+    """
+    role = get_role()
+    if role == ROLE_INGEST:
+        return start_bridge_if_enabled(shared_group=ingest_shared_group())
+    if role == ROLE_ALL:
+        return start_bridge_if_enabled()
+    return None
+
+
+def ingest_shared_group() -> Optional[str]:
+    """
+    Return the shared subscription group of ingest workers, or ``None`` if it is empty.
+
+    Every ingest bridge joins it, however many run per host, so the broker
+    hands each message to one replica instead of all of them.
+    """
+    return settings.MQTT.get("WORKERS", {}).get("SHARED_GROUP") or None
+
+
+def create_bridge(**kwargs) -> MqttBridge:
+    """Create an ingest bridge using the engine selected by ``MQTT['ENGINE']``."""
+    if settings.MQTT.get("ENGINE", "thread") == "asyncio":
+        from .mqtt_async import AsyncMqttBridge
+
+        return AsyncMqttBridge(**kwargs)
+    return MqttBridge(**kwargs)
+
+
+def start_bridge_if_enabled(shared_group: Optional[str] = None):
     global bridge
-    
+
+    if not settings.MQTT.get("ENABLE", True):
+        logger.info("MQTT Bridge: MQTT is disabled in settings")
+        return None
+
     if bridge is None:
-        bridge = MqttBridge()
+        bridge = create_bridge(shared_group=shared_group)
         bridge.start()
-        time.sleep(1)
         logger.info("MQTT Bridge initialized and started")
-    
+
     return bridge
 
 
+def get_publisher():
+    """
+    Return a client for publishing commands, or ``None`` if MQTT is disabled.
+
+    Reuses the ingest bridge when one runs in this process, otherwise a
+    lazily connected :class:`MqttPublisher`.
+    """
+    global publisher
+
+    if not settings.MQTT.get("ENABLE", True):
+        return None
+    if bridge is not None and bridge.is_connected:
+        return bridge
+    with _publisher_lock:
+        if publisher is None:
+            publisher = MqttPublisher()
+    return publisher
+
+
 def stop_bridge():
-    global bridge
-    
+    global bridge, publisher
+
     if bridge:
         bridge.stop()
         bridge = None
-        logger.info("MQTT Bridge stopped")
\ No newline at end of file
+        logger.info("MQTT Bridge stopped")
+    if publisher:
+        publisher.stop()
+        publisher = None
+
+
+def get_bridge_status() -> Dict[str, Any]:
+    """Get the current status of the MQTT bridge and its ingestion pipeline."""
+    if bridge is None:
+        return {"status": "not_initialized", "connected": False}
+
+    return {
+        "status": "initialized",
+        "host": bridge.broker_host,
+        "port": bridge.broker_port,
+        **bridge.stats(),
+        "registry": registry.stats(),
+    }
@@ -0,0 +1,247 @@
+"""
+Time-range partitions of the telemetry table on PostgreSQL.
+
+Migration ``0009`` turns ``devices_telemetry`` into a table partitioned by
+range of ``timestamp``, one partition per day or ISO week, plus a default
+partition for readings outside every range. Rows that predate the
+migration sit in one partition per calendar month instead. Queries bounded on
+``timestamp`` (``TelemetryViewSet``'s ``since``/``until``, ordering by
+newest first) only touch the partitions they need. Retention drops or
+detaches whole partitions instead of running ``DELETE``.
+
+:func:`manage_partitions` keeps ``PREMAKE`` partitions ready ahead of the
+current one and expires partitions older than ``RETENTION_DAYS``; it runs
+from ``manage.py manage_telemetry_partitions`` and the
+``manage_telemetry_partitions`` Celery beat task. On other databases the
+table is not partitioned and these are no-ops.
+
+Partitions are created empty and attached afterwards, so readings that
+landed in the default partition for a range are moved into it first.
+"""
+
+import logging
+import re
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Telemetry
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = ("day", "week")
+EXPIRE_ACTIONS = ("detach", "drop")
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class Partition(NamedTuple):
+    """An attached range partition covering ``[start, end)``."""
+
+    name: str
+    start: datetime
+    end: datetime
+
+
+def partition_settings() -> Dict:
+    return {
+        "INTERVAL": "day",
+        "PREMAKE": 7,
+        "RETENTION_DAYS": 0,
+        "EXPIRE": "detach",
+        **getattr(settings, "TELEMETRY_PARTITIONS", {}),
+    }
+
+
+def table_name() -> str:
+    return Telemetry._meta.db_table
+
+
+def default_partition_name() -> str:
+    return f"{table_name()}_default"
+
+
+def is_partitioned() -> bool:
+    """Return whether the telemetry table is a partitioned PostgreSQL table."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table_name()])
+        return cursor.fetchone() is not None
+
+
+def period_start(moment: datetime, interval: str) -> datetime:
+    """Return the UTC midnight (Monday for weeks) starting the period that holds ``moment``."""
+    day = moment.astimezone(dt_timezone.utc).date()
+    if interval == "week":
+        day -= timedelta(days=day.weekday())
+    return _midnight(day)
+
+
+def next_period(start: datetime, interval: str) -> datetime:
+    return start + timedelta(days=7 if interval == "week" else 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{table_name()}_p{start:%Y%m%d}"
+
+
+def list_partitions() -> List[Partition]:
+    """Return the attached range partitions, oldest first; the default partition is left out."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [table_name()],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound or "")
+        if match is None:
+            continue
+        partitions.append(Partition(name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+def ensure_partitions(
+    now: Optional[datetime] = None,
+    interval: Optional[str] = None,
+    premake: Optional[int] = None,
+    dry_run: bool = False,
+) -> List[str]:
+    """
+    Create the partitions from the current period up to ``premake`` periods ahead.
+
+    Periods already covered, even partly by partitions of another interval,
+    are skipped. Returns the names of the created partitions.
+    """
+    config = partition_settings()
+    interval = interval or config["INTERVAL"]
+    premake = config["PREMAKE"] if premake is None else premake
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown partition interval: {interval}")
+
+    now = now or timezone.now()
+    cursor_at = period_start(now, interval)
+    horizon = cursor_at
+    for _ in range(premake + 1):
+        horizon = next_period(horizon, interval)
+
+    existing = list_partitions()
+    created = []
+    while cursor_at < horizon:
+        covering = next((p for p in existing if p.start <= cursor_at < p.end), None)
+        if covering is not None:
+            cursor_at = covering.end
+            continue
+        end = next_period(cursor_at, interval)
+        # Stop short of a partition that starts inside this period
+        end = min([end] + [p.start for p in existing if cursor_at < p.start < end])
+        name = partition_name(cursor_at)
+        if not dry_run:
+            create_partition(name, cursor_at, end)
+        created.append(name)
+        existing.append(Partition(name, cursor_at, end))
+        cursor_at = end
+    return created
+
+
+def create_partition(name: str, start: datetime, end: datetime) -> None:
+    """
+    Create and attach the partition ``name`` for ``[start, end)``.
+
+    Readings for the range already in the default partition are moved into
+    it before attaching, which would otherwise fail. Attaching creates the
+    parent's indexes and constraints on the new partition.
+    """
+    quote = connection.ops.quote_name
+    table, default, partition = quote(table_name()), quote(default_partition_name()), quote(name)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f"INSERT INTO {partition} SELECT * FROM moved",
+            [start, end],
+        )
+        if cursor.rowcount:
+            logger.info(f"Moved {cursor.rowcount} telemetry rows from the default partition into {name}")
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES FROM (%s) TO (%s)", [start, end])
+    logger.info(f"Created telemetry partition {name} for {start:%Y-%m-%d} .. {end:%Y-%m-%d}")
+
+
+def expire_partitions(
+    now: Optional[datetime] = None,
+    retention_days: Optional[int] = None,
+    action: Optional[str] = None,
+    dry_run: bool = False,
+) -> List[str]:
+    """
+    Detach or drop partitions whose whole range is older than ``retention_days``.
+
+    Detached partitions stay in the database as plain tables (for archiving)
+    under the same name. Readings that old in the default partition are
+    deleted. Returns the names of the expired partitions; with a retention
+    of ``0`` nothing expires.
+    """
+    config = partition_settings()
+    retention_days = config["RETENTION_DAYS"] if retention_days is None else retention_days
+    action = action or config["EXPIRE"]
+    if action not in EXPIRE_ACTIONS:
+        raise ValueError(f"Unknown partition expiry action: {action}")
+    if not retention_days:
+        return []
+
+    cutoff = (now or timezone.now()) - timedelta(days=retention_days)
+    expired = [partition for partition in list_partitions() if partition.end <= cutoff]
+    if dry_run:
+        return [partition.name for partition in expired]
+
+    quote = connection.ops.quote_name
+    table = quote(table_name())
+    for partition in expired:
+        with transaction.atomic(), connection.cursor() as cursor:
+            if action == "drop":
+                cursor.execute(f"DROP TABLE {quote(partition.name)}")
+            else:
+                cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {quote(partition.name)}")
+        logger.info(f"Expired telemetry partition {partition.name} ({action}, retention {retention_days} days)")
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {quote(default_partition_name())} WHERE "timestamp" < %s', [cutoff])
+    return [partition.name for partition in expired]
+
+
+def manage_partitions(now: Optional[datetime] = None, dry_run: bool = False, **options) -> Dict[str, List[str]]:
+    """
+    Create upcoming partitions and expire old ones.
+
+    Keyword options override ``settings.TELEMETRY_PARTITIONS``: ``interval``,
+    ``premake``, ``retention_days`` and ``action``. Returns the created and
+    expired partition names; both are empty when the table is not
+    partitioned.
+    """
+    if not is_partitioned():
+        return {"created": [], "expired": []}
+    return {
+        "created": ensure_partitions(now, options.get("interval"), options.get("premake"), dry_run),
+        "expired": expire_partitions(now, options.get("retention_days"), options.get("action"), dry_run),
+    }
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def _parse_bound(value: str) -> datetime:
+    # pg_get_expr renders timestamptz bounds like '2026-10-16 00:00:00+00'
+    parsed = datetime.fromisoformat(re.sub(r"([+-]\d{2})$", r"\1:00", value))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=dt_timezone.utc)
@@ -0,0 +1,151 @@
+"""
+Token-bucket rate limiting for telemetry ingestion.
+
+A single device flooding ``devices/+/data`` should not be able to take the
+bridge and the Telemetry table away from everyone else. Every reading takes
+one token from its device's, gateway's and owner's buckets before any
+database work happens; a reading that finds any bucket empty is over the
+limit. Over-limit readings are dropped, or in ``downsample`` mode thinned
+to one per device every ``downsample_interval`` seconds.
+
+Device limits can be overridden per :class:`DeviceModelDefinition`
+(``ingest_rate``/``ingest_burst``). A rate of ``0`` or ``None`` disables
+that level.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .registry import DeviceEntry
+
+MODE_DROP = "drop"
+MODE_DOWNSAMPLE = "downsample"
+
+SCOPES = ("device", "gateway", "owner")
+
+
+class TokenBucket:
+    """``burst`` tokens refilled at ``rate`` tokens per second."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float) -> float:
+        """Add the tokens earned since the last call and return the current level."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+
+class IngestRateLimiter:
+    """
+    Device, gateway and owner token buckets checked together per reading.
+
+    Args:
+        limits: ``{"DEVICE": {"RATE", "BURST"}, "GATEWAY": {...}, "OWNER": {...}}``
+            with rates in readings per second
+        mode: ``"drop"`` or ``"downsample"``
+        downsample_interval: Seconds between over-limit readings kept per
+            device in downsample mode
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, float]], mode: str = MODE_DROP, downsample_interval: float = 1.0) -> None:
+        self.limits = {scope: _limit(limits.get(scope.upper(), {})) for scope in SCOPES}
+        self.mode = mode
+        self.downsample_interval = downsample_interval
+
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, int], TokenBucket] = {}
+        self._last_sample: Dict[int, float] = {}
+
+        self.limited = {scope: 0 for scope in SCOPES}
+        self.dropped = 0
+        self.downsampled = 0
+
+    def allow(self, entry: DeviceEntry, override: Optional[Tuple[Optional[float], Optional[int]]] = None) -> bool:
+        """
+        Take a token for one reading from ``entry``; return whether to keep it.
+
+        Args:
+            entry: The device sending the reading
+            override: ``(rate, burst)`` for the device bucket from its model
+                definition; ``None`` members fall back to the defaults
+        """
+        device_limit = self.limits["device"]
+        if override is not None and (override[0] is not None or override[1] is not None):
+            rate = override[0] if override[0] is not None else device_limit[0]
+            burst = override[1] if override[1] is not None else max(device_limit[1], rate or 0)
+            device_limit = (rate, burst)
+
+        now = time.monotonic()
+        with self._lock:
+            checks = (
+                ("device", entry.device_pk, device_limit),
+                ("gateway", entry.gateway_pk, self.limits["gateway"]),
+                ("owner", entry.owner_id, self.limits["owner"]),
+            )
+            buckets = []
+            for scope, key, (rate, burst) in checks:
+                if not rate:
+                    continue
+                bucket = self._bucket(scope, key, rate, burst, now)
+                if bucket.refill(now) < 1:
+                    self.limited[scope] += 1
+                    return self._over_limit(entry.device_pk, now)
+                buckets.append(bucket)
+            for bucket in buckets:
+                bucket.tokens -= 1
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        """Return over-limit counters."""
+        return {
+            **{f"rate_limited_{scope}": count for scope, count in self.limited.items()},
+            "rate_limit_dropped": self.dropped,
+            "rate_limit_downsampled": self.downsampled,
+        }
+
+    def _bucket(self, scope: str, key: int, rate: float, burst: float, now: float) -> TokenBucket:
+        bucket = self._buckets.get((scope, key))
+        if bucket is None:
+            bucket = self._buckets[(scope, key)] = TokenBucket(rate, burst, now)
+        elif bucket.rate != rate or bucket.burst != burst:
+            # Limits changed (e.g. a model definition override was edited)
+            bucket.rate, bucket.burst = rate, burst
+        return bucket
+
+    def _over_limit(self, device_pk: int, now: float) -> bool:
+        if self.mode == MODE_DOWNSAMPLE:
+            last = self._last_sample.get(device_pk)
+            if last is None or now - last >= self.downsample_interval:
+                self._last_sample[device_pk] = now
+                self.downsampled += 1
+                return True
+        self.dropped += 1
+        return False
+
+
+def _limit(config: Dict[str, float]) -> Tuple[float, float]:
+    rate = config.get("RATE") or 0
+    burst = config.get("BURST") or rate
+    return rate, burst
+
+
+def limiter_from_settings() -> Optional[IngestRateLimiter]:
+    """Build the limiter configured in ``MQTT['RATE_LIMITS']``, or ``None`` when disabled."""
+    from django.conf import settings
+
+    config = settings.MQTT.get("RATE_LIMITS", {})
+    if not config.get("ENABLED", False):
+        return None
+    return IngestRateLimiter(
+        config,
+        mode=config.get("MODE", MODE_DROP),
+        downsample_interval=config.get("DOWNSAMPLE_INTERVAL", 1.0),
+    )
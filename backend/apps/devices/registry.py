@@ -0,0 +1,406 @@
+"""
+In-process device registry for the MQTT bridge.
+
+Resolving ``devices/{device_id}/...`` topics to database rows is the most
+frequent query on the ingest path. The registry keeps the handful of columns
+the bridge needs in memory, remembers ids that do not exist so unregistered
+devices cannot hammer the database, and is kept correct by model signals in
+this process and a Redis pub/sub channel across processes.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+
+from .codecs import schema_key_map
+from .models import Device, DeviceModelDefinition, Gateway
+from .telemetry_values import schema_metrics
+from .validation import PayloadValidator, compile_schema, forget as forget_validators, validator_for
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceEntry(NamedTuple):
+    """Cached identity of a device, enough to ingest its messages."""
+
+    device_pk: int
+    device_id: str
+    gateway_pk: int
+    gateway_id: str
+    type: str
+    model_definition_id: Optional[int]
+    name: str
+    owner_id: int
+
+
+class GatewayEntry(NamedTuple):
+    """Cached identity of a gateway."""
+
+    gateway_pk: int
+    gateway_id: str
+    owner_id: int
+
+
+class ModelEntry(NamedTuple):
+    """Cached ingest settings and compiled schema of a device model definition."""
+
+    model_definition_pk: int
+    key_map: Dict[int, str]
+    ingest_rate: Optional[float]
+    ingest_burst: Optional[int]
+    validator: PayloadValidator
+    # Numeric fields copied into TelemetryValue
+    metrics: Tuple[str, ...] = ()
+
+
+class DeviceRegistry:
+    """
+    Thread-safe cache of devices and gateways keyed by their MQTT ids.
+
+    Lookups that miss the cache fall through to the database once; ids that
+    do not exist are remembered for ``negative_ttl`` seconds.
+    """
+
+    def __init__(self, negative_ttl: float = 60.0) -> None:
+        self.negative_ttl = negative_ttl
+        self._lock = threading.RLock()
+        self._devices: Dict[str, DeviceEntry] = {}
+        self._device_ids_by_pk: Dict[int, str] = {}
+        # device_id is only unique per gateway; gateway topics resolve by both
+        self._scoped: Dict[Tuple[str, str], DeviceEntry] = {}
+        self._scoped_keys_by_pk: Dict[int, Tuple[str, str]] = {}
+        self._missing_scoped: Dict[Tuple[str, str], float] = {}
+        self._gateways: Dict[str, GatewayEntry] = {}
+        self._missing_devices: Dict[str, float] = {}
+        self._missing_gateways: Dict[str, float] = {}
+        # Binary payload key maps and rate limit overrides by model definition pk
+        self._models: Dict[int, ModelEntry] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    def warm(self) -> int:
+        """Load every device and gateway into the cache; returns the device count."""
+        devices = Device.objects.select_related("gateway").order_by(*Device._meta.ordering)
+        gateways = Gateway.objects.only("id", "gateway_id", "owner")
+
+        with self._lock:
+            self.clear()
+            for gateway in gateways.iterator():
+                self._gateways[gateway.gateway_id] = _gateway_entry(gateway)
+            for device in devices.iterator():
+                entry = _device_entry(device)
+                self._store_scoped(entry)
+                # Keep the first match in default ordering, as .first() did
+                if device.device_id not in self._devices:
+                    self._store_device(entry)
+
+        logger.info(f"Device registry warmed with {len(self._devices)} devices and {len(self._gateways)} gateways")
+        return len(self._devices)
+
+    def load_gateway(self, gateway_id: str) -> List[DeviceEntry]:
+        """Load every device behind one gateway into the cache with one query and return them."""
+        devices = list(Device.objects.filter(gateway__gateway_id=gateway_id).select_related("gateway"))
+        entries = [_device_entry(device) for device in devices]
+        with self._lock:
+            if devices:
+                self._gateways[gateway_id] = _gateway_entry(devices[0].gateway)
+            for entry in entries:
+                self._store_scoped(entry)
+        return entries
+
+    def get_device(self, device_id: str) -> Optional[DeviceEntry]:
+        """Resolve a device id from a topic, or ``None`` if it is not registered."""
+        entry = self._devices.get(device_id)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        if self._is_missing(self._missing_devices, device_id):
+            self.negative_hits += 1
+            return None
+
+        self.misses += 1
+        device = Device.objects.filter(device_id=device_id).select_related("gateway").first()
+        with self._lock:
+            if device is None:
+                self._missing_devices[device_id] = time.monotonic() + self.negative_ttl
+                return None
+            entry = _device_entry(device)
+            self._store_device(entry)
+            return entry
+
+    def get_gateway_device(self, gateway_id: str, device_id: str) -> Optional[DeviceEntry]:
+        """Resolve a device id reported by a specific gateway, or ``None``."""
+        key = (gateway_id, device_id)
+        entry = self._scoped.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        if self._is_missing(self._missing_scoped, key):
+            self.negative_hits += 1
+            return None
+
+        self.misses += 1
+        device = (
+            Device.objects.filter(gateway__gateway_id=gateway_id, device_id=device_id)
+            .select_related("gateway")
+            .first()
+        )
+        with self._lock:
+            if device is None:
+                self._missing_scoped[key] = time.monotonic() + self.negative_ttl
+                return None
+            entry = _device_entry(device)
+            self._store_scoped(entry)
+            return entry
+
+    def get_gateway(self, gateway_id: str) -> Optional[GatewayEntry]:
+        """Resolve a gateway id, or ``None`` if it is not registered."""
+        entry = self._gateways.get(gateway_id)
+        if entry is not None:
+            return entry
+        if self._is_missing(self._missing_gateways, gateway_id):
+            self.negative_hits += 1
+            return None
+
+        gateway = Gateway.objects.filter(gateway_id=gateway_id).only("id", "gateway_id", "owner").first()
+        with self._lock:
+            if gateway is None:
+                self._missing_gateways[gateway_id] = time.monotonic() + self.negative_ttl
+                return None
+            entry = _gateway_entry(gateway)
+            self._gateways[gateway_id] = entry
+            return entry
+
+    def get_model(self, model_definition_id: int) -> ModelEntry:
+        """Return the cached ingest settings and payload validator of a device model definition."""
+        entry = self._models.get(model_definition_id)
+        if entry is None:
+            row = (
+                DeviceModelDefinition.objects.filter(pk=model_definition_id)
+                .values("model_id", "version", "updated_at", "schema", "ingest_rate", "ingest_burst")
+                .first()
+            ) or {}
+            schema = row.get("schema") or {}
+            entry = ModelEntry(
+                model_definition_pk=model_definition_id,
+                key_map=schema_key_map(schema),
+                ingest_rate=row.get("ingest_rate"),
+                ingest_burst=row.get("ingest_burst"),
+                validator=(
+                    validator_for(row["model_id"], row["version"], row["updated_at"], schema)
+                    if row else compile_schema({})
+                ),
+                metrics=schema_metrics(schema),
+            )
+            with self._lock:
+                self._models[model_definition_id] = entry
+        return entry
+
+    def get_key_map(self, model_definition_id: int) -> Dict[int, str]:
+        """Return the integer key map declared by a device model's schema."""
+        return self.get_model(model_definition_id).key_map
+
+    def invalidate_device(self, device_pk: Optional[int] = None, device_id: Optional[str] = None) -> None:
+        """Forget a device by primary key and/or MQTT id."""
+        with self._lock:
+            if device_pk is not None:
+                old_id = self._device_ids_by_pk.pop(device_pk, None)
+                if old_id is not None:
+                    self._devices.pop(old_id, None)
+                key = self._scoped_keys_by_pk.pop(device_pk, None)
+                if key is not None:
+                    self._scoped.pop(key, None)
+            if device_id is not None:
+                entry = self._devices.pop(device_id, None)
+                if entry is not None:
+                    self._device_ids_by_pk.pop(entry.device_pk, None)
+                self._missing_devices.pop(device_id, None)
+                for key in [key for key in self._missing_scoped if key[1] == device_id]:
+                    del self._missing_scoped[key]
+
+    def invalidate_gateway(self, gateway_pk: Optional[int] = None, gateway_id: Optional[str] = None) -> None:
+        """Forget a gateway and every cached device behind it."""
+        with self._lock:
+            if gateway_id is not None:
+                self._gateways.pop(gateway_id, None)
+                self._missing_gateways.pop(gateway_id, None)
+                # Devices may have been added behind it without per-row signals
+                for key in [key for key in self._missing_scoped if key[0] == gateway_id]:
+                    del self._missing_scoped[key]
+                self._missing_devices.clear()
+            if gateway_pk is not None:
+                for gw_id, entry in list(self._gateways.items()):
+                    if entry.gateway_pk == gateway_pk:
+                        del self._gateways[gw_id]
+                for entry in list(self._devices.values()) + list(self._scoped.values()):
+                    if entry.gateway_pk == gateway_pk:
+                        self.invalidate_device(entry.device_pk, entry.device_id)
+
+    def apply_invalidation(self, message: Dict) -> None:
+        """Apply an invalidation message published by :func:`publish_invalidation`."""
+        kind = message.get("kind")
+        if kind == "device":
+            self.invalidate_device(message.get("pk"), message.get("id"))
+        elif kind == "gateway":
+            self.invalidate_gateway(message.get("pk"), message.get("id"))
+        elif kind == "model":
+            with self._lock:
+                self._models.pop(message.get("pk"), None)
+            forget_validators(message.get("id"))
+        elif kind == "all":
+            self.clear()
+            forget_validators()
+
+    def clear(self) -> None:
+        """Drop all cached entries, positive and negative."""
+        with self._lock:
+            self._devices.clear()
+            self._device_ids_by_pk.clear()
+            self._scoped.clear()
+            self._scoped_keys_by_pk.clear()
+            self._missing_scoped.clear()
+            self._gateways.clear()
+            self._missing_devices.clear()
+            self._missing_gateways.clear()
+            self._models.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache size and hit counters."""
+        return {
+            "devices": len(self._devices),
+            "gateways": len(self._gateways),
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+        }
+
+    def _store_device(self, entry: DeviceEntry) -> None:
+        self._devices[entry.device_id] = entry
+        self._device_ids_by_pk[entry.device_pk] = entry.device_id
+        self._missing_devices.pop(entry.device_id, None)
+
+    def _store_scoped(self, entry: DeviceEntry) -> None:
+        key = (entry.gateway_id, entry.device_id)
+        self._scoped[key] = entry
+        self._scoped_keys_by_pk[entry.device_pk] = key
+        self._missing_scoped.pop(key, None)
+
+    def _is_missing(self, missing: Dict[str, float], key: str) -> bool:
+        expires = missing.get(key)
+        if expires is None:
+            return False
+        if expires > time.monotonic():
+            return True
+        missing.pop(key, None)
+        return False
+
+
+def _device_entry(device: Device) -> DeviceEntry:
+    return DeviceEntry(
+        device_pk=device.pk,
+        device_id=device.device_id,
+        gateway_pk=device.gateway_id,
+        gateway_id=device.gateway.gateway_id,
+        type=device.type,
+        model_definition_id=device.model_definition_id,
+        name=device.name,
+        owner_id=device.gateway.owner_id,
+    )
+
+
+def _gateway_entry(gateway: Gateway) -> GatewayEntry:
+    return GatewayEntry(gateway_pk=gateway.pk, gateway_id=gateway.gateway_id, owner_id=gateway.owner_id)
+
+
+def _registry_settings() -> Dict:
+    return settings.MQTT.get("REGISTRY", {})
+
+
+registry = DeviceRegistry(negative_ttl=_registry_settings().get("NEGATIVE_TTL", 60.0))
+
+
+def publish_invalidation(kind: str, pk: Optional[int] = None, key: Optional[str] = None) -> None:
+    """
+    Invalidate a registry entry in this process and broadcast it to others.
+
+    Args:
+        kind: ``"device"``, ``"gateway"``, ``"model"`` or ``"all"``
+        pk: Primary key of the changed row
+        key: MQTT id (device_id or gateway_id) of the changed row
+    """
+    message = {"kind": kind, "pk": pk, "id": key}
+    registry.apply_invalidation(message)
+
+    channel = _registry_settings().get("INVALIDATION_CHANNEL")
+    if not channel:
+        return
+    try:
+        _get_redis().publish(channel, json.dumps(message))
+    except Exception as e:
+        logger.warning(f"Device registry: could not publish invalidation - {e}")
+
+
+_redis_client = None
+
+
+def _get_redis():
+    global _redis_client
+    if _redis_client is None:
+        import redis
+
+        _redis_client = redis.Redis.from_url(
+            _registry_settings().get("REDIS_URL", "redis://localhost:6379/0"),
+            socket_connect_timeout=2,
+        )
+    return _redis_client
+
+
+class InvalidationListener:
+    """Background subscriber applying registry invalidations from other processes."""
+
+    def __init__(self, target: DeviceRegistry = registry) -> None:
+        self.registry = target
+        self.channel = _registry_settings().get("INVALIDATION_CHANNEL")
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._running or not self.channel:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="registry-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+
+    def _run(self) -> None:
+        reconnecting = False
+        while self._running:
+            pubsub = None
+            try:
+                pubsub = _get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                if reconnecting:
+                    # Invalidations published while we were away are lost
+                    self.registry.clear()
+                reconnecting = True
+                while self._running:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self.registry.apply_invalidation(json.loads(message["data"]))
+            except Exception as e:
+                logger.warning(f"Device registry: invalidation listener error - {e}")
+                time.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
@@ -0,0 +1,267 @@
+"""
+Continuous downsampling of numeric telemetry.
+
+Every numeric top-level payload value (booleans and identity keys such as
+``ts``/``seq``/``msg_id`` excluded) is folded into :class:`TelemetryRollup`
+rows at 1-minute, 1-hour and 1-day resolution, keeping min, max, sum,
+count and the newest value. Charts and range queries over weeks then read a
+few hundred rollup rows per metric instead of every raw reading.
+
+Rollups are maintained incrementally: :func:`update_rollups` reads the raw
+telemetry received since a watermark, aggregates it in memory and merges
+the result into the existing buckets, so nothing is ever recomputed from
+scratch. Telemetry is consumed in insert order (``created_at``, set when
+the row is written) rather than by reading or arrival time, so buffered
+readings and rows replayed from the spool after an outage are not skipped
+however old their timestamps are. Rows inserted in the last
+``LAG_SECONDS`` are left for the next run: bridge workers commit
+concurrently, so a row can become visible after a newer one, and the lag
+must stay longer than the slowest insert transaction (plus clock skew
+between hosts).
+Readings that failed schema validation are not rolled up.
+
+The merge runs under a row lock on the watermark, so overlapping runs (a
+slow beat task, a manual ``update_telemetry_rollups``) serialize instead of
+double counting.
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .dedup import MESSAGE_ID_KEYS, SEQUENCE_KEY
+from .models import RollupWatermark, Telemetry, TelemetryRollup
+from .timestamps import TIMESTAMP_KEYS
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = {
+    TelemetryRollup.RESOLUTION_MINUTE: timedelta(minutes=1),
+    TelemetryRollup.RESOLUTION_HOUR: timedelta(hours=1),
+    TelemetryRollup.RESOLUTION_DAY: timedelta(days=1),
+}
+
+WATERMARK = "telemetry"
+
+# Payload keys that are numeric but not measurements
+IGNORED_KEYS = frozenset({"gateway_id", "model_id", SEQUENCE_KEY, *TIMESTAMP_KEYS, *MESSAGE_ID_KEYS})
+
+_METRIC_MAX_LENGTH = TelemetryRollup._meta.get_field("metric").max_length
+
+# (device pk, metric, resolution, bucket start)
+RollupKey = Tuple[int, str, str, datetime]
+
+
+def rollup_settings() -> Dict:
+    return {
+        "BATCH_SIZE": 5000,
+        "MAX_BATCHES": 100,
+        "LAG_SECONDS": 120,
+        "RETENTION_DAYS": {},
+        **getattr(settings, "TELEMETRY_ROLLUPS", {}),
+    }
+
+
+def bucket_start(moment: datetime, resolution: str) -> datetime:
+    """Return the UTC start of the ``resolution`` bucket holding ``moment``."""
+    moment = moment.astimezone(dt_timezone.utc)
+    if resolution == TelemetryRollup.RESOLUTION_DAY:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == TelemetryRollup.RESOLUTION_HOUR:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(second=0, microsecond=0)
+
+
+def choose_resolution(since: Optional[datetime], until: Optional[datetime]) -> str:
+    """
+    Pick the coarsest resolution that still gives a useful number of points.
+
+    Up to 6 hours reads minutes, up to 31 days hours, anything longer (or
+    open-ended) days.
+    """
+    if since is None:
+        return TelemetryRollup.RESOLUTION_DAY
+    span = (until or timezone.now()) - since
+    if span <= timedelta(hours=6):
+        return TelemetryRollup.RESOLUTION_MINUTE
+    if span <= timedelta(days=31):
+        return TelemetryRollup.RESOLUTION_HOUR
+    return TelemetryRollup.RESOLUTION_DAY
+
+
+def numeric_metrics(payload: Any) -> Iterator[Tuple[str, float]]:
+    """Yield the ``(key, value)`` pairs of a payload that can be rolled up."""
+    if not isinstance(payload, dict):
+        return
+    for key, value in payload.items():
+        if key in IGNORED_KEYS or isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if len(key) > _METRIC_MAX_LENGTH or not math.isfinite(value):
+            continue
+        yield key, float(value)
+
+
+class _Aggregate:
+    __slots__ = ("count", "sum", "min", "max", "last", "last_at")
+
+    def __init__(self, value: float, at: datetime) -> None:
+        self.count = 1
+        self.sum = value
+        self.min = value
+        self.max = value
+        self.last = value
+        self.last_at = at
+
+    def add(self, value: float, at: datetime) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if at >= self.last_at:
+            self.last, self.last_at = value, at
+
+    def merge_into(self, rollup: TelemetryRollup) -> None:
+        rollup.count += self.count
+        rollup.sum += self.sum
+        rollup.min = min(rollup.min, self.min)
+        rollup.max = max(rollup.max, self.max)
+        if self.last_at >= rollup.last_at:
+            rollup.last, rollup.last_at = self.last, self.last_at
+
+
+def aggregate(readings: Iterable[Tuple[int, datetime, Any]]) -> Dict[RollupKey, _Aggregate]:
+    """Aggregate ``(device pk, timestamp, payload)`` readings into every resolution."""
+    aggregates: Dict[RollupKey, _Aggregate] = {}
+    for device_pk, timestamp, payload in readings:
+        for metric, value in numeric_metrics(payload):
+            for resolution in RESOLUTIONS:
+                key = (device_pk, metric, resolution, bucket_start(timestamp, resolution))
+                current = aggregates.get(key)
+                if current is None:
+                    aggregates[key] = _Aggregate(value, timestamp)
+                else:
+                    current.add(value, timestamp)
+    return aggregates
+
+
+def merge_rollups(aggregates: Dict[RollupKey, _Aggregate]) -> int:
+    """
+    Merge aggregates into the stored rollups with one upsert.
+
+    The touched buckets are read first (one range query per resolution) and
+    combined in memory; callers must hold the watermark lock. Returns the
+    number of rollup rows written.
+    """
+    if not aggregates:
+        return 0
+
+    existing: Dict[RollupKey, TelemetryRollup] = {}
+    for resolution in RESOLUTIONS:
+        keys = [key for key in aggregates if key[2] == resolution]
+        if not keys:
+            continue
+        rows = TelemetryRollup.objects.filter(
+            resolution=resolution,
+            device_id__in={key[0] for key in keys},
+            metric__in={key[1] for key in keys},
+            bucket__gte=min(key[3] for key in keys),
+            bucket__lte=max(key[3] for key in keys),
+        )
+        for row in rows:
+            existing[(row.device_id, row.metric, row.resolution, row.bucket)] = row
+
+    merged = []
+    for key, agg in aggregates.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            device_pk, metric, resolution, bucket = key
+            rollup = TelemetryRollup(
+                device_id=device_pk, metric=metric, resolution=resolution, bucket=bucket,
+                count=0, sum=0.0, min=agg.min, max=agg.max, last=agg.last, last_at=agg.last_at,
+            )
+        agg.merge_into(rollup)
+        merged.append(rollup)
+
+    TelemetryRollup.objects.bulk_create(
+        merged,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["device", "metric", "resolution", "bucket"],
+        update_fields=["count", "sum", "min", "max", "last", "last_at"],
+    )
+    return len(merged)
+
+
+def update_rollups(
+    now: Optional[datetime] = None,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Fold raw telemetry inserted since the watermark into the rollups.
+
+    Works through at most ``max_batches`` batches of ``batch_size``
+    readings, each in its own transaction that also advances the
+    watermark, so an interrupted run loses nothing and a backlog is caught
+    up over several runs. Returns the number of readings consumed and
+    rollup rows written.
+    """
+    config = rollup_settings()
+    batch_size = batch_size or config["BATCH_SIZE"]
+    max_batches = max_batches or config["MAX_BATCHES"]
+    cutoff = (now or timezone.now()) - timedelta(seconds=config["LAG_SECONDS"])
+
+    readings = written = 0
+    for _ in range(max_batches):
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+            queryset = Telemetry.objects.filter(created_at__lt=cutoff)
+            if watermark.created_at is not None:
+                queryset = queryset.filter(
+                    Q(created_at__gt=watermark.created_at)
+                    | Q(created_at=watermark.created_at, id__gt=watermark.telemetry_id)
+                )
+            rows = list(
+                queryset.order_by("created_at", "id").values_list(
+                    "id", "device_id", "timestamp", "created_at", "payload", "is_valid"
+                )[:batch_size]
+            )
+            if not rows:
+                break
+
+            written += merge_rollups(aggregate(
+                (device_pk, timestamp, payload)
+                for _, device_pk, timestamp, _, payload, is_valid in rows
+                if is_valid is not False
+            ))
+            readings += len(rows)
+            watermark.telemetry_id, watermark.created_at = rows[-1][0], rows[-1][3]
+            watermark.save(update_fields=["telemetry_id", "created_at", "updated_at"])
+        if len(rows) < batch_size:
+            break
+
+    if readings:
+        logger.info(f"Rolled up {readings} telemetry readings into {written} rollup rows")
+    return {"readings": readings, "rollups": written}
+
+
+def expire_rollups(now: Optional[datetime] = None) -> int:
+    """Delete rollups older than their resolution's ``RETENTION_DAYS`` (missing or 0 keeps them)."""
+    now = now or timezone.now()
+    deleted = 0
+    for resolution, days in rollup_settings()["RETENTION_DAYS"].items():
+        if not days:
+            continue
+        count, _ = TelemetryRollup.objects.filter(
+            resolution=resolution, bucket__lt=now - timedelta(days=days)
+        ).delete()
+        deleted += count
+    if deleted:
+        logger.info(f"Deleted {deleted} expired telemetry rollups")
+    return deleted
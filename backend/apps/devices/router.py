@@ -0,0 +1,140 @@
+"""
+Compiled MQTT topic router.
+
+Handlers register per subscription pattern, using the MQTT ``+`` (one
+level) and ``#`` (all remaining levels) wildcards. Patterns are compiled
+into a trie of topic levels once, so dispatching a message is one walk over
+its levels instead of a chain of prefix checks and splits, and adding a
+topic is one :meth:`TopicRouter.add` call. The patterns double as the
+bridge's subscription list.
+"""
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# handler(wildcard levels, decoded payload, received at)
+RouteHandler = Callable[[Tuple[str, ...], Any, Any], None]
+
+
+class Route(NamedTuple):
+    """A registered pattern and how to decode and dispatch its messages."""
+
+    pattern: str
+    handler: RouteHandler
+    # Used when the message carries no content type, e.g. MessagePack on .bin topics
+    content_type: Optional[str] = None
+    # Reject payloads that are not JSON objects before calling the handler
+    object_payload: bool = True
+
+
+class _Node:
+    __slots__ = ("children", "wildcard", "multi", "route")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_Node"] = {}
+        self.wildcard: Optional["_Node"] = None
+        self.multi: Optional[Route] = None
+        self.route: Optional[Route] = None
+
+
+class TopicRouter:
+    """
+    Trie of MQTT topic patterns.
+
+    Exact levels win over ``+``, which wins over ``#``. Wildcards do not
+    match topics starting with ``$`` (broker topics such as ``$SYS``).
+    Topics without a route are counted in :attr:`unmatched`.
+    """
+
+    def __init__(self) -> None:
+        self.routes: List[Route] = []
+        self.unmatched = 0
+        self._root = _Node()
+
+    def add(
+        self,
+        pattern: str,
+        handler: RouteHandler,
+        content_type: Optional[str] = None,
+        object_payload: bool = True,
+    ) -> Route:
+        """
+        Register ``handler`` for topics matching ``pattern``.
+
+        The handler is called with the levels matched by the wildcards, in
+        order (``#`` contributes the remaining levels joined by ``/``).
+
+        Raises:
+            ValueError: If the pattern is malformed or already registered
+        """
+        levels = pattern.split("/")
+        for index, level in enumerate(levels):
+            if ("+" in level or "#" in level) and level not in ("+", "#"):
+                raise ValueError(f"Wildcards must fill a whole topic level: {pattern}")
+            if level == "#" and index != len(levels) - 1:
+                raise ValueError(f"'#' must be the last topic level: {pattern}")
+
+        route = Route(pattern, handler, content_type, object_payload)
+        node = self._root
+        for level in levels:
+            if level == "#":
+                if node.multi is not None:
+                    raise ValueError(f"Topic pattern already routed: {pattern}")
+                node.multi = route
+                break
+            if level == "+":
+                node.wildcard = node.wildcard or _Node()
+                node = node.wildcard
+            else:
+                node = node.children.setdefault(level, _Node())
+        else:
+            if node.route is not None:
+                raise ValueError(f"Topic pattern already routed: {pattern}")
+            node.route = route
+        self.routes.append(route)
+        return route
+
+    def patterns(self) -> List[str]:
+        """Return every registered pattern, for subscribing."""
+        return [route.pattern for route in self.routes]
+
+    def match(self, topic: str) -> Optional[Tuple[Route, Tuple[str, ...]]]:
+        """Return the route of ``topic`` and its wildcard levels, or ``None``."""
+        levels = topic.split("/")
+        result = _match(self._root, levels, 0, [], topic.startswith("$"))
+        if result is None:
+            self.unmatched += 1
+        return result
+
+
+def _match(
+    node: _Node,
+    levels: List[str],
+    index: int,
+    params: List[str],
+    system: bool,
+) -> Optional[Tuple[Route, Tuple[str, ...]]]:
+    if index == len(levels):
+        if node.route is not None:
+            return node.route, tuple(params)
+        # "a/#" also matches "a"
+        if node.multi is not None:
+            return node.multi, tuple(params + [""])
+        return None
+
+    level = levels[index]
+    child = node.children.get(level)
+    if child is not None:
+        result = _match(child, levels, index + 1, params, False)
+        if result is not None:
+            return result
+    if system:
+        return None
+    if node.wildcard is not None:
+        params.append(level)
+        result = _match(node.wildcard, levels, index + 1, params, False)
+        if result is not None:
+            return result
+        params.pop()
+    if node.multi is not None:
+        return node.multi, tuple(params + ["/".join(levels[index:])])
+    return None
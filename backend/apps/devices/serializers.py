@@ -9,7 +9,8 @@ from rest_framework import serializers
 from django.utils import timezone
 from typing import Dict, Any, Optional
 
-from .models import Device, Gateway, Telemetry, DeviceModelDefinition
+from .models import Device, DeviceState, Gateway, Telemetry, TelemetryRollup, DeviceModelDefinition
+from .validation import check_schema
 
 
 class DeviceModelDefinitionSerializer(serializers.ModelSerializer):
@@ -22,8 +23,8 @@ class DeviceModelDefinitionSerializer(serializers.ModelSerializer):
     class Meta:
         model = DeviceModelDefinition
         fields = [
-            "id", "model_id", "name", "version", "schema", 
-            "created_at", "updated_at"
+            "id", "model_id", "name", "version", "schema",
+            "ingest_rate", "ingest_burst", "created_at", "updated_at"
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
 
@@ -45,6 +46,10 @@ class DeviceModelDefinitionSerializer(serializers.ModelSerializer):
         if not isinstance(value, dict):
             raise serializers.ValidationError("Schema must be a JSON object")
         
+        error = check_schema(value)
+        if error:
+            raise serializers.ValidationError(f"Invalid JSON schema: {error}")
+        
         return value
 
 
@@ -98,12 +103,29 @@ class GatewaySerializer(serializers.ModelSerializer):
         return value.strip() if value else ""
 
 
+class DeviceStateSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a device's latest state.
+    
+    ``payload`` is the newest reading; ``last_values`` holds the last known
+    value of every key ever reported.
+    """
+    
+    class Meta:
+        model = DeviceState
+        fields = ["payload", "timestamp", "received_at", "last_values", "reading_count", "updated_at"]
+        read_only_fields = fields
+
+
 class DeviceSerializer(serializers.ModelSerializer):
     """
     Serializer for IoT devices.
     
     Includes gateway information, model definition, and computed fields
-    for device status and telemetry information.
+    for device status and telemetry information. Telemetry fields come from
+    the device's state row: ``readings_received`` counts every reading ever
+    ingested, including readings whose rows retention has since dropped (it
+    replaces ``telemetry_count``, which counted stored rows).
     """
     
     gateway_id = serializers.IntegerField(source="gateway.id", read_only=True)
@@ -112,8 +134,9 @@ class DeviceSerializer(serializers.ModelSerializer):
     model_schema = serializers.SerializerMethodField()
     model_definition = DeviceModelDefinitionSerializer(read_only=True)
     full_device_id = serializers.SerializerMethodField()
-    telemetry_count = serializers.SerializerMethodField()
+    readings_received = serializers.SerializerMethodField()
     last_telemetry_time = serializers.SerializerMethodField()
+    state = DeviceStateSerializer(source="current_state", read_only=True)
     can_receive_commands = serializers.SerializerMethodField()
     
     class Meta:
@@ -123,7 +146,7 @@ class DeviceSerializer(serializers.ModelSerializer):
             "created_at", "updated_at", "last_telemetry",
             "gateway_id", "gateway_name", "gateway_gateway_id",
             "model_definition", "model_schema", "full_device_id",
-            "telemetry_count", "last_telemetry_time", "can_receive_commands"
+            "readings_received", "last_telemetry_time", "state", "can_receive_commands"
         ]
         read_only_fields = [
             "id", "is_online", "created_at", "updated_at", "last_telemetry"
@@ -137,14 +160,15 @@ class DeviceSerializer(serializers.ModelSerializer):
         """Get the full device identifier including gateway."""
         return obj.full_device_id
 
-    def get_telemetry_count(self, obj: Device) -> int:
-        """Get the total number of telemetry records for this device."""
-        return obj.telemetry_count
+    def get_readings_received(self, obj: Device) -> int:
+        """Get the number of readings ingested for this device, from its state row."""
+        state = obj.current_state
+        return state.reading_count if state else 0
 
     def get_last_telemetry_time(self, obj: Device) -> Optional[str]:
-        """Get the timestamp of the last telemetry record."""
-        latest = obj.latest_telemetry
-        return latest.timestamp.isoformat() if latest else None
+        """Get the timestamp of the newest reading, from its state row."""
+        state = obj.current_state
+        return state.timestamp.isoformat() if state else None
 
     def get_can_receive_commands(self, obj: Device) -> bool:
         """Check if this device can receive commands."""
@@ -197,25 +221,21 @@ class TelemetrySerializer(serializers.ModelSerializer):
     device_id_field = serializers.CharField(source="device.device_id", read_only=True)
     gateway_id = serializers.CharField(source="device.gateway.gateway_id", read_only=True)
     age_seconds = serializers.SerializerMethodField()
-    is_valid = serializers.SerializerMethodField()
     
     class Meta:
         model = Telemetry
         fields = [
-            "id", "device", "timestamp", "payload", "created_at",
+            "id", "device", "timestamp", "received_at", "payload", "created_at",
             "device_name", "device_type", "device_id_field", "gateway_id",
             "age_seconds", "is_valid"
         ]
-        read_only_fields = ["id", "timestamp", "created_at"]
+        # is_valid is stored at ingest so listing telemetry never re-runs the schema
+        read_only_fields = ["id", "timestamp", "received_at", "created_at", "is_valid"]
 
     def get_age_seconds(self, obj: Telemetry) -> float:
         """Get the age of this telemetry record in seconds."""
         return obj.age.total_seconds()
 
-    def get_is_valid(self, obj: Telemetry) -> bool:
-        """Check if this telemetry validates against the device's schema."""
-        return obj.validate_against_schema()
-
     def validate_payload(self, value: Dict[str, Any]) -> Dict[str, Any]:
         """Validate telemetry payload."""
         if not isinstance(value, dict):
@@ -225,6 +245,24 @@ class TelemetrySerializer(serializers.ModelSerializer):
         return value
 
 
+class TelemetryRollupSerializer(serializers.ModelSerializer):
+    """
+    Serializer for downsampled telemetry.
+    
+    One row per device, metric and time bucket.
+    """
+    
+    avg = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = TelemetryRollup
+        fields = [
+            "device", "metric", "resolution", "bucket", "count",
+            "sum", "min", "max", "avg", "last", "last_at"
+        ]
+        read_only_fields = fields
+
+
 class TelemetryCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating telemetry records.
@@ -246,6 +284,7 @@ class TelemetryCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     "Payload does not match device model schema"
                 )
+        attrs['is_valid'] = True
         
         return attrs
 
@@ -1,12 +1,49 @@
 from importlib import import_module
 from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from .models import Device, DeviceModelDefinition, Gateway
+
+# Saves touching only these fields do not change anything the registry caches
+LIVENESS_FIELDS = frozenset({"is_online", "last_telemetry", "last_seen"})
+
 
 @receiver(request_started)
 def start_mqtt_bridge(sender, **kwargs):  # pragma: no cover
     # Lazily import to avoid migration-time side effects
     module = import_module("apps.devices.mqtt_worker")
-    module.start_bridge_if_enabled()
+    module.start_for_role()
+    # Only the first request needs to do this
+    request_started.disconnect(start_mqtt_bridge)
+
+
+def _publish_on_commit(kind, pk, key):
+    # Other processes re-read the row when the message arrives, so it must be committed by then;
+    # a rollback publishes nothing. Outside a transaction this runs immediately.
+    from .registry import publish_invalidation
+
+    transaction.on_commit(lambda: publish_invalidation(kind, pk=pk, key=key))
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_device_registry(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= LIVENESS_FIELDS:
+        return
+    _publish_on_commit("device", pk=instance.pk, key=instance.device_id)
+
+
+@receiver(post_save, sender=Gateway)
+@receiver(post_delete, sender=Gateway)
+def invalidate_gateway_registry(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= LIVENESS_FIELDS:
+        return
+    _publish_on_commit("gateway", pk=instance.pk, key=instance.gateway_id)
 
 
+@receiver(post_save, sender=DeviceModelDefinition)
+@receiver(post_delete, sender=DeviceModelDefinition)
+def invalidate_model_key_map(sender, instance, **kwargs):
+    _publish_on_commit("model", pk=instance.pk, key=instance.model_id)
@@ -0,0 +1,355 @@
+"""
+Durable write-ahead spool for telemetry ingestion.
+
+With the spool enabled the bridge appends every accepted reading to an
+append-only, memory-mapped file before it is inserted, and the pipeline's
+flusher reads its batches back from there. A database outage then only
+grows the spool instead of losing readings that QoS 1 has already
+acknowledged, and readings spooled before a crash are replayed on the next
+start. Delivery is at-least-once: a crash between a batch's insert and its
+commit point can insert that batch again.
+
+The spool is a directory of fixed-size segment files plus ``commit.json``,
+which records the position up to which rows are known to be in the
+database. Each entry is ``<length:u32><crc32:u32><json body>``; a zero
+length marks the end of written data and a CRC mismatch marks a torn
+write left by a crash. Readings the database rejects are appended to
+``dead_letter.ndjson``, one JSON object with the error and the reading per
+line, and committed past so they are not replayed.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional, Tuple
+
+from .ingestion import TelemetryRecord
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# (segment number, byte offset within the segment)
+Position = Tuple[int, int]
+
+_HEADER = struct.Struct("<II")
+_SEGMENT_SUFFIX = ".seg"
+_COMMIT_FILE = "commit.json"
+_LOCK_FILE = "spool.lock"
+_DEAD_LETTER_FILE = "dead_letter.ndjson"
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class TelemetrySpool:
+    """
+    Append-only segment files holding telemetry not yet known to be stored.
+
+    One process owns a spool directory at a time (enforced with a lock
+    file). Appends and reads are thread-safe; there is a single reader,
+    the pipeline flusher, which advances the commit point after each
+    successful insert. Fully committed segments are deleted.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        max_bytes: int = 1024 * 1024 * 1024,
+        sync_interval: float = 1.0,
+    ) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(2, max_bytes // segment_bytes)
+        self.sync_interval = sync_interval
+
+        self._lock = threading.Lock()
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._segments: List[int] = []
+        self._commit: Position = (0, 0)
+        self._read: Position = (0, 0)
+        self._write: Position = (0, 0)
+        self._lock_file = None
+        self._last_sync = 0.0
+
+        self.unread = 0  # appended but not yet handed to the reader
+        self.uncommitted = 0  # appended but not yet committed
+        self.appended = 0
+        self.committed = 0
+        self.rejected = 0
+        self.dead_letters = 0
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def open(self) -> None:
+        """Lock the directory and recover the read and write positions."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = open(os.path.join(self.directory, _LOCK_FILE), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                self._lock_file = None
+                raise RuntimeError(f"Telemetry spool {self.directory} is in use by another process")
+
+        with self._lock:
+            self._segments = sorted(
+                int(name[:-len(_SEGMENT_SUFFIX)])
+                for name in os.listdir(self.directory)
+                if name.endswith(_SEGMENT_SUFFIX) and name[:-len(_SEGMENT_SUFFIX)].isdigit()
+            )
+            self._commit = self._load_commit()
+            # Segments wholly before the commit point are leftovers of an interrupted cleanup
+            for segment in [s for s in self._segments if s < self._commit[0]]:
+                self._remove_segment(segment)
+            if not self._segments:
+                self._create_segment(self._commit[0])
+                self._commit = (self._commit[0], 0)
+            elif self._commit[0] not in self._segments:
+                self._commit = (self._segments[0], 0)
+
+            backlog, self._write = self._scan(self._commit)
+            self._read = self._commit
+            self.unread = self.uncommitted = backlog
+
+        if backlog:
+            logger.warning(f"Telemetry spool {self.directory}: replaying {backlog} readings left from the last run")
+        else:
+            logger.info(f"Telemetry spool opened at {self.directory}")
+
+    def close(self) -> None:
+        """Flush mapped pages to disk and release the directory."""
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.flush()
+                mapped.close()
+            self._maps.clear()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # -- writer --------------------------------------------------------------
+
+    def append(self, records: List[TelemetryRecord]) -> int:
+        """
+        Append records in order; returns how many were consumed.
+
+        Fewer than ``len(records)`` are consumed only when the spool has
+        reached its size cap. A record too large for a segment is rejected
+        (logged and counted) but still counts as consumed.
+        """
+        consumed = 0
+        bodies = [_encode(record) for record in records]
+        with self._lock:
+            for body in bodies:
+                size = _HEADER.size + len(body)
+                if size + _HEADER.size > self.segment_bytes:
+                    self.rejected += 1
+                    logger.error(f"Telemetry spool: dropping a {size}-byte reading larger than a segment")
+                    consumed += 1
+                    continue
+
+                segment, offset = self._write
+                if offset + size + _HEADER.size > self.segment_bytes:
+                    if len(self._segments) >= self.max_segments:
+                        break
+                    segment, offset = segment + 1, 0
+                    self._create_segment(segment)
+
+                mapped = self._map(segment)
+                mapped[offset + _HEADER.size:offset + size] = body
+                # Terminator first, header last, so a reader never sees a half-written entry
+                mapped[offset + size:offset + size + _HEADER.size] = _HEADER.pack(0, 0)
+                mapped[offset:offset + _HEADER.size] = _HEADER.pack(len(body), zlib.crc32(body))
+                self._write = (segment, offset + size)
+                self.unread += 1
+                self.uncommitted += 1
+                self.appended += 1
+                consumed += 1
+
+            now = time.monotonic()
+            if consumed and now - self._last_sync >= self.sync_interval:
+                self._map(self._write[0]).flush()
+                self._last_sync = now
+        return consumed
+
+    # -- reader --------------------------------------------------------------
+
+    def read(self, max_records: int) -> Tuple[List[TelemetryRecord], Position]:
+        """Return up to ``max_records`` unread records and the position after them."""
+        records: List[TelemetryRecord] = []
+        with self._lock:
+            segment, offset = self._read
+            while len(records) < max_records and (segment, offset) < self._write:
+                mapped = self._map(segment)
+                length = 0
+                if offset + _HEADER.size <= self.segment_bytes:
+                    length, crc = _HEADER.unpack_from(mapped, offset)
+                if length == 0:
+                    # End of a sealed segment; the writer has moved on
+                    segment, offset = segment + 1, 0
+                    continue
+                body = bytes(mapped[offset + _HEADER.size:offset + _HEADER.size + length])
+                offset += _HEADER.size + length
+                if zlib.crc32(body) != crc:
+                    logger.error(f"Telemetry spool: skipping corrupt entry in segment {segment}")
+                    continue
+                records.append(_decode(body))
+            self._read = (segment, offset)
+            self.unread -= len(records)
+        return records, (segment, offset)
+
+    def commit(self, position: Position, count: int) -> None:
+        """Record that everything before ``position`` (``count`` records) is stored."""
+        with self._lock:
+            self._commit = position
+            self.uncommitted -= count
+            self.committed += count
+            self._save_commit()
+            for segment in [s for s in self._segments if s < position[0]]:
+                self._remove_segment(segment)
+
+    def dead_letter(self, record: TelemetryRecord, error: Exception) -> None:
+        """Keep a reading the database rejected in the dead-letter file."""
+        line = json.dumps({"error": str(error), "reading": _fields(record)}, separators=(",", ":"))
+        with self._lock:
+            with open(os.path.join(self.directory, _DEAD_LETTER_FILE), "a") as f:
+                f.write(line + "\n")
+            self.dead_letters += 1
+
+    # -- metrics -------------------------------------------------------------
+
+    @property
+    def lag_bytes(self) -> int:
+        """Bytes between the commit point and the end of written data."""
+        (commit_segment, commit_offset), (write_segment, write_offset) = self._commit, self._write
+        return (write_segment - commit_segment) * self.segment_bytes + write_offset - commit_offset
+
+    def stats(self) -> Dict[str, int]:
+        """Return spool lag and counters."""
+        return {
+            "spool_lag_records": self.uncommitted,
+            "spool_lag_bytes": self.lag_bytes,
+            "spool_segments": len(self._segments),
+            "spool_disk_bytes": len(self._segments) * self.segment_bytes,
+            "spool_appended": self.appended,
+            "spool_committed": self.committed,
+            "spool_rejected": self.rejected,
+            "spool_dead_letters": self.dead_letters,
+        }
+
+    # -- internals -----------------------------------------------------------
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:012d}{_SEGMENT_SUFFIX}")
+
+    def _create_segment(self, segment: int) -> None:
+        with open(self._path(segment), "w+b") as f:
+            f.truncate(self.segment_bytes)
+        self._segments.append(segment)
+
+    def _map(self, segment: int) -> mmap.mmap:
+        mapped = self._maps.get(segment)
+        if mapped is None:
+            with open(self._path(segment), "r+b") as f:
+                mapped = mmap.mmap(f.fileno(), self.segment_bytes)
+            self._maps[segment] = mapped
+        return mapped
+
+    def _remove_segment(self, segment: int) -> None:
+        mapped = self._maps.pop(segment, None)
+        if mapped is not None:
+            mapped.close()
+        try:
+            os.remove(self._path(segment))
+        except FileNotFoundError:
+            pass
+        self._segments.remove(segment)
+
+    def _scan(self, start: Position) -> Tuple[int, Position]:
+        """Count valid entries from ``start`` and find where the next append goes."""
+        count = 0
+        segment, offset = start
+        last = self._segments[-1]
+        while True:
+            mapped = self._map(segment)
+            while offset + _HEADER.size <= self.segment_bytes:
+                length, crc = _HEADER.unpack_from(mapped, offset)
+                end = offset + _HEADER.size + length
+                if length == 0 or end + _HEADER.size > self.segment_bytes:
+                    break
+                if zlib.crc32(mapped[offset + _HEADER.size:end]) != crc:
+                    logger.warning(f"Telemetry spool: discarding torn write in segment {segment}")
+                    break
+                count += 1
+                offset = end
+            if segment == last:
+                # Make sure nothing after the recovered end looks like an entry
+                if offset + _HEADER.size <= self.segment_bytes:
+                    mapped[offset:offset + _HEADER.size] = _HEADER.pack(0, 0)
+                return count, (segment, offset)
+            segment, offset = segment + 1, 0
+            if segment not in self._segments:
+                self._create_segment(segment)
+
+    def _load_commit(self) -> Position:
+        try:
+            with open(os.path.join(self.directory, _COMMIT_FILE)) as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            # Without a usable commit point replay everything still on disk
+            return (self._segments[0], 0) if self._segments else (0, 0)
+
+    def _save_commit(self) -> None:
+        path = os.path.join(self.directory, _COMMIT_FILE)
+        segment, offset = self._commit
+        with open(path + ".tmp", "w") as f:
+            json.dump({"segment": segment, "offset": offset}, f)
+        os.replace(path + ".tmp", path)
+
+
+def _fields(record: TelemetryRecord) -> list:
+    values = record._replace(
+        timestamp=(record.timestamp - _EPOCH) // _MICROSECOND,
+        received_at=(record.received_at - _EPOCH) // _MICROSECOND,
+    )
+    return list(values)
+
+
+def _encode(record: TelemetryRecord) -> bytes:
+    return json.dumps(_fields(record), separators=(",", ":")).encode()
+
+
+def _decode(body: bytes) -> TelemetryRecord:
+    record = TelemetryRecord(*json.loads(body))
+    return record._replace(
+        timestamp=_EPOCH + record.timestamp * _MICROSECOND,
+        received_at=_EPOCH + record.received_at * _MICROSECOND,
+    )
+
+
+def spool_from_settings(directory: Optional[str] = None) -> Optional[TelemetrySpool]:
+    """Build the spool configured in ``MQTT['SPOOL']``, or ``None`` when it is disabled."""
+    from django.conf import settings
+
+    config = settings.MQTT.get("SPOOL", {})
+    directory = directory or config.get("DIR")
+    if not directory:
+        return None
+    return TelemetrySpool(
+        directory,
+        segment_bytes=int(config.get("SEGMENT_MB", 64) * 1024 * 1024),
+        max_bytes=int(config.get("MAX_MB", 1024) * 1024 * 1024),
+        sync_interval=config.get("SYNC_INTERVAL", 1.0),
+    )
@@ -0,0 +1,125 @@
+"""
+Latest-state upserts for devices.
+
+Each flushed telemetry batch is collapsed to one entry per device (the
+newest reading's payload and times, every key's last value, and the number
+of readings) and upserted into :class:`DeviceState` in one statement, so
+reading a device's current state never touches the telemetry history.
+
+Buffered readings arrive late, so an upsert never moves a device's state
+backwards: an older batch only fills in keys the stored state does not have
+yet. On PostgreSQL the merge happens inside ``INSERT ... ON CONFLICT``
+(``jsonb ||``), which stays correct when several bridge workers write the
+same device; other databases read, merge and write back.
+"""
+
+import json
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Sequence
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import DeviceState
+
+if TYPE_CHECKING:
+    from .ingestion import TelemetryRecord
+
+
+class StateUpdate(NamedTuple):
+    """A batch's contribution to one device's state."""
+
+    device_pk: int
+    payload: Dict[str, Any]
+    timestamp: datetime
+    received_at: datetime
+    last_values: Dict[str, Any]
+    readings: int
+
+
+def collapse(records: Sequence["TelemetryRecord"]) -> List[StateUpdate]:
+    """Reduce a batch to one update per device, ordered by device pk (a stable lock order)."""
+    by_device: Dict[int, List["TelemetryRecord"]] = {}
+    for record in records:
+        by_device.setdefault(record.device_pk, []).append(record)
+
+    updates = []
+    for device_pk in sorted(by_device):
+        readings = sorted(by_device[device_pk], key=lambda record: record.timestamp)
+        last_values: Dict[str, Any] = {}
+        for record in readings:
+            last_values.update(record.payload)
+        newest = readings[-1]
+        updates.append(StateUpdate(
+            device_pk, newest.payload, newest.timestamp, newest.received_at, last_values, len(readings)
+        ))
+    return updates
+
+
+def upsert_states(records: Sequence["TelemetryRecord"]) -> int:
+    """Upsert the device states of a batch in one statement; returns the number of devices."""
+    updates = collapse(records)
+    if not updates:
+        return 0
+    if connection.vendor == "postgresql":
+        _upsert_postgresql(updates)
+    else:
+        _upsert_portable(updates)
+    return len(updates)
+
+
+def _upsert_postgresql(updates: List[StateUpdate]) -> None:
+    table = connection.ops.quote_name(DeviceState._meta.db_table)
+    now = timezone.now()
+    values = ", ".join(["(%s, %s::jsonb, %s::timestamptz, %s::timestamptz, %s::jsonb, %s, %s::timestamptz)"] * len(updates))
+    params = [
+        value
+        for update in updates
+        for value in (
+            update.device_pk, json.dumps(update.payload), update.timestamp, update.received_at,
+            json.dumps(update.last_values), update.readings, now,
+        )
+    ]
+    newer = "EXCLUDED.timestamp >= s.timestamp"
+    sql = (
+        f"INSERT INTO {table} AS s "
+        f"(device_id, payload, timestamp, received_at, last_values, reading_count, updated_at) "
+        f"VALUES {values} "
+        f"ON CONFLICT (device_id) DO UPDATE SET "
+        f"payload = CASE WHEN {newer} THEN EXCLUDED.payload ELSE s.payload END, "
+        f"received_at = CASE WHEN {newer} THEN EXCLUDED.received_at ELSE s.received_at END, "
+        f"last_values = CASE WHEN {newer} THEN s.last_values || EXCLUDED.last_values "
+        f"ELSE EXCLUDED.last_values || s.last_values END, "
+        f"timestamp = GREATEST(s.timestamp, EXCLUDED.timestamp), "
+        f"reading_count = s.reading_count + EXCLUDED.reading_count, "
+        f"updated_at = EXCLUDED.updated_at"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _upsert_portable(updates: List[StateUpdate]) -> None:
+    existing = DeviceState.objects.in_bulk([update.device_pk for update in updates])
+    states = []
+    for update in updates:
+        state = existing.get(update.device_pk)
+        if state is None:
+            state = DeviceState(
+                device_id=update.device_pk, payload=update.payload, timestamp=update.timestamp,
+                received_at=update.received_at, last_values=update.last_values, reading_count=update.readings,
+            )
+        elif update.timestamp >= state.timestamp:
+            state.payload, state.timestamp, state.received_at = update.payload, update.timestamp, update.received_at
+            state.last_values = {**state.last_values, **update.last_values}
+            state.reading_count += update.readings
+        else:
+            state.last_values = {**update.last_values, **state.last_values}
+            state.reading_count += update.readings
+        states.append(state)
+
+    DeviceState.objects.bulk_create(
+        states,
+        update_conflicts=True,
+        unique_fields=["device"],
+        update_fields=["payload", "timestamp", "received_at", "last_values", "reading_count", "updated_at"],
+    )
@@ -0,0 +1,190 @@
+"""
+Minimal in-process MQTT broker for benchmarks.
+
+Implements just enough of MQTT 3.1.1 for the ingest benchmark to drive the
+real bridge over a real socket without an external broker: CONNECT,
+SUBSCRIBE with ``+``/``#`` filters, PUBLISH at QoS 0 and 1, PINGREQ and
+DISCONNECT. There is no authentication, retained messages, session state,
+QoS 2 or redelivery, and it is not meant for anything but local testing.
+
+Delivery to subscribers awaits their socket buffer, so a slow subscriber
+pushes back on publishers the way a real broker's inflight window does.
+"""
+
+import asyncio
+import logging
+import struct
+import threading
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 12, 13, 14
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """Return whether ``topic`` matches an MQTT subscription filter."""
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    for index, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if index >= len(topic_parts) or (part != "+" and part != topic_parts[index]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+def _encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes([packet_type << 4 | flags]) + _encode_length(len(body)) + body
+
+
+class _Session:
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.subscriptions: List[Tuple[str, int]] = []
+        self.next_packet_id = 0
+        self.lock = asyncio.Lock()
+
+    def packet_id(self) -> int:
+        self.next_packet_id = self.next_packet_id % 65535 + 1
+        return self.next_packet_id
+
+
+class StubBroker:
+    """
+    Single-node MQTT 3.1.1 broker running on its own event loop thread.
+
+    Args:
+        host: Interface to listen on
+        port: Port to listen on; ``0`` picks a free one (see :attr:`port`)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self.published = 0
+        self.delivered = 0
+        self.subscribed = threading.Event()
+
+        self._sessions: List[_Session] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def start(self) -> int:
+        """Start listening and return the bound port."""
+        self._thread = threading.Thread(target=self._run, name="stub-broker", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout=10) or self._server is None:
+            raise RuntimeError("Stub MQTT broker failed to start")
+        return self.port
+
+    def stop(self) -> None:
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            for session in list(self._sessions):
+                self._loop.call_soon_threadsafe(session.writer.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+        except OSError as e:
+            logger.error(f"Stub MQTT broker could not listen on {self.host}:{self.port}: {e}")
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = _Session(writer)
+        self._sessions.append(session)
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length) if length else b""
+                packet_type, flags = header[0] >> 4, header[0] & 0x0F
+
+                if packet_type == CONNECT:
+                    writer.write(_packet(CONNACK, 0, b"\x00\x00"))
+                elif packet_type == PUBLISH:
+                    await self._on_publish(session, flags, body)
+                elif packet_type == SUBSCRIBE:
+                    self._on_subscribe(session, body)
+                elif packet_type == PINGREQ:
+                    writer.write(_packet(PINGRESP, 0, b""))
+                elif packet_type == DISCONNECT:
+                    break
+                # PUBACKs from subscribers need no handling without redelivery
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._sessions.remove(session)
+            writer.close()
+
+    async def _on_publish(self, session: _Session, flags: int, body: bytes) -> None:
+        qos = (flags >> 1) & 0x03
+        topic_length = struct.unpack_from("!H", body)[0]
+        topic = body[2:2 + topic_length].decode()
+        offset = 2 + topic_length
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            session.writer.write(_packet(PUBACK, 0, packet_id))
+        payload = body[offset:]
+        self.published += 1
+
+        for subscriber in list(self._sessions):
+            granted = max(
+                (sub_qos for topic_filter, sub_qos in subscriber.subscriptions if topic_matches(topic_filter, topic)),
+                default=None,
+            )
+            if granted is None:
+                continue
+            delivery_qos = min(qos, granted)
+            async with subscriber.lock:
+                packet_id = struct.pack("!H", subscriber.packet_id()) if delivery_qos else b""
+                subscriber.writer.write(_packet(
+                    PUBLISH, delivery_qos << 1,
+                    struct.pack("!H", topic_length) + body[2:2 + topic_length] + packet_id + payload,
+                ))
+                await subscriber.writer.drain()
+            self.delivered += 1
+
+    def _on_subscribe(self, session: _Session, body: bytes) -> None:
+        packet_id, offset, granted = body[:2], 2, bytearray()
+        while offset < len(body):
+            length = struct.unpack_from("!H", body, offset)[0]
+            topic_filter = body[offset + 2:offset + 2 + length].decode()
+            qos = min(body[offset + 2 + length] & 0x03, 1)
+            offset += 3 + length
+            session.subscriptions.append((topic_filter, qos))
+            granted.append(qos)
+        session.writer.write(_packet(SUBACK, 0, packet_id + bytes(granted)))
+        self.subscribed.set()
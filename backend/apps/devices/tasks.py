@@ -0,0 +1,25 @@
+import logging
+
+from celery import shared_task
+
+from . import partitions, rollups
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def manage_telemetry_partitions():
+    """Create upcoming telemetry partitions and expire old ones; scheduled by Celery beat."""
+    result = partitions.manage_partitions()
+    if result["created"] or result["expired"]:
+        logger.info(
+            f"Telemetry partitions: created {len(result['created'])}, "
+            f"expired {len(result['expired'])}"
+        )
+
+
+@shared_task(ignore_result=True)
+def update_telemetry_rollups():
+    """Fold newly received telemetry into the rollups and expire old ones; scheduled by Celery beat."""
+    rollups.update_rollups()
+    rollups.expire_rollups()
@@ -0,0 +1,121 @@
+"""
+Typed, narrow storage of numeric telemetry.
+
+Besides the raw JSON row, ingestion writes every numeric payload field that
+the device model's schema declares (``"type": "number"`` or ``"integer"``)
+into :class:`TelemetryValue` as ``(device, metric, timestamp, value)``, with
+metric names kept once in the :class:`Metric` dictionary. Values carry the
+reading's ``message_id``, so they are deduplicated exactly like the
+telemetry rows they come from. Aggregating a
+metric then reads a double column through a ``(device, metric, timestamp)``
+index instead of casting JSON per row.
+
+A property can opt out with ``"x-metric": false``::
+
+    {"properties": {"temperature": {"type": "number"},
+                    "rssi": {"type": "integer", "x-metric": false}}}
+
+Devices without a model definition, and fields their schema does not
+declare as numeric, stay in the JSON payload only.
+"""
+
+import math
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Sequence, Tuple
+
+from .models import Metric, TelemetryValue
+
+if TYPE_CHECKING:
+    from .ingestion import TelemetryRecord
+
+NUMERIC_TYPES = frozenset({"number", "integer"})
+
+_NAME_MAX_LENGTH = Metric._meta.get_field("name").max_length
+
+
+def schema_metrics(schema: Dict[str, Any]) -> Tuple[str, ...]:
+    """Return the names of the numeric properties a JSON schema declares as metrics."""
+    properties = schema.get("properties") if isinstance(schema, dict) else None
+    if not isinstance(properties, dict):
+        return ()
+    names = []
+    for name, spec in properties.items():
+        if not isinstance(spec, dict) or spec.get("x-metric") is False or len(name) > _NAME_MAX_LENGTH:
+            continue
+        types = spec.get("type")
+        types = {types} if isinstance(types, str) else set(types or ())
+        if types & NUMERIC_TYPES:
+            names.append(name)
+    return tuple(names)
+
+
+class MetricDictionary:
+    """
+    Thread-safe cache of metric name to :class:`Metric` primary key.
+
+    Names never seen before are inserted in one statement per batch; rows
+    are never renamed or deleted while referenced, so entries stay valid.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, int]:
+        """Return the ids of ``names``, creating the metrics that do not exist yet."""
+        names = set(names)
+        missing = names.difference(self._ids)
+        if missing:
+            # Another bridge worker may create the same names concurrently
+            Metric.objects.bulk_create([Metric(name=name) for name in missing], ignore_conflicts=True)
+            rows = Metric.objects.filter(name__in=missing).values_list("name", "id")
+            with self._lock:
+                self._ids.update(rows)
+        return {name: self._ids[name] for name in names}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+
+
+metric_ids = MetricDictionary()
+
+
+def extract_values(records: Sequence["TelemetryRecord"]) -> List[TelemetryValue]:
+    """
+    Build the typed metric rows of a batch of telemetry records.
+
+    Schemas are looked up once per model definition in the batch. Only
+    finite numbers are kept; booleans and strings in a numeric field are
+    left to validation.
+    """
+    from .registry import registry
+
+    metrics_by_model: Dict[int, Tuple[str, ...]] = {}
+    readings = []
+    for record in records:
+        model_pk = record.model_definition_id
+        if model_pk is None:
+            continue
+        metrics = metrics_by_model.get(model_pk)
+        if metrics is None:
+            metrics = metrics_by_model[model_pk] = registry.get_model(model_pk).metrics
+        payload = record.payload
+        for name in metrics:
+            value = payload.get(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+                readings.append((record, name, float(value)))
+
+    if not readings:
+        return []
+    ids = metric_ids.resolve(name for _, name, _ in readings)
+    return [
+        TelemetryValue(
+            device_id=record.device_pk,
+            metric_id=ids[name],
+            timestamp=record.timestamp,
+            value=value,
+            message_id=record.message_id,
+        )
+        for record, name, value in readings
+    ]
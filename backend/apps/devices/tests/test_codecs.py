@@ -0,0 +1,88 @@
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+
+from apps.devices import codecs
+
+
+class ContentTypeTests(SimpleTestCase):
+    def test_normalize(self):
+        self.assertEqual(codecs.normalize_content_type(None), codecs.CONTENT_TYPE_JSON)
+        self.assertEqual(codecs.normalize_content_type("Application/JSON; charset=utf-8"), codecs.CONTENT_TYPE_JSON)
+        self.assertEqual(codecs.normalize_content_type("application/x-msgpack"), codecs.CONTENT_TYPE_MSGPACK)
+
+    def test_unknown_content_type_is_rejected(self):
+        with self.assertRaises(codecs.PayloadError):
+            codecs.decode_payload(b"<xml/>", "application/xml")
+
+
+class DecodeTests(SimpleTestCase):
+    def test_json(self):
+        self.assertEqual(codecs.decode_payload(b'{"temperature": 21.5}'), {"temperature": 21.5})
+        self.assertEqual(codecs.decode_payload(b""), {})
+
+    def test_malformed_json(self):
+        with self.assertRaises(codecs.PayloadError):
+            codecs.decode_payload(b"{not json")
+
+    def test_non_finite_numbers_are_rejected(self):
+        for raw in (b'{"temperature": NaN}', b'{"temperature": -Infinity}'):
+            with self.assertRaises(codecs.PayloadError):
+                codecs.decode_payload(raw)
+
+    @skipIf(codecs.msgpack is None, "msgpack is not installed")
+    def test_non_finite_binary_floats_are_rejected(self):
+        for value in ({1: float("nan")}, {"nested": [float("inf")]}):
+            payload = codecs.decode_payload(codecs.msgpack.packb(value), codecs.CONTENT_TYPE_MSGPACK)
+            with self.assertRaises(codecs.PayloadError):
+                codecs.make_jsonable(payload)
+
+    @skipIf(codecs.msgpack is None, "msgpack is not installed")
+    def test_msgpack_with_integer_keys(self):
+        raw = codecs.msgpack.packb({1: 21.5, "ts": 1714564800000})
+        payload = codecs.decode_payload(raw, codecs.CONTENT_TYPE_MSGPACK)
+        self.assertEqual(codecs.make_jsonable(payload), {1: 21.5, "ts": 1714564800000})
+
+    @skipIf(codecs.cbor2 is None, "cbor2 is not installed")
+    def test_cbor(self):
+        raw = codecs.cbor2.dumps({1: 21.5, "at": datetime(2024, 5, 1, tzinfo=dt_timezone.utc)})
+        payload = codecs.make_jsonable(codecs.decode_payload(raw, codecs.CONTENT_TYPE_CBOR))
+        self.assertEqual(payload, {1: 21.5, "at": "2024-05-01T00:00:00+00:00"})
+
+
+class MakeJsonableTests(SimpleTestCase):
+    def test_flat_payload_is_returned_as_is(self):
+        payload = {1: 2.0, "ok": True}
+        self.assertIs(codecs.make_jsonable(payload), payload)
+
+    def test_nested_values_and_keys(self):
+        self.assertEqual(
+            codecs.make_jsonable({(1, 2): [date(2024, 5, 1), {"a": (1, 2)}]}),
+            {"(1, 2)": ["2024-05-01", {"a": [1, 2]}]},
+        )
+
+    def test_bytes_are_rejected(self):
+        with self.assertRaises(codecs.PayloadError):
+            codecs.make_jsonable({"blob": b"\x00"})
+
+
+class KeyMapTests(SimpleTestCase):
+    schema = {
+        "properties": {
+            "temperature": {"type": "number", "x-key": 1},
+            "humidity": {"type": "number", "x-key": 2},
+            "flag": {"type": "boolean", "x-key": True},
+            "name": {"type": "string"},
+        }
+    }
+
+    def test_schema_key_map(self):
+        self.assertEqual(codecs.schema_key_map(self.schema), {1: "temperature", 2: "humidity"})
+        self.assertEqual(codecs.schema_key_map({}), {})
+
+    def test_expand_keys_keeps_unmapped_keys(self):
+        key_map = codecs.schema_key_map(self.schema)
+        self.assertEqual(
+            codecs.expand_keys({1: 21.5, 9: 0, "ts": 5}, key_map), {"temperature": 21.5, 9: 0, "ts": 5}
+        )
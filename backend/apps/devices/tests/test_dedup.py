@@ -0,0 +1,62 @@
+from django.test import SimpleTestCase
+
+from apps.devices import codecs
+from apps.devices.dedup import DuplicateFilter, message_identity
+
+
+class MessageIdentityTests(SimpleTestCase):
+    def test_explicit_id_wins(self):
+        self.assertEqual(message_identity({"msg_id": "abc", "seq": 1, "ts": 5}), "abc")
+        self.assertEqual(message_identity({"message_id": 42}), "42")
+        self.assertEqual(len(message_identity({"msg_id": "x" * 100})), 64)
+
+    def test_sequence_and_timestamp(self):
+        self.assertEqual(message_identity({"seq": 7, "ts": 1714564800000, "t": 1}), "7@1714564800000")
+
+    def test_hash_of_timestamped_payload(self):
+        first = message_identity({"ts": 5, "temperature": 21.5, "humidity": 40})
+        self.assertEqual(first, message_identity({"humidity": 40, "temperature": 21.5, "ts": 5}))
+        self.assertNotEqual(first, message_identity({"ts": 5, "temperature": 21.6, "humidity": 40}))
+
+    def test_payload_without_timestamp_has_no_identity(self):
+        self.assertIsNone(message_identity({"temperature": 21.5}))
+
+    def test_mixed_integer_and_string_keys(self):
+        # Unmapped integer keys survive make_jsonable on binary payloads
+        payload = {1: 21.5, "ts": 1714564800000, "nested": {2: True, "a": [{3: None, "b": 1}]}}
+        identity = message_identity(payload)
+        self.assertIsNotNone(identity)
+        self.assertEqual(identity, message_identity(dict(reversed(list(payload.items())))))
+
+    def test_binary_payload_with_integer_keys(self):
+        if codecs.msgpack is None:
+            self.skipTest("msgpack is not installed")
+        raw = codecs.msgpack.packb({1: 21.5, 2: 40, "ts": 1714564800000})
+        payload = codecs.make_jsonable(codecs.decode_payload(raw, codecs.CONTENT_TYPE_MSGPACK))
+        self.assertEqual(message_identity(payload), message_identity({"ts": 1714564800000, 2: 40, 1: 21.5}))
+
+
+class DuplicateFilterTests(SimpleTestCase):
+    def test_redelivery_within_window(self):
+        duplicates = DuplicateFilter(capacity=10)
+        self.assertFalse(duplicates.seen((1, "a")))
+        self.assertTrue(duplicates.seen((1, "a")))
+        self.assertFalse(duplicates.seen((2, "a")))
+        self.assertEqual(duplicates.duplicates, 1)
+
+    def test_oldest_keys_are_evicted(self):
+        duplicates = DuplicateFilter(capacity=2)
+        for key in ("a", "b", "c"):
+            duplicates.seen(key)
+        self.assertEqual(len(duplicates), 2)
+        self.assertFalse(duplicates.seen("a"))
+        self.assertTrue(duplicates.seen("c"))
+
+    def test_hits_refresh_recency(self):
+        duplicates = DuplicateFilter(capacity=2)
+        duplicates.seen("a")
+        duplicates.seen("b")
+        duplicates.seen("a")
+        duplicates.seen("c")  # evicts b, not a
+        self.assertTrue(duplicates.seen("a"))
+        self.assertFalse(duplicates.seen("b"))
@@ -0,0 +1,37 @@
+import io
+
+from django.test import SimpleTestCase
+
+from apps.devices.dedup import message_identity
+from apps.devices.management.commands.import_telemetry import _live_payload, _read_csv, _read_ndjson
+
+
+class LivePayloadTests(SimpleTestCase):
+    def test_batch_reading_is_hashed_without_its_gateway(self):
+        reading = {"device_id": "dev-1", "ts": 1700000000, "values": {"temperature": 21.5}}
+        row = {"gateway_id": "gw-1", **reading}
+        self.assertEqual(message_identity(_live_payload(row)), message_identity(reading))
+
+    def test_flat_row_is_hashed_like_the_device_payload(self):
+        payload = {"ts": 1700000000, "temperature": 21.5}
+        row = {"gateway_id": "gw-1", "device_id": "dev-1", **payload}
+        self.assertEqual(message_identity(_live_payload(row)), message_identity(payload))
+
+    def test_device_payload_under_values_is_hashed_on_its_own(self):
+        payload = {"ts": 1700000000, "temperature": 21.5}
+        row = {"gateway_id": "gw-1", "device_id": "dev-1", "values": payload}
+        self.assertEqual(message_identity(_live_payload(row)), message_identity(payload))
+
+
+class ReadFileTests(SimpleTestCase):
+    def test_non_finite_csv_cells_stay_strings(self):
+        stream = io.StringIO("device_id,ts,temperature,humidity,status\ndev-1,1700000000,nan,-inf,21.5\n")
+        self.assertEqual(list(_read_csv(stream)), [
+            (2, {"device_id": "dev-1", "ts": 1700000000, "temperature": "nan", "humidity": "-inf", "status": 21.5}),
+        ])
+
+    def test_non_finite_json_is_malformed(self):
+        csv_stream = io.StringIO('device_id,payload\ndev-1,"{""temperature"": NaN}"\n')
+        self.assertEqual(list(_read_csv(csv_stream)), [(2, None)])
+        ndjson_stream = io.StringIO('{"device_id": "dev-1", "temperature": Infinity}\n')
+        self.assertEqual(list(_read_ndjson(ndjson_stream)), [(1, None)])
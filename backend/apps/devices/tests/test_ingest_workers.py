@@ -0,0 +1,84 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from apps.devices.ingest_workers import IngestSupervisor
+
+
+def process(pid, alive=True, exitcode=None):
+    return mock.Mock(pid=pid, exitcode=exitcode, **{"is_alive.return_value": alive})
+
+
+def report(pid, at, messages, rows):
+    return {"worker": 0, "pid": pid, "time": at, "messages_received": messages, "rows_written": rows, "connected": True}
+
+
+class IngestSupervisorTests(SimpleTestCase):
+    def setUp(self):
+        self.supervisor = IngestSupervisor(workers=1, report_interval=10, stale_after=60)
+        self.addCleanup(self.supervisor._stats_queue.close)
+        self.handle = self.supervisor._handles[0]
+        spawn = mock.patch.object(self.supervisor, "_spawn")
+        self.spawn = spawn.start()
+        self.addCleanup(spawn.stop)
+
+    def receive(self, *reports):
+        # One at a time: the queue's feeder thread may not have delivered the next one yet
+        for item in reports:
+            self.supervisor._stats_queue.put(item)
+            self.supervisor._drain_reports(timeout=5)
+
+    def summary(self):
+        with self.assertLogs("apps.devices.ingest_workers", "INFO") as logs:
+            self.supervisor._log_summary()
+        return logs.output[-1]
+
+    def test_summary_rates(self):
+        self.handle.process = process(100)
+        self.receive(report(100, 1000.0, 1000, 900), report(100, 1010.0, 1500, 1400))
+        self.assertIn("Ingest: 50 msg/s, 50 rows/s", self.summary())
+
+    def test_restarted_worker_starts_a_new_baseline(self):
+        self.handle.process = process(100)
+        self.receive(report(100, 1000.0, 1000, 900), report(100, 1010.0, 5000, 4900))
+        # The worker crashed and its replacement reports counters from zero
+        self.handle.process = process(200)
+        self.receive(report(200, 1020.0, 10, 10))
+        self.assertIn("Ingest: 0 msg/s, 0 rows/s", self.summary())
+
+        self.receive(report(200, 1030.0, 210, 110))
+        self.assertIn("Ingest: 20 msg/s, 10 rows/s", self.summary())
+
+    def test_reports_of_a_replaced_process_are_ignored(self):
+        self.handle.process = process(200)
+        self.receive(report(100, 1000.0, 1000, 900))
+        self.assertEqual(self.handle.last_report, {})
+
+    def test_exited_worker_is_restarted_after_backoff(self):
+        self.handle.process = process(100, alive=False, exitcode=1)
+        with mock.patch("apps.devices.ingest_workers.time.monotonic", return_value=1000.0):
+            self.supervisor._check_workers()
+        self.spawn.assert_not_called()
+        self.assertEqual(self.supervisor._restart_at, {0: 1001.0})
+
+        with mock.patch("apps.devices.ingest_workers.time.monotonic", return_value=1001.0):
+            self.supervisor._check_workers()
+        self.spawn.assert_called_once_with(self.handle)
+        self.assertEqual(self.handle.restarts, 1)
+
+    def test_silent_worker_is_killed(self):
+        self.handle.process = process(100)
+        self.handle.started_at = 1000.0
+        with mock.patch("apps.devices.ingest_workers.time.monotonic", return_value=1061.0):
+            self.supervisor._check_workers()
+        self.handle.process.kill.assert_called_once_with()
+        self.assertIn(0, self.supervisor._restart_at)
+
+
+class StartMqttBridgeTests(SimpleTestCase):
+    @mock.patch("apps.devices.mqtt_worker.start_bridge_if_enabled")
+    def test_single_worker_joins_the_shared_group(self, start):
+        call_command("start_mqtt_bridge", workers=1, group="aiot", stdout=StringIO())
+        start.assert_called_once_with(shared_group="aiot")
@@ -0,0 +1,119 @@
+import json
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from apps.devices.ingestion import TelemetryPipeline, TelemetryRecord
+from apps.devices.models import Device, DeviceModelDefinition, DeviceState, Gateway, Telemetry, TelemetryValue
+from apps.devices.registry import registry
+from apps.devices.spool import TelemetrySpool
+from apps.devices.telemetry_values import metric_ids
+
+
+class WriteBatchTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        metric_ids.clear()
+        self.addCleanup(registry.clear)
+        self.addCleanup(metric_ids.clear)
+        owner = get_user_model().objects.create_user(username="owner", password="x")
+        gateway = Gateway.objects.create(owner=owner, gateway_id="gw-1")
+        self.model = DeviceModelDefinition.objects.create(
+            model_id="thermo", name="Thermometer", schema={"properties": {"temperature": {"type": "number"}}}
+        )
+        self.device = Device.objects.create(gateway=gateway, device_id="dev-1", model_definition=self.model)
+        self.pipeline = TelemetryPipeline(use_copy=False, broadcast=False)
+        self.now = timezone.now()
+
+    def record(self, message_id, temperature):
+        return TelemetryRecord(
+            device_pk=self.device.pk,
+            gateway_pk=self.device.gateway_id,
+            device_id="dev-1",
+            gateway_id="gw-1",
+            device_name="",
+            device_type=self.device.type,
+            payload={"temperature": temperature},
+            timestamp=self.now,
+            received_at=self.now,
+            message_id=message_id,
+            model_definition_id=self.model.pk,
+        )
+
+    def test_values_follow_the_telemetry_dedup_key(self):
+        # Two distinct readings with the same timestamp, then a redelivery of the first
+        self.assertTrue(self.pipeline.write_batch([self.record("a", 20.0), self.record("b", 21.0)]))
+        self.assertTrue(self.pipeline.write_batch([self.record("a", 20.0)]))
+
+        self.assertEqual(Telemetry.objects.count(), 2)
+        self.assertEqual(
+            sorted(TelemetryValue.objects.values_list("message_id", "value")), [("a", 20.0), ("b", 21.0)]
+        )
+
+    def test_redelivery_leaves_device_state_alone(self):
+        self.assertTrue(self.pipeline.write_batch([self.record("a", 20.0), self.record("b", 21.0)]))
+        # A stored reading redelivered with a changed payload, and repeated within its batch
+        redelivered = [self.record("a", 25.0), self.record("c", 22.0), self.record("c", 22.0)]
+        self.assertTrue(self.pipeline.write_batch(redelivered))
+
+        state = DeviceState.objects.get(device=self.device)
+        self.assertEqual(state.reading_count, 3)
+        self.assertEqual(state.payload, {"temperature": 22.0})
+        self.assertEqual(Telemetry.objects.count(), 3)
+        self.assertEqual(self.pipeline.stored_duplicates, 2)
+
+    def test_rejected_reading_does_not_cost_its_batch(self):
+        # The newest reading, so its state update fails too (SQLite's INSERT OR IGNORE skips CHECK failures)
+        batch = [self.record("a", 20.0), self.record("c", 22.0), self.record("b", float("nan"))]
+        self.assertTrue(self.pipeline.write_batch(batch))
+
+        self.assertEqual(sorted(Telemetry.objects.values_list("message_id", flat=True)), ["a", "c"])
+        self.assertEqual((self.pipeline.rows_written, self.pipeline.rejected_rows), (2, 1))
+        self.assertEqual(DeviceState.objects.get(device=self.device).reading_count, 2)
+
+    def test_poison_reading_is_dead_lettered_and_the_spool_moves_on(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        spool = TelemetrySpool(directory, segment_bytes=4096, sync_interval=0)
+        spool.open()
+        self.addCleanup(spool.close)
+        pipeline = TelemetryPipeline(use_copy=False, broadcast=False, spool=spool)
+        spool.append([self.record("a", 20.0), self.record("c", 22.0), self.record("b", float("nan"))])
+
+        pipeline._drain_spool()
+
+        self.assertEqual(spool.uncommitted, 0)
+        self.assertEqual(sorted(Telemetry.objects.values_list("message_id", flat=True)), ["a", "c"])
+        with open(f"{directory}/dead_letter.ndjson") as f:
+            dead = [json.loads(line) for line in f]
+        self.assertEqual([TelemetryRecord(*entry["reading"]).message_id for entry in dead], ["b"])
+        self.assertEqual(spool.stats()["spool_dead_letters"], 1)
+
+    def test_connection_errors_fail_the_batch_for_a_retry(self):
+        # close_old_connections would close the test's transaction
+        with mock.patch("apps.devices.ingestion.drop_stored", side_effect=OperationalError("server closed")), \
+                mock.patch("apps.devices.ingestion.close_old_connections"):
+            self.assertFalse(self.pipeline.write_batch([self.record("a", 20.0), self.record("b", 21.0)]))
+        self.assertEqual((self.pipeline.failed_batches, self.pipeline.rejected_rows), (1, 0))
+
+
+class PipelineCounterTests(SimpleTestCase):
+    def test_counters_add_up_across_threads(self):
+        pipeline = TelemetryPipeline(use_copy=False, broadcast=False)
+
+        def count():
+            for _ in range(10000):
+                pipeline._count(rows_written=1, batches_written=1)
+
+        threads = [threading.Thread(target=count) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((pipeline.rows_written, pipeline.batches_written), (80000, 80000))
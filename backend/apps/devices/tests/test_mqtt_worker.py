@@ -0,0 +1,123 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from apps.devices.models import Device, Gateway
+from apps.devices.mqtt_worker import MqttBridge, payload_device_id
+from apps.devices.ratelimit import IngestRateLimiter
+from apps.devices.registry import registry
+
+
+class PayloadDeviceIdTests(SimpleTestCase):
+    def test_accepts_strings_and_integers(self):
+        self.assertEqual(payload_device_id("dev-1"), "dev-1")
+        self.assertEqual(payload_device_id(17), "17")
+
+    def test_rejects_values_that_cannot_be_stored(self):
+        for value in (None, "", True, 1.5, {"id": 1}, ["dev-1"], "x" * 200):
+            with self.subTest(value=value):
+                self.assertIsNone(payload_device_id(value))
+
+
+class GatewayBatchTests(TransactionTestCase):
+    def setUp(self):
+        # Invalidations are published to Redis, which is not running here
+        redis = mock.patch("apps.devices.registry._get_redis")
+        redis.start()
+        self.addCleanup(redis.stop)
+        registry.clear()
+        owner = get_user_model().objects.create_user(username="owner", password="x")
+        Gateway.objects.create(owner=owner, gateway_id="gw-1")
+        self.bridge = MqttBridge()
+        self.bridge.rate_limiter = None
+        self.emitted = []
+        self.bridge._emit = self.emitted.extend
+
+    def tearDown(self):
+        registry.clear()
+
+    def test_bad_device_ids_skip_only_their_reading(self):
+        readings = [
+            {"device_id": "x" * 200, "values": {"temperature": 20}},
+            {"device_id": {"nested": True}, "values": {"temperature": 21}},
+            {"device_id": ["dev-2"], "values": {"temperature": 22}},
+            {"device_id": "dev-1", "values": {"temperature": 23}},
+            # Unusable descriptions of new devices fall back to defaults
+            {"device_id": "dev-3", "type": {"kind": "sensor"}, "name": "x" * 500, "values": {"temperature": 24}},
+            {"device_id": "dev-4", "type": "toaster", "model": ["m"], "values": {"temperature": 25}},
+        ]
+        self.bridge._handle_gateway_batch("gw-1", readings, timezone.now())
+
+        self.assertEqual(
+            [record.payload for record in self.emitted],
+            [{"temperature": 23}, {"temperature": 24}, {"temperature": 25}],
+        )
+        self.assertEqual(
+            sorted(Device.objects.values_list("device_id", "type")),
+            [("dev-1", "sensor"), ("dev-3", "sensor"), ("dev-4", "sensor")],
+        )
+        self.assertEqual(len(Device.objects.get(device_id="dev-3").name), Device._meta.get_field("name").max_length)
+
+    def test_failing_reading_skips_only_itself(self):
+        create = self.bridge._create_gateway_device
+
+        def create_or_fail(gateway, device_id, reading, source):
+            if device_id == "dev-1":
+                raise RuntimeError("database hiccup")
+            return create(gateway, device_id, reading, source)
+
+        readings = [{"device_id": "dev-1", "values": {"t": 20}}, {"device_id": "dev-2", "values": {"t": 21}}]
+        with mock.patch.object(self.bridge, "_create_gateway_device", side_effect=create_or_fail):
+            self.bridge._handle_gateway_batch("gw-1", readings, timezone.now())
+
+        self.assertEqual([record.device_id for record in self.emitted], ["dev-2"])
+
+    def test_redeliveries_do_not_use_up_the_rate_limit(self):
+        self.bridge.rate_limiter = IngestRateLimiter({"DEVICE": {"RATE": 0.001, "BURST": 2}})
+        reading = {"device_id": "dev-1", "msg_id": "a", "values": {"t": 20}}
+        self.bridge._handle_gateway_batch("gw-1", [reading, reading, reading], timezone.now())
+        self.bridge._handle_gateway_batch("gw-1", [{**reading, "msg_id": "b"}], timezone.now())
+
+        self.assertEqual([record.message_id for record in self.emitted], ["a", "b"])
+
+
+class GatewayDiscoveryTests(TransactionTestCase):
+    def setUp(self):
+        redis = mock.patch("apps.devices.registry._get_redis")
+        redis.start()
+        self.addCleanup(redis.stop)
+        registry.clear()
+        owner = get_user_model().objects.create_user(username="owner", password="x")
+        self.gateway = Gateway.objects.create(owner=owner, gateway_id="gw-1")
+        self.bridge = MqttBridge()
+
+    def tearDown(self):
+        registry.clear()
+
+    def test_inventory_is_upserted(self):
+        Device.objects.create(gateway=self.gateway, device_id="dev-1", name="Kitchen", model="v1")
+        devices = [
+            {"device_id": "dev-1", "type": "switch", "model": "v2", "name": "Gateway name"},
+            {"device_id": "dev-2", "model": "first"},
+            {"device_id": "dev-2", "model": "second", "name": "Hall"},
+            {"device_id": "dev-3", "type": ["sensor"], "name": "x" * 500},
+            {"device_id": {"nested": True}},
+            "dev-4",
+        ]
+        self.bridge._handle_gateway_discovery("gw-1", {"devices": devices}, timezone.now())
+
+        upserted = {
+            device.device_id: (device.type, device.model, device.name)
+            for device in Device.objects.filter(gateway=self.gateway)
+        }
+        name_length = Device._meta.get_field("name").max_length
+        self.assertEqual(upserted, {
+            # Type and model follow the gateway, the name given in the platform stays
+            "dev-1": ("switch", "v2", "Kitchen"),
+            # The last announcement of a device wins
+            "dev-2": ("sensor", "second", "Hall"),
+            "dev-3": ("sensor", "", "x" * name_length),
+        })
+        self.assertEqual(self.bridge.discovered_devices, 3)
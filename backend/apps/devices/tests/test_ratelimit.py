@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.devices.ratelimit import MODE_DOWNSAMPLE, IngestRateLimiter, TokenBucket
+from apps.devices.registry import DeviceEntry
+
+
+def entry(device_pk=1, gateway_pk=1, owner_id=1):
+    return DeviceEntry(device_pk, f"dev-{device_pk}", gateway_pk, f"gw-{gateway_pk}", "sensor", None, "", owner_id)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_refill_is_capped_at_burst(self):
+        bucket = TokenBucket(rate=2, burst=5, now=0)
+        bucket.tokens = 0
+        self.assertEqual(bucket.refill(1.5), 3)
+        self.assertEqual(bucket.refill(100), 5)
+
+
+class IngestRateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch("apps.devices.ratelimit.time.monotonic", side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def allowed(self, limiter, count, device=None, override=None):
+        return sum(limiter.allow(device or entry(), override) for _ in range(count))
+
+    def test_burst_then_refill(self):
+        limiter = IngestRateLimiter({"DEVICE": {"RATE": 10, "BURST": 20}})
+        self.assertEqual(self.allowed(limiter, 30), 20)
+        self.assertEqual(limiter.limited["device"], 10)
+
+        self.now += 0.5
+        self.assertEqual(self.allowed(limiter, 30), 5)
+        self.now += 10
+        self.assertEqual(self.allowed(limiter, 30), 20)
+
+    def test_devices_have_separate_buckets(self):
+        limiter = IngestRateLimiter({"DEVICE": {"RATE": 1, "BURST": 2}})
+        self.assertEqual(self.allowed(limiter, 5, entry(1)), 2)
+        self.assertEqual(self.allowed(limiter, 5, entry(2)), 2)
+
+    def test_gateway_limit_covers_its_devices(self):
+        limiter = IngestRateLimiter({"GATEWAY": {"RATE": 1, "BURST": 3}})
+        self.assertEqual(self.allowed(limiter, 2, entry(1)) + self.allowed(limiter, 2, entry(2)), 3)
+        self.assertEqual(limiter.limited["gateway"], 1)
+
+    def test_rejected_reading_takes_no_tokens(self):
+        limiter = IngestRateLimiter({"DEVICE": {"RATE": 1, "BURST": 1}, "GATEWAY": {"RATE": 1, "BURST": 2}})
+        self.assertEqual(self.allowed(limiter, 3, entry(1)), 1)
+        # Device 1's rejections did not drain the gateway bucket
+        self.assertEqual(self.allowed(limiter, 1, entry(2)), 1)
+
+    def test_zero_rate_disables_a_level(self):
+        limiter = IngestRateLimiter({"DEVICE": {"RATE": 0}})
+        self.assertEqual(self.allowed(limiter, 1000), 1000)
+
+    def test_model_override(self):
+        limiter = IngestRateLimiter({"DEVICE": {"RATE": 1, "BURST": 1}})
+        self.assertEqual(self.allowed(limiter, 10, override=(5, 8)), 8)
+        self.assertEqual(self.allowed(limiter, 10, entry(2), override=(None, None)), 1)
+
+    def test_downsample_keeps_one_reading_per_interval(self):
+        limiter = IngestRateLimiter({"DEVICE": {"RATE": 1, "BURST": 1}}, mode=MODE_DOWNSAMPLE, downsample_interval=5)
+        self.assertEqual(self.allowed(limiter, 10), 2)
+        self.now += 1
+        # One token refilled, the downsample slot is still taken
+        self.assertEqual(self.allowed(limiter, 10), 1)
+        self.now += 5
+        self.assertEqual(self.allowed(limiter, 10), 2)
+        self.assertEqual(limiter.stats()["rate_limit_downsampled"], 2)
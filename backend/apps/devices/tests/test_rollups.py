@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.devices import rollups
+from apps.devices.models import Device, Gateway, Telemetry, TelemetryRollup
+
+
+class UpdateRollupsTests(TestCase):
+    def setUp(self):
+        owner = get_user_model().objects.create_user(username="owner", password="x")
+        gateway = Gateway.objects.create(owner=owner, gateway_id="gw-1")
+        self.device = Device.objects.create(gateway=gateway, device_id="dev-1")
+        self.now = timezone.now().replace(second=30, microsecond=0)
+
+    def insert(self, value, timestamp, received_at, created_at):
+        row = Telemetry.objects.create(
+            device=self.device, timestamp=timestamp, received_at=received_at, payload={"temperature": value}
+        )
+        # created_at is auto_now_add; backdate it to when the bridge would have inserted the row
+        Telemetry.objects.filter(pk=row.pk).update(created_at=created_at)
+
+    def minute_rollup(self, timestamp):
+        return TelemetryRollup.objects.get(
+            device=self.device,
+            metric="temperature",
+            resolution=TelemetryRollup.RESOLUTION_MINUTE,
+            bucket=rollups.bucket_start(timestamp, TelemetryRollup.RESOLUTION_MINUTE),
+        )
+
+    def test_rows_replayed_after_the_watermark_are_rolled_up(self):
+        measured = self.now - timedelta(minutes=30)
+        self.insert(20, measured, measured, self.now - timedelta(minutes=20))
+        self.assertEqual(rollups.update_rollups(now=self.now)["readings"], 1)
+
+        # Received before the watermark, but inserted only after the database came back
+        self.insert(30, measured, measured, self.now - timedelta(minutes=10))
+        self.assertEqual(rollups.update_rollups(now=self.now)["readings"], 1)
+
+        rollup = self.minute_rollup(measured)
+        self.assertEqual((rollup.count, rollup.sum, rollup.min, rollup.max), (2, 50.0, 20.0, 30.0))
+
+    def test_recent_inserts_wait_for_the_lag(self):
+        self.insert(20, self.now, self.now, self.now - timedelta(seconds=10))
+        self.assertEqual(rollups.update_rollups(now=self.now)["readings"], 0)
+        self.assertEqual(rollups.update_rollups(now=self.now + timedelta(minutes=5))["readings"], 1)
+        # Consumed rows are not counted twice
+        self.assertEqual(rollups.update_rollups(now=self.now + timedelta(minutes=10))["readings"], 0)
+        self.assertEqual(self.minute_rollup(self.now).count, 1)
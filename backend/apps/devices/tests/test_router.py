@@ -0,0 +1,59 @@
+from django.test import SimpleTestCase
+
+from apps.devices.router import TopicRouter
+
+
+class TopicRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = TopicRouter()
+
+    def route(self, pattern, **kwargs):
+        return self.router.add(pattern, lambda *args: None, **kwargs)
+
+    def test_wildcard_levels_are_returned_in_order(self):
+        route = self.route("gw/+/dev/+/data")
+        self.assertEqual(self.router.match("gw/g1/dev/d1/data"), (route, ("g1", "d1")))
+        self.assertIsNone(self.router.match("gw/g1/dev/d1/data/extra"))
+        self.assertIsNone(self.router.match("gw/g1/dev/data"))
+        self.assertEqual(self.router.unmatched, 2)
+
+    def test_exact_beats_single_level_beats_multi_level(self):
+        exact = self.route("devices/special/data")
+        single = self.route("devices/+/data")
+        multi = self.route("devices/#")
+        self.assertEqual(self.router.match("devices/special/data"), (exact, ()))
+        self.assertEqual(self.router.match("devices/d1/data"), (single, ("d1",)))
+        self.assertEqual(self.router.match("devices/d1/status"), (multi, ("d1/status",)))
+
+    def test_backtracks_from_a_dead_end_exact_branch(self):
+        self.route("devices/special/config")
+        single = self.route("devices/+/data")
+        self.assertEqual(self.router.match("devices/special/data"), (single, ("special",)))
+
+    def test_multi_level_matches_the_parent_level(self):
+        multi = self.route("gateways/+/#")
+        self.assertEqual(self.router.match("gateways/g1"), (multi, ("g1", "")))
+        self.assertEqual(self.router.match("gateways/g1/a/b"), (multi, ("g1", "a/b")))
+
+    def test_wildcards_do_not_match_system_topics(self):
+        self.route("#")
+        self.route("+/broker/uptime")
+        exact = self.route("$SYS/broker/load")
+        self.assertIsNone(self.router.match("$SYS/broker/uptime"))
+        self.assertEqual(self.router.match("$SYS/broker/load"), (exact, ()))
+        self.assertIsNotNone(self.router.match("devices/d1/data"))
+
+    def test_route_options_and_patterns(self):
+        route = self.route("gateways/+/batch", content_type="application/msgpack", object_payload=False)
+        self.assertEqual(route.content_type, "application/msgpack")
+        self.assertFalse(route.object_payload)
+        self.assertEqual(self.router.patterns(), ["gateways/+/batch"])
+
+    def test_malformed_and_duplicate_patterns(self):
+        self.route("devices/+/data")
+        for pattern in ("devices/+/data", "devices/dev+/data", "devices/#/data"):
+            with self.subTest(pattern=pattern), self.assertRaises(ValueError):
+                self.route(pattern)
+        self.route("devices/#")
+        with self.assertRaises(ValueError):
+            self.route("devices/#")
@@ -0,0 +1,41 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase
+
+from apps.devices.models import Device, Gateway
+
+
+class RegistryInvalidationTests(TestCase):
+    def setUp(self):
+        owner = get_user_model().objects.create_user(username="owner", password="x")
+        self.gateway = Gateway.objects.create(owner=owner, gateway_id="gw-1")
+
+    def test_invalidation_waits_for_commit(self):
+        with mock.patch("apps.devices.registry.publish_invalidation") as publish:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with transaction.atomic():
+                    device = Device.objects.create(gateway=self.gateway, device_id="dev-1")
+                    publish.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        publish.assert_called_once_with("device", pk=device.pk, key="dev-1")
+
+    def test_rollback_publishes_nothing(self):
+        with mock.patch("apps.devices.registry.publish_invalidation") as publish:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                try:
+                    with transaction.atomic():
+                        Device.objects.create(gateway=self.gateway, device_id="dev-1")
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+        self.assertEqual(callbacks, [])
+        publish.assert_not_called()
+
+    def test_liveness_saves_do_not_invalidate(self):
+        device = Device.objects.create(gateway=self.gateway, device_id="dev-1")
+        with mock.patch("apps.devices.registry.publish_invalidation") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                device.update_online_status(True)
+        publish.assert_not_called()
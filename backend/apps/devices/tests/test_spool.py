@@ -0,0 +1,117 @@
+import os
+import shutil
+import struct
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import SimpleTestCase
+
+from apps.devices.ingestion import TelemetryRecord
+from apps.devices.spool import TelemetrySpool
+
+SEGMENT_BYTES = 4096
+START = datetime(2024, 5, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+
+def record(number):
+    return TelemetryRecord(
+        device_pk=1,
+        gateway_pk=1,
+        device_id="dev-1",
+        gateway_id="gw-1",
+        device_name="",
+        device_type="sensor",
+        payload={"n": number, "padding": "x" * 100},
+        timestamp=START + timedelta(seconds=number),
+        received_at=START + timedelta(seconds=number, microseconds=250),
+        message_id=f"m{number}",
+    )
+
+
+class TelemetrySpoolTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def open_spool(self, **kwargs):
+        spool = TelemetrySpool(self.directory, segment_bytes=SEGMENT_BYTES, sync_interval=0, **kwargs)
+        spool.open()
+        self.addCleanup(spool.close)
+        return spool
+
+    def segment_files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".seg"))
+
+    def test_round_trip(self):
+        spool = self.open_spool()
+        records = [record(n) for n in range(3)]
+        self.assertEqual(spool.append(records), 3)
+
+        read, position = spool.read(10)
+        self.assertEqual(read, records)
+        self.assertEqual((spool.unread, spool.uncommitted), (0, 3))
+        spool.commit(position, len(read))
+        self.assertEqual(spool.uncommitted, 0)
+
+    def test_segments_rotate_and_committed_ones_are_removed(self):
+        spool = self.open_spool()
+        records = [record(n) for n in range(100)]
+        self.assertEqual(spool.append(records), 100)
+        self.assertGreater(len(self.segment_files()), 1)
+
+        read, position = spool.read(1000)
+        self.assertEqual(read, records)
+        spool.commit(position, len(read))
+        self.assertEqual(self.segment_files(), [f"{position[0]:012d}.seg"])
+
+    def test_size_cap_stops_appends(self):
+        spool = self.open_spool(max_bytes=2 * SEGMENT_BYTES)
+        consumed = spool.append([record(n) for n in range(100)])
+        self.assertLess(consumed, 100)
+        self.assertEqual(len(self.segment_files()), 2)
+
+        read, position = spool.read(1000)
+        spool.commit(position, len(read))
+        # Committing frees the sealed segment for new appends
+        self.assertGreater(spool.append([record(n) for n in range(consumed, 100)]), 0)
+
+    def test_uncommitted_records_are_replayed_after_restart(self):
+        spool = self.open_spool()
+        spool.append([record(n) for n in range(5)])
+        read, position = spool.read(2)
+        spool.commit(position, len(read))
+        spool.read(2)  # read but never committed
+        spool.close()
+
+        reopened = self.open_spool()
+        self.assertEqual(reopened.uncommitted, 3)
+        read, _ = reopened.read(10)
+        self.assertEqual([r.message_id for r in read], ["m2", "m3", "m4"])
+
+    def test_torn_write_is_discarded_on_replay(self):
+        spool = self.open_spool()
+        spool.append([record(n) for n in range(3)])
+        spool.close()
+
+        # Corrupt the body of the last entry, as a crash mid-write would
+        path = os.path.join(self.directory, self.segment_files()[0])
+        with open(path, "r+b") as f:
+            data = f.read()
+            offset = 0
+            for _ in range(2):
+                length, _ = struct.unpack_from("<II", data, offset)
+                offset += 8 + length
+            f.seek(offset + 12)
+            f.write(b"\xff\xff")
+
+        reopened = self.open_spool()
+        self.assertEqual(reopened.uncommitted, 2)
+        # New appends go where the torn entry was
+        reopened.append([record(9)])
+        read, _ = reopened.read(10)
+        self.assertEqual([r.message_id for r in read], ["m0", "m1", "m9"])
+
+    def test_directory_is_locked(self):
+        self.open_spool()
+        with self.assertRaises(RuntimeError):
+            TelemetrySpool(self.directory, segment_bytes=SEGMENT_BYTES).open()
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import SimpleTestCase
+
+from apps.devices.timestamps import parse_timestamp, reading_time
+
+UTC = dt_timezone.utc
+
+
+class ParseTimestampTests(SimpleTestCase):
+    def test_epoch_milliseconds_and_seconds(self):
+        expected = datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+        self.assertEqual(parse_timestamp(1714564800000), expected)
+        self.assertEqual(parse_timestamp(1714564800), expected)
+        self.assertEqual(parse_timestamp(1714564800.5), expected + timedelta(milliseconds=500))
+        self.assertEqual(parse_timestamp("1714564800000"), expected)
+
+    def test_iso_strings(self):
+        self.assertEqual(
+            parse_timestamp("2024-05-01T14:00:00+02:00"), datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+        )
+        # Naive strings are UTC
+        self.assertEqual(parse_timestamp("2024-05-01T12:00:00"), datetime(2024, 5, 1, 12, 0, tzinfo=UTC))
+
+    def test_unparseable_values(self):
+        for value in (None, True, "", "  ", "yesterday", "2024-13-45T00:00:00", 1e20, {"ts": 1}):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_timestamp(value))
+
+
+class ReadingTimeTests(SimpleTestCase):
+    received_at = datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+
+    def test_without_timestamp_uses_arrival(self):
+        self.assertEqual(reading_time({"temperature": 21}, self.received_at), (self.received_at, False))
+
+    def test_device_time_within_window(self):
+        measured = self.received_at - timedelta(hours=1)
+        self.assertEqual(
+            reading_time({"ts": int(measured.timestamp() * 1000)}, self.received_at), (measured, False)
+        )
+        self.assertEqual(reading_time({"timestamp": measured.isoformat()}, self.received_at), (measured, False))
+
+    def test_out_of_window_times_are_rejected(self):
+        future = self.received_at + timedelta(minutes=10)
+        stale = self.received_at - timedelta(days=8)
+        for payload in ({"ts": future.isoformat()}, {"ts": stale.isoformat()}, {"ts": "garbage"}):
+            with self.subTest(payload=payload):
+                self.assertEqual(reading_time(payload, self.received_at), (self.received_at, True))
+
+    def test_skew_window_is_configurable(self):
+        future = self.received_at + timedelta(minutes=10)
+        self.assertEqual(
+            reading_time({"ts": future.isoformat()}, self.received_at, max_future_skew=3600), (future, False)
+        )
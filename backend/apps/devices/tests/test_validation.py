@@ -0,0 +1,25 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.devices import validation
+from apps.devices.models import DeviceModelDefinition
+
+
+class ValidatorCacheTests(TestCase):
+    def setUp(self):
+        validation.forget()
+        self.addCleanup(validation.forget)
+
+    def test_schema_edited_elsewhere_is_picked_up(self):
+        model = DeviceModelDefinition.objects.create(
+            model_id="thermo", name="Thermometer", schema={"required": ["temperature"]}
+        )
+        self.assertFalse(model.validate_payload({"humidity": 40}))
+
+        # Saved by another process: no invalidation reaches this one
+        DeviceModelDefinition.objects.filter(pk=model.pk).update(
+            schema={"required": ["humidity"]}, updated_at=timezone.now()
+        )
+        model.refresh_from_db()
+        self.assertTrue(model.validate_payload({"humidity": 40}))
+        self.assertEqual(len(validation._validators), 1)
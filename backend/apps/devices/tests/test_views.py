@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.devices.models import Device, DeviceState, Gateway, TelemetryRollup
+from apps.devices.serializers import DeviceSerializer
+from apps.devices.views import TelemetryRollupViewSet
+
+
+class TelemetryRollupViewSetTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner", password="x")
+        gateway = Gateway.objects.create(owner=self.user, gateway_id="gw-1")
+        device = Device.objects.create(gateway=gateway, device_id="dev-1")
+        bucket = (timezone.now() - timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+        for metric, value in (("temperature", 20.0), ("humidity", 40.0)):
+            TelemetryRollup.objects.create(
+                device=device, metric=metric, resolution=TelemetryRollup.RESOLUTION_HOUR, bucket=bucket,
+                count=1, sum=value, min=value, max=value, last=value, last_at=bucket,
+            )
+        self.view = TelemetryRollupViewSet.as_view({"get": "list"})
+
+    def get(self, **params):
+        request = APIRequestFactory().get("/api/rollups/", params)
+        force_authenticate(request, user=self.user)
+        return self.view(request)
+
+    def results(self, response):
+        data = response.data
+        return data["results"] if isinstance(data, dict) else data
+
+    def test_range_filter(self):
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        response = self.get(since=since, resolution="1h")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.results(response)), 2)
+
+    def test_ordering(self):
+        for ordering, expected in (("metric", ["humidity", "temperature"]), ("-metric", ["temperature", "humidity"])):
+            with self.subTest(ordering=ordering):
+                response = self.get(resolution="1h", ordering=ordering)
+                self.assertEqual([row["metric"] for row in self.results(response)], expected)
+
+    def test_impossible_dates_return_nothing(self):
+        for params in ({"since": "2024-13-45T00:00:00"}, {"until": "2024-02-30T00:00:00"}):
+            with self.subTest(params=params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.results(response), [])
+
+
+class DeviceSerializerTests(TestCase):
+    def test_reading_fields_come_from_the_state(self):
+        user = get_user_model().objects.create_user(username="owner", password="x")
+        device = Device.objects.create(gateway=Gateway.objects.create(owner=user, gateway_id="gw-1"), device_id="dev-1")
+        self.assertEqual(DeviceSerializer(device).data["readings_received"], 0)
+
+        now = timezone.now()
+        DeviceState.objects.create(device=device, payload={}, timestamp=now, received_at=now, reading_count=7)
+        data = DeviceSerializer(Device.objects.get(pk=device.pk)).data
+        self.assertEqual((data["readings_received"], data["last_telemetry_time"]), (7, now.isoformat()))
@@ -0,0 +1,101 @@
+"""
+Device-supplied reading timestamps.
+
+Gateways buffer readings while offline and devices batch them, so the time a
+message reaches the bridge says little about when it was measured. Payloads
+may carry the measurement time as ``ts`` or ``timestamp``, either epoch
+milliseconds or an ISO 8601 string. Times outside the configured skew
+window are treated as clock errors and replaced by the arrival time.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Optional, Tuple
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_KEYS = ("ts", "timestamp")
+
+# Epoch values below this are taken as seconds rather than milliseconds
+# (1e11 ms is March 1973; 1e11 s is thousands of years away)
+_EPOCH_SECONDS_LIMIT = 1e11
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """
+    Parse an epoch (ms, or seconds) or ISO 8601 timestamp into an aware datetime.
+
+    Naive ISO strings are taken as UTC. Returns ``None`` for anything that
+    cannot be parsed.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        seconds = value / 1000 if abs(value) >= _EPOCH_SECONDS_LIMIT else value
+        try:
+            return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return None
+        try:
+            number = float(text)
+        except ValueError:
+            pass
+        else:
+            return parse_timestamp(number)
+        try:
+            parsed = parse_datetime(text)
+        except ValueError:
+            return None
+        if parsed is None:
+            return None
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+    return None
+
+
+def reading_time(
+    payload: dict,
+    received_at: datetime,
+    max_future_skew: float = 300,
+    max_age: float = 7 * 24 * 3600,
+) -> Tuple[datetime, bool]:
+    """
+    Pick the timestamp to store for a reading.
+
+    Args:
+        payload: Decoded telemetry payload
+        received_at: When the bridge received the message
+        max_future_skew: Seconds a device clock may run ahead of ours
+        max_age: Seconds a buffered reading may lag behind its arrival
+
+    Returns:
+        ``(timestamp, rejected)`` where ``rejected`` is true when the payload
+        carried a timestamp that was unparseable or outside the skew window,
+        in which case ``received_at`` is used instead.
+    """
+    for key in TIMESTAMP_KEYS:
+        if key in payload:
+            value = payload[key]
+            break
+    else:
+        return received_at, False
+
+    parsed = parse_timestamp(value)
+    if parsed is None:
+        logger.debug(f"Unparseable device timestamp {value!r}; using arrival time")
+        return received_at, True
+    if parsed > received_at + timedelta(seconds=max_future_skew):
+        logger.debug(f"Device timestamp {parsed.isoformat()} is in the future; using arrival time")
+        return received_at, True
+    if parsed < received_at - timedelta(seconds=max_age):
+        logger.debug(f"Device timestamp {parsed.isoformat()} is too old; using arrival time")
+        return received_at, True
+    return parsed, False
@@ -1,11 +1,12 @@
 from rest_framework.routers import DefaultRouter
 
-from .views import DeviceViewSet, GatewayViewSet, TelemetryViewSet
+from .views import DeviceViewSet, GatewayViewSet, TelemetryRollupViewSet, TelemetryViewSet
 
 router = DefaultRouter()
 router.register(r"gateways", GatewayViewSet, basename="gateway")
 router.register(r"devices", DeviceViewSet, basename="device")
 router.register(r"telemetry", TelemetryViewSet, basename="telemetry")
+router.register(r"rollups", TelemetryRollupViewSet, basename="rollup")
 
 urlpatterns = router.urls
 
@@ -0,0 +1,119 @@
+"""
+Telemetry payload validation against device model schemas.
+
+A :class:`DeviceModelDefinition` schema is a JSON Schema. Compiling one is
+far more expensive than checking a payload with it, so each schema is
+compiled once per revision of its definition, ``(model_id, version,
+updated_at)``. Saving the definition bumps ``updated_at``, so every process
+picks up an edited schema on its next lookup without listening for
+invalidations; the registry's ``"model"`` invalidation only frees memory
+early through :func:`forget`.
+
+Ingest validates each flushed batch with :func:`validate_batch` and stores
+the result on the row, so API reads never re-run the schema.
+
+``jsonschema`` is optional: without it only the schema's ``required`` keys
+are checked, as before.
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import jsonschema
+except ImportError:  # pragma: no cover - optional dependency
+    jsonschema = None
+
+if TYPE_CHECKING:
+    from .ingestion import TelemetryRecord
+
+logger = logging.getLogger(__name__)
+
+PayloadValidator = Callable[[Dict[str, Any]], bool]
+
+_lock = threading.Lock()
+_validators: Dict[Tuple[str, str, Optional[datetime]], PayloadValidator] = {}
+
+
+def _accept_all(payload: Dict[str, Any]) -> bool:
+    return True
+
+
+def check_schema(schema: Dict[str, Any]) -> Optional[str]:
+    """Return why ``schema`` is not a usable JSON Schema, or ``None`` if it is."""
+    if jsonschema is None or not schema:
+        return None
+    try:
+        jsonschema.validators.validator_for(schema, default=jsonschema.Draft202012Validator).check_schema(schema)
+    except jsonschema.SchemaError as e:
+        return e.message
+    return None
+
+
+def compile_schema(schema: Dict[str, Any]) -> PayloadValidator:
+    """Compile ``schema`` into a callable returning whether a payload is valid."""
+    if not schema:
+        return _accept_all
+
+    if jsonschema is not None:
+        cls = jsonschema.validators.validator_for(schema, default=jsonschema.Draft202012Validator)
+        try:
+            cls.check_schema(schema)
+            return cls(schema).is_valid
+        except jsonschema.SchemaError as e:
+            logger.warning(f"Invalid device model schema, checking required keys only: {e.message}")
+
+    required = tuple(schema.get("required", ()))
+    return lambda payload: all(field in payload for field in required)
+
+
+def validator_for(
+    model_id: str, version: str, updated_at: Optional[datetime], schema: Dict[str, Any]
+) -> PayloadValidator:
+    """Return the cached validator of a model definition revision, compiling it on first use."""
+    key = (model_id, version or "", updated_at)
+    validator = _validators.get(key)
+    if validator is None:
+        validator = compile_schema(schema)
+        with _lock:
+            # Earlier revisions of the definition are not looked up again
+            for stale in [stale for stale in _validators if stale[0] == model_id]:
+                del _validators[stale]
+            _validators[key] = validator
+    return validator
+
+
+def forget(model_id: Optional[str] = None) -> None:
+    """Drop the cached validators of ``model_id`` (every version), or all of them."""
+    with _lock:
+        if model_id is None:
+            _validators.clear()
+            return
+        for key in [key for key in _validators if key[0] == model_id]:
+            del _validators[key]
+
+
+def validate_batch(records: Sequence["TelemetryRecord"]) -> List[bool]:
+    """
+    Validate a batch of telemetry records against their devices' schemas.
+
+    Validators are looked up once per model definition in the batch rather
+    than once per record. Records of devices without a model definition are
+    valid.
+
+    Returns:
+        One result per record, in order.
+    """
+    from .registry import registry
+
+    validators: Dict[Optional[int], PayloadValidator] = {None: _accept_all}
+    results = []
+    for record in records:
+        model_pk = record.model_definition_id
+        validator = validators.get(model_pk)
+        if validator is None:
+            validator = validators[model_pk] = registry.get_model(model_pk).validator
+        results.append(validator(record.payload))
+    return results
@@ -6,18 +6,21 @@ telemetry data, and device model definitions.
 """
 
 import logging
+from datetime import timezone as dt_timezone
 from typing import Optional
 
-from rest_framework import permissions, viewsets, status
+from rest_framework import filters, permissions, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 
-from .models import Device, Gateway, Telemetry, DeviceModelDefinition
-from .serializers import DeviceSerializer, GatewaySerializer, TelemetrySerializer, DeviceModelDefinitionSerializer
-from . import mqtt_worker
+from .models import Device, Gateway, Telemetry, TelemetryRollup, DeviceModelDefinition
+from .serializers import (
+    DeviceSerializer, GatewaySerializer, TelemetrySerializer, TelemetryRollupSerializer, DeviceModelDefinitionSerializer
+)
+from . import mqtt_worker, rollups
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +41,8 @@ class IsOwner(permissions.BasePermission):
             return obj.gateway.owner_id == request.user.id
         elif isinstance(obj, Telemetry):
             return obj.device.gateway.owner_id == request.user.id
+        elif isinstance(obj, TelemetryRollup):
+            return obj.device.gateway.owner_id == request.user.id
         return False
 
 
@@ -73,7 +78,7 @@ class GatewayViewSet(viewsets.ModelViewSet):
         """
         try:
             gateway = self.get_object()
-            devices = gateway.devices.all().select_related('model_definition').order_by("name", "device_id")
+            devices = gateway.devices.all().select_related('gateway', 'model_definition', 'state').order_by("name", "device_id")
             serializer = DeviceSerializer(devices, many=True)
             
             logger.debug(f"Retrieved {len(devices)} devices for gateway {gateway.gateway_id}")
@@ -92,7 +97,9 @@ class GatewayViewSet(viewsets.ModelViewSet):
         Trigger device discovery on a gateway.
         
         Sends an MQTT message to the gateway requesting it to announce
-        all connected devices.
+        all connected devices. The gateway answers on
+        ``gateways/{gateway_id}/discovery`` with its full inventory, which
+        the MQTT bridge upserts in one statement.
         """
         try:
             gateway = self.get_object()
@@ -103,12 +110,8 @@ class GatewayViewSet(viewsets.ModelViewSet):
                 "request_id": f"discover_{gateway.gateway_id}_{int(timezone.now().timestamp())}"
             }
             
-            # Ensure MQTT bridge is running
-            if mqtt_worker.bridge is None:
-                mqtt_worker.start_bridge_if_enabled()
-            
-            if mqtt_worker.bridge:
-                mqtt_worker.bridge.publish(topic, payload, qos=1)
+            publisher = mqtt_worker.get_publisher()
+            if publisher and publisher.publish(topic, payload, qos=1):
                 logger.info(f"Device discovery request sent to gateway {gateway.gateway_id}")
                 return Response({
                     "status": "sent",
@@ -116,7 +119,7 @@ class GatewayViewSet(viewsets.ModelViewSet):
                     "request_id": payload["request_id"]
                 })
             else:
-                logger.error(f"MQTT bridge not available for discovery request to {gateway.gateway_id}")
+                logger.error(f"MQTT publisher not available for discovery request to {gateway.gateway_id}")
                 return Response(
                     {"error": "MQTT service unavailable"}, 
                     status=status.HTTP_503_SERVICE_UNAVAILABLE
@@ -209,9 +212,8 @@ class DeviceViewSet(viewsets.ModelViewSet):
         queryset = Device.objects.filter(
             gateway__owner=self.request.user
         ).select_related(
-            'gateway', 'model_definition'
-        ).prefetch_related(
-            'telemetry'
+            # Current readings come from the state row; the telemetry history is never read
+            'gateway', 'model_definition', 'state'
         ).order_by('gateway__name', 'name', 'device_id')
         
         # Filter by gateway if specified
@@ -428,15 +430,11 @@ class DeviceViewSet(viewsets.ModelViewSet):
     def _send_mqtt_command(self, topic: str, payload: dict) -> bool:
         """Send command via MQTT and return success status."""
         try:
-            # Ensure MQTT bridge is running
-            if mqtt_worker.bridge is None:
-                mqtt_worker.start_bridge_if_enabled()
-            
-            if mqtt_worker.bridge:
-                mqtt_worker.bridge.publish(topic, payload, qos=2)
+            publisher = mqtt_worker.get_publisher()
+            if publisher and publisher.publish(topic, payload, qos=2):
                 return True
             else:
-                logger.warning("MQTT bridge not available for command sending")
+                logger.warning("MQTT publisher not available for command sending")
                 return False
                 
         except Exception as e:
@@ -504,7 +502,7 @@ class TelemetryViewSet(viewsets.ReadOnlyModelViewSet):
     
     serializer_class = TelemetrySerializer
     permission_classes = [permissions.IsAuthenticated, IsOwner]
-    ordering_fields = ['timestamp', 'device']
+    ordering_fields = ['timestamp', 'received_at', 'device']
     ordering = ['-timestamp']
 
     def get_queryset(self):
@@ -564,3 +562,68 @@ class TelemetryViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
+class TelemetryRollupViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet for downsampled telemetry.
+    
+    Serves per-metric min/max/avg/count/last over 1-minute, 1-hour or 1-day
+    buckets, so charts over long ranges read one row per bucket instead of
+    every raw reading. Without ``resolution`` the coarsest one that still
+    gives enough points for the ``since``/``until`` range is used.
+    """
+    
+    serializer_class = TelemetryRollupSerializer
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+    # Sorted by ?ordering= (oldest bucket first by default), applied after get_queryset
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['bucket', 'metric', 'device']
+    ordering = ['bucket']
+
+    def get_queryset(self):
+        """Return rollups of devices owned by the current user."""
+        from django.utils.dateparse import parse_datetime
+
+        queryset = TelemetryRollup.objects.filter(device__gateway__owner=self.request.user)
+        
+        device_id = self.request.query_params.get('device', None)
+        if device_id:
+            try:
+                queryset = queryset.filter(device_id=int(device_id))
+            except ValueError:
+                logger.warning(f"Invalid device_id filter: {device_id}")
+                return queryset.none()
+        
+        metrics = self.request.query_params.get('metric', None)
+        if metrics:
+            queryset = queryset.filter(metric__in=[m.strip() for m in metrics.split(',') if m.strip()])
+        
+        try:
+            since, until = (
+                parse_datetime(self.request.query_params.get(param, '') or '')
+                for param in ('since', 'until')
+            )
+        except ValueError:
+            # Well-formed but impossible dates such as month 13
+            logger.warning(
+                f"Invalid since/until filter: {self.request.query_params.get('since')}, "
+                f"{self.request.query_params.get('until')}"
+            )
+            return queryset.none()
+        # Naive times are taken as UTC, like device timestamps
+        since, until = (
+            timezone.make_aware(value, dt_timezone.utc) if value and timezone.is_naive(value) else value
+            for value in (since, until)
+        )
+        resolution = self.request.query_params.get('resolution', None)
+        if resolution not in rollups.RESOLUTIONS:
+            if resolution:
+                logger.warning(f"Invalid resolution filter: {resolution}")
+            resolution = rollups.choose_resolution(since, until)
+        queryset = queryset.filter(resolution=resolution)
+        
+        # Include the bucket that since falls into
+        if since:
+            queryset = queryset.filter(bucket__gte=rollups.bucket_start(since, resolution))
+        if until:
+            queryset = queryset.filter(bucket__lte=until)
+        return queryset
@@ -27,10 +27,10 @@ application = ProtocolTypeRouter({
 })
 
 
-# Start MQTT bridge on ASGI import (idempotent)
+# Start whatever MQTT['ROLE'] needs in this process (idempotent; nothing for "publish")
 try:  # pragma: no cover
-    from apps.devices.mqtt_worker import start_bridge_if_enabled  # type: ignore
-    start_bridge_if_enabled()
+    from apps.devices.mqtt_worker import start_for_role  # type: ignore
+    start_for_role()
 except Exception:
     pass
 
@@ -207,6 +207,89 @@ MQTT = {
     "ENABLE": env("ENABLE_MQTT_WORKER"),
     "KEEPALIVE": 60,
     "QOS": 1,
+    # "publish": API processes only publish commands; "ingest": dedicated bridge workers;
+    # "all": subscribe and ingest inside the API process too (single-process setups)
+    "ROLE": os.environ.get("MQTT_ROLE", "publish"),
+    "PUBLISH_CONNECT_TIMEOUT": 2.0,  # seconds the first publish waits for the broker
+    # Batched telemetry ingestion: flush after BATCH_SIZE rows or FLUSH_INTERVAL seconds
+    "INGEST": {
+        "BATCH_SIZE": int(os.environ.get("MQTT_INGEST_BATCH_SIZE", 500)),
+        "FLUSH_INTERVAL": float(os.environ.get("MQTT_INGEST_FLUSH_INTERVAL", 0.05)),
+        "MAX_PENDING": int(os.environ.get("MQTT_INGEST_MAX_PENDING", 50000)),
+        "MAX_BATCH_READINGS": 5000,  # largest gateways/<id>/batch array accepted
+        # Copy numeric fields declared in device model schemas into the narrow TelemetryValue table
+        "EXTRACT_METRICS": env.bool("MQTT_EXTRACT_METRICS", default=True),
+        # Load flushed batches with COPY through a staging table (PostgreSQL with psycopg2 only)
+        "COPY": env.bool("MQTT_INGEST_COPY", default=True),
+    },
+    # Device/gateway last-seen times are coalesced in memory and written every FLUSH_INTERVAL seconds
+    "LIVENESS": {
+        "FLUSH_INTERVAL": float(os.environ.get("MQTT_LIVENESS_FLUSH_INTERVAL", 5.0)),
+    },
+    # Device-supplied reading times ("ts"/"timestamp") outside this window fall back to arrival time
+    "TIMESTAMPS": {
+        "MAX_FUTURE_SKEW": int(os.environ.get("MQTT_TS_MAX_FUTURE_SKEW", 300)),  # seconds ahead of server clock
+        "MAX_AGE": int(os.environ.get("MQTT_TS_MAX_AGE", 7 * 24 * 3600)),  # seconds a buffered reading may lag
+    },
+    # Token buckets per device, gateway and owner (readings/s), checked before any DB work.
+    # Device limits can be overridden per device model definition; RATE 0 disables a level.
+    "RATE_LIMITS": {
+        "ENABLED": env.bool("MQTT_RATE_LIMITS_ENABLED", default=True),
+        "MODE": os.environ.get("MQTT_RATE_LIMIT_MODE", "drop"),  # "drop" or "downsample"
+        "DOWNSAMPLE_INTERVAL": 1.0,  # downsample: keep one over-limit reading per device per interval
+        # Bursts leave room for a gateway replaying readings it buffered while offline
+        "DEVICE": {"RATE": float(os.environ.get("MQTT_DEVICE_RATE", 50)), "BURST": 500},
+        "GATEWAY": {"RATE": float(os.environ.get("MQTT_GATEWAY_RATE", 1000)), "BURST": 10000},
+        "OWNER": {"RATE": float(os.environ.get("MQTT_OWNER_RATE", 5000)), "BURST": 50000},
+    },
+    # Recently seen reading identities kept in memory; older redeliveries hit the DB unique constraint
+    "DEDUP": {
+        "LRU_SIZE": int(os.environ.get("MQTT_DEDUP_LRU_SIZE", 100000)),
+    },
+    # "thread": paho loop() in a thread; "asyncio": event-loop bridge with bounded queues and backpressure
+    "ENGINE": os.environ.get("MQTT_ENGINE", "thread"),
+    "ASYNC": {
+        "CONSUMERS": int(os.environ.get("MQTT_ASYNC_CONSUMERS", 4)),  # writer tasks, one queue each
+        "QUEUE_SIZE": int(os.environ.get("MQTT_ASYNC_QUEUE_SIZE", 10000)),
+        "OVERFLOW_LIMIT": 1000,  # per queue, for messages read before reads paused
+        "RESUME_RATIO": 0.5,
+    },
+    # Priority lanes: responses, heartbeats, gateway status and discovery get their own queues
+    # and workers so they never wait behind bulk telemetry. The asyncio engine sizes its
+    # telemetry lane with ASYNC CONSUMERS/QUEUE_SIZE.
+    "LANES": {
+        "ENABLED": env.bool("MQTT_LANES_ENABLED", default=True),
+        "CONTROL": {"WORKERS": int(os.environ.get("MQTT_CONTROL_WORKERS", 2)), "QUEUE_SIZE": 10000},
+        "TELEMETRY": {"WORKERS": int(os.environ.get("MQTT_TELEMETRY_WORKERS", 4)), "QUEUE_SIZE": 10000},
+    },
+    # Write-ahead spool: accepted readings are appended to memory-mapped files before insertion
+    # and replayed after a DB outage or crash. An empty DIR disables it.
+    "SPOOL": {
+        "DIR": os.environ.get("MQTT_SPOOL_DIR", ""),
+        "SEGMENT_MB": 64,
+        "MAX_MB": int(os.environ.get("MQTT_SPOOL_MAX_MB", 1024)),  # ingest blocks once this is spooled
+        "SYNC_INTERVAL": 1.0,  # seconds between msync of the active segment
+        "REPLAY_BATCH_SIZE": 5000,  # rows per insert while draining a backlog
+    },
+    # start_mqtt_bridge --workers N: N processes per host. Every ingest bridge, on any host, subscribes
+    # through $share/<SHARED_GROUP>/ so each message is processed once; an empty group disables it
+    "WORKERS": {
+        "COUNT": int(os.environ.get("MQTT_INGEST_WORKERS", 1)),
+        "SHARED_GROUP": os.environ.get("MQTT_SHARED_GROUP", "aiot"),
+        "REPORT_INTERVAL": 10.0,
+    },
+    # Prometheus text endpoint of the ingest bridge (stage latency histograms, counters);
+    # worker N of start_mqtt_bridge --workers listens on PORT + N. PORT 0 disables it.
+    "METRICS": {
+        "PORT": int(os.environ.get("MQTT_METRICS_PORT", 0)),
+        "HOST": os.environ.get("MQTT_METRICS_HOST", "0.0.0.0"),
+    },
+    # In-process device registry used to resolve topics without a query per message
+    "REGISTRY": {
+        "NEGATIVE_TTL": 60,  # seconds an unknown device/gateway id stays cached
+        "INVALIDATION_CHANNEL": "aiot:device-registry",
+        "REDIS_URL": env("REDIS_URL"),
+    },
 }
 
 # JWT Authentication settings
@@ -231,6 +314,43 @@ CELERY_ENABLE_UTC = True
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes
+CELERY_BEAT_SCHEDULE = {
+    "manage-telemetry-partitions": {
+        "task": "apps.devices.tasks.manage_telemetry_partitions",
+        "schedule": 60 * 60,  # hourly
+    },
+    "update-telemetry-rollups": {
+        "task": "apps.devices.tasks.update_telemetry_rollups",
+        "schedule": 60,
+    },
+}
+
+# Time-range partitions of the telemetry table (PostgreSQL only, see apps/devices/partitions.py)
+TELEMETRY_PARTITIONS = {
+    # "day" or "week"
+    "INTERVAL": env.str("TELEMETRY_PARTITION_INTERVAL", default="day"),
+    # Partitions kept ready ahead of the current one
+    "PREMAKE": env.int("TELEMETRY_PARTITION_PREMAKE", default=7),
+    # Partitions entirely older than this are expired; 0 keeps everything
+    "RETENTION_DAYS": env.int("TELEMETRY_RETENTION_DAYS", default=0),
+    # "detach" keeps expired partitions as plain tables for archiving, "drop" deletes them
+    "EXPIRE": env.str("TELEMETRY_PARTITION_EXPIRE", default="detach"),
+}
+
+# 1-minute/1-hour/1-day rollups of numeric telemetry (see apps/devices/rollups.py)
+TELEMETRY_ROLLUPS = {
+    # Raw readings consumed per transaction, and transactions per run
+    "BATCH_SIZE": env.int("TELEMETRY_ROLLUP_BATCH_SIZE", default=5000),
+    "MAX_BATCHES": env.int("TELEMETRY_ROLLUP_MAX_BATCHES", default=100),
+    # Readings received more recently are left for the next run (bridge insert buffers)
+    "LAG_SECONDS": env.int("TELEMETRY_ROLLUP_LAG_SECONDS", default=120),
+    # Per resolution; 0 keeps rollups forever
+    "RETENTION_DAYS": {
+        "1m": env.int("TELEMETRY_ROLLUP_MINUTE_RETENTION_DAYS", default=30),
+        "1h": env.int("TELEMETRY_ROLLUP_HOUR_RETENTION_DAYS", default=730),
+        "1d": 0,
+    },
+}
 
 # Security settings for production
 if not DEBUG:
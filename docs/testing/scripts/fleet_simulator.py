@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+Virtual Device Fleet Simulator
+
+Runs thousands of virtual gateways and devices on one asyncio event loop and
+publishes realistic MQTT traffic to the platform:
+
+- telemetry on ``devices/{id}/data`` (or ``gateways/{id}/batch`` with --batch),
+  generated per device type like the shell simulators (temperature, motion,
+  switch, door, light, camera)
+- heartbeats on ``devices/{id}/heartbeat`` and ``gateways/{id}/status``
+- responses on ``devices/{id}/response`` to commands sent from the API to
+  ``devices/{id}/commands``
+- the gateway's device inventory on ``gateways/{id}/discovery`` when the API
+  asks for discovery on ``gateways/{id}/discover``
+
+With --topics v2 device messages use the gateway-qualified layout
+``gw/{gateway_id}/dev/{device_id}/data|heartbeat|response`` instead.
+
+Every device draws from its own random generator seeded from --seed and its
+id, so two runs with the same arguments publish the same readings.
+
+Devices are auto-created by the bridge from their first message, but their
+gateways must exist: pass --provision to create them through the API first.
+
+Usage:
+    python fleet_simulator.py --gateways 500 --devices-per-gateway 40 --duration 600
+    python fleet_simulator.py --gateways 50 --provision --username admin --password admin123
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import signal
+import time
+import urllib.error
+import urllib.request
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+# ================================================================
+# Device profiles
+# ================================================================
+
+
+class DeviceProfile:
+    """Payload generator and command handler of one kind of device."""
+
+    kind = "sensor"
+    device_type = "sensor"  # Device.type on the platform
+    model = "GENERIC"
+    interval = 10.0  # seconds between readings
+
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+
+    def reading(self, now: float) -> Optional[dict]:
+        """Return the next reading, or ``None`` when the device stays quiet this tick."""
+        raise NotImplementedError
+
+    def command(self, action: str, payload: dict) -> Tuple[str, dict]:
+        """Apply a command; returns ``(status, resulting state)``."""
+        return "unsupported", {}
+
+
+class TemperatureSensor(DeviceProfile):
+    kind = "temperature"
+    model = "DHT22"
+    interval = 10.0
+
+    def __init__(self, rng: random.Random) -> None:
+        super().__init__(rng)
+        self.temperature = rng.uniform(20, 26)
+
+    def reading(self, now: float) -> Optional[dict]:
+        # Random walk around 23 °C
+        self.temperature += self.rng.uniform(-0.3, 0.3) + (23 - self.temperature) * 0.05
+        return {
+            "temperature": round(self.temperature, 1),
+            "humidity": self.rng.randint(40, 79),
+            "battery": self.rng.randint(80, 99),
+            "signal_strength": -30 - self.rng.randint(0, 29),
+        }
+
+
+class MotionSensor(DeviceProfile):
+    kind = "motion"
+    model = "PIR-HC-SR501"
+    interval = 8.0
+
+    def __init__(self, rng: random.Random) -> None:
+        super().__init__(rng)
+        self.motion = False
+
+    def reading(self, now: float) -> Optional[dict]:
+        # 20% chance of motion; a detection is cleared on the next tick
+        if self.motion:
+            self.motion = False
+            return {"motion": False}
+        if self.rng.random() >= 0.2:
+            return None
+        self.motion = True
+        return {"motion": True, "confidence": self.rng.randint(70, 99), "battery": self.rng.randint(60, 99)}
+
+
+class SmartSwitch(DeviceProfile):
+    kind = "switch"
+    device_type = "switch"
+    model = "SONOFF-BASIC"
+    interval = 15.0
+
+    def __init__(self, rng: random.Random) -> None:
+        super().__init__(rng)
+        self.state = "off"
+        self.energy = rng.randint(0, 999)
+
+    def reading(self, now: float) -> Optional[dict]:
+        if self.rng.random() < 0.1:
+            self.state = "on" if self.state == "off" else "off"
+        power = round(15 + self.rng.randint(0, 19), 1) if self.state == "on" else 0
+        voltage = round(220 + self.rng.uniform(-10, 10), 1)
+        self.energy += power * self.interval / 3600
+        return {
+            "state": self.state,
+            "power": power,
+            "voltage": voltage,
+            "current": round(power / voltage, 2),
+            "total_energy": round(self.energy, 2),
+            "wifi_signal": -40 - self.rng.randint(0, 29),
+        }
+
+    def command(self, action: str, payload: dict) -> Tuple[str, dict]:
+        if action != "toggle":
+            return "unsupported", {"state": self.state}
+        requested = payload.get("state")
+        if requested is None:
+            self.state = "on" if self.state == "off" else "off"
+        else:
+            self.state = "on" if requested in (True, "on", 1) else "off"
+        return "ok", {"state": self.state}
+
+
+class DoorSensor(DeviceProfile):
+    kind = "door"
+    model = "MC-38"
+    interval = 12.0
+
+    def __init__(self, rng: random.Random) -> None:
+        super().__init__(rng)
+        self.state = "closed"
+
+    def reading(self, now: float) -> Optional[dict]:
+        # Reports only when the door opens or closes (5% chance per tick)
+        if self.rng.random() >= 0.05:
+            return None
+        self.state = "open" if self.state == "closed" else "closed"
+        return {
+            "state": self.state,
+            "battery": self.rng.randint(70, 99),
+            "tamper": False,
+            "signal_strength": -35 - self.rng.randint(0, 24),
+        }
+
+
+class LightSensor(DeviceProfile):
+    kind = "light"
+    model = "BH1750"
+    interval = 30.0
+
+    def reading(self, now: float) -> Optional[dict]:
+        hour = time.localtime(now).tm_hour
+        lux = 100 + self.rng.randint(0, 899) if 6 <= hour <= 18 else self.rng.randint(0, 49)
+        return {"illuminance": lux, "uv_index": self.rng.randint(0, 10), "battery": self.rng.randint(75, 99)}
+
+
+class Camera(DeviceProfile):
+    kind = "camera"
+    device_type = "camera"
+    model = "ESP32-CAM"
+    interval = 20.0
+
+    def __init__(self, rng: random.Random) -> None:
+        super().__init__(rng)
+        self.recording = False
+        self.quality = "medium"
+        self.uptime = rng.randint(0, 86399)
+
+    def reading(self, now: float) -> Optional[dict]:
+        self.uptime += int(self.interval)
+        return {
+            "status": "online",
+            "recording": self.recording,
+            "resolution": {"low": "480p", "medium": "720p", "high": "1080p"}[self.quality],
+            "fps": 30,
+            "storage_used": self.rng.randint(10, 89),
+            "motion_detected": self.rng.random() < 0.125,
+            "uptime": self.uptime,
+        }
+
+    def command(self, action: str, payload: dict) -> Tuple[str, dict]:
+        if action in ("start_recording", "stop_recording"):
+            self.recording = action == "start_recording"
+        elif action == "set_quality" and payload.get("quality") in ("low", "medium", "high"):
+            self.quality = payload["quality"]
+        elif action != "take_snapshot":
+            return "unsupported", {}
+        return "ok", {"recording": self.recording, "quality": self.quality}
+
+
+PROFILES = {profile.kind: profile for profile in (
+    TemperatureSensor, MotionSensor, SmartSwitch, DoorSensor, LightSensor, Camera,
+)}
+
+
+class VirtualDevice:
+    def __init__(self, gateway_id: str, device_id: str, profile: DeviceProfile) -> None:
+        self.gateway_id = gateway_id
+        self.device_id = device_id
+        self.profile = profile
+        self.sequence = 0
+        self.started = time.time()
+
+    def topic(self, event: str, scheme: str) -> str:
+        if scheme == "v2":
+            return f"gw/{self.gateway_id}/dev/{self.device_id}/{event}"
+        return f"devices/{self.device_id}/{event}"
+
+    def identity(self) -> dict:
+        """Fields the bridge uses to auto-create the device from a message."""
+        return {
+            "gateway_id": self.gateway_id,
+            "type": self.profile.device_type,
+            "model": self.profile.model,
+            "name": f"{self.profile.kind.title()} {self.device_id}",
+        }
+
+
+# ================================================================
+# Simulator
+# ================================================================
+
+
+class FleetSimulator:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.clients: List[mqtt.Client] = []
+        self.gateways: Dict[str, List[VirtualDevice]] = {}
+        self.devices: Dict[str, VirtualDevice] = {}
+        self.pending_batches: Dict[str, List[dict]] = {}
+        self.sent = Counter()
+        self.command_rng = random.Random(f"{args.seed}:commands")
+        self.stopping = asyncio.Event()
+
+        kinds = [kind.strip() for kind in args.types.split(",") if kind.strip()]
+        unknown = set(kinds) - set(PROFILES)
+        if unknown:
+            raise SystemExit(f"Unknown device types: {', '.join(sorted(unknown))} (choose from {', '.join(PROFILES)})")
+
+        for g in range(args.gateways):
+            gateway_id = f"{args.prefix}-GW-{g:05d}"
+            devices = []
+            for d in range(args.devices_per_gateway):
+                kind = kinds[d % len(kinds)]
+                device_id = f"{gateway_id}-{kind.upper()}-{d:03d}"
+                rng = random.Random(f"{args.seed}:{device_id}")
+                device = VirtualDevice(gateway_id, device_id, PROFILES[kind](rng))
+                devices.append(device)
+                self.devices[device_id] = device
+            self.gateways[gateway_id] = devices
+            self.pending_batches[gateway_id] = []
+
+    # -- MQTT ----------------------------------------------------------------
+
+    def connect(self) -> None:
+        for index in range(self.args.connections):
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"{self.args.prefix}-sim-{index}")
+            client.max_inflight_messages_set(1000)
+            if index == 0:
+                # One connection listens for commands and discovery requests on behalf of the whole fleet
+                client.on_connect = lambda c, userdata, flags, rc, properties=None: c.subscribe(
+                    [("devices/+/commands", 1), ("gateways/+/discover", 1)]
+                )
+                client.on_message = self._on_command
+            client.connect(self.args.host, self.args.port, 60)
+            client.loop_start()
+            self.clients.append(client)
+
+    def publish(self, gateway_id: str, topic: str, payload, kind: str) -> None:
+        # Every gateway's traffic goes through the same connection, like a real gateway uplink
+        client = self.clients[zlib.crc32(gateway_id.encode()) % len(self.clients)]
+        client.publish(topic, json.dumps(payload), self.args.qos)
+        self.sent[kind] += 1
+
+    def _on_command(self, client, userdata, msg) -> None:
+        # paho network thread; hand over to the event loop
+        self.loop.call_soon_threadsafe(self._handle_command, msg.topic, msg.payload)
+
+    def _handle_command(self, topic: str, raw: bytes) -> None:
+        if topic.startswith("gateways/"):
+            self._handle_discover(topic.split("/")[1], raw)
+            return
+        device = self.devices.get(topic.split("/")[1])
+        if device is None:
+            return
+        try:
+            command = json.loads(raw)
+        except ValueError:
+            return
+        status, state = device.profile.command(command.get("action", ""), command)
+        self.sent["command"] += 1
+        response = {
+            "command_id": command.get("command_id"),
+            "action": command.get("action"),
+            "status": status,
+            "state": state,
+            "ts": int(time.time() * 1000),
+        }
+        # Devices take a moment to act on a command
+        delay = self.command_rng.uniform(0.05, 0.5)
+        self.loop.call_later(delay, self.publish, device.gateway_id, device.topic("response", self.args.topics), response, "response")
+
+    def _handle_discover(self, gateway_id: str, raw: bytes) -> None:
+        devices = self.gateways.get(gateway_id)
+        if devices is None:
+            return
+        try:
+            request = json.loads(raw)
+        except ValueError:
+            return
+        inventory = {
+            "request_id": request.get("request_id"),
+            "devices": [{"device_id": device.device_id, **device.identity()} for device in devices],
+        }
+        self.publish(gateway_id, f"gateways/{gateway_id}/discovery", inventory, "discovery")
+
+    # -- schedules -----------------------------------------------------------
+
+    async def run_device(self, device: VirtualDevice) -> None:
+        profile = device.profile
+        interval = profile.interval * self.args.interval_scale
+        # Spread first readings over one interval so the fleet does not publish in lockstep
+        await asyncio.sleep(profile.rng.uniform(0, interval))
+        next_heartbeat = time.monotonic() + profile.rng.uniform(0, self.args.heartbeat)
+        while not self.stopping.is_set():
+            now = time.time()
+            values = profile.reading(now)
+            if values is not None and not self.args.batch:
+                device.sequence += 1
+                payload = {**device.identity(), **values, "ts": int(now * 1000), "seq": device.sequence}
+                self.publish(device.gateway_id, device.topic("data", self.args.topics), payload, "data")
+            elif values is not None:
+                device.sequence += 1
+                self.pending_batches[device.gateway_id].append({
+                    "device_id": device.device_id, "ts": int(now * 1000), "seq": device.sequence,
+                    "type": profile.device_type, "values": values,
+                })
+
+            if self.args.heartbeat and time.monotonic() >= next_heartbeat:
+                next_heartbeat += self.args.heartbeat
+                payload = {**device.identity(), "status": "online", "uptime": int(now - device.started)}
+                self.publish(device.gateway_id, device.topic("heartbeat", self.args.topics), payload, "heartbeat")
+
+            await asyncio.sleep(interval * profile.rng.uniform(0.9, 1.1))
+
+    async def run_gateway(self, gateway_id: str, devices: List[VirtualDevice]) -> None:
+        rng = random.Random(f"{self.args.seed}:{gateway_id}")
+        started = time.time()
+        await asyncio.sleep(rng.uniform(0, self.args.batch or self.args.heartbeat or 1))
+        next_status = time.monotonic()
+        while not self.stopping.is_set():
+            if self.args.batch and self.pending_batches[gateway_id]:
+                readings, self.pending_batches[gateway_id] = self.pending_batches[gateway_id], []
+                self.publish(gateway_id, f"gateways/{gateway_id}/batch", readings, "batch")
+                self.sent["batch_readings"] += len(readings)
+            if self.args.heartbeat and time.monotonic() >= next_status:
+                next_status += self.args.heartbeat
+                payload = {"status": "online", "devices": len(devices), "uptime": int(time.time() - started)}
+                self.publish(gateway_id, f"gateways/{gateway_id}/status", payload, "status")
+            await asyncio.sleep(self.args.batch or min(self.args.heartbeat or 1, 1))
+
+    async def report(self) -> None:
+        previous, previous_at = Counter(), time.monotonic()
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.args.stats_interval)
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+            current = Counter(self.sent)
+            delta = current - previous
+            messages = sum(count for kind, count in delta.items() if kind not in ("batch_readings", "command"))
+            print(
+                f"[{time.strftime('%H:%M:%S')}] {messages / (now - previous_at):,.0f} msg/s | "
+                + " ".join(f"{kind}={count:,}" for kind, count in sorted(current.items())),
+                flush=True,
+            )
+            previous, previous_at = current, now
+
+    async def run(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self.stopping.set)
+
+        self.connect()
+        print(
+            f"Simulating {len(self.gateways):,} gateways / {len(self.devices):,} devices over "
+            f"{len(self.clients)} connections to {self.args.host}:{self.args.port} (seed {self.args.seed})",
+            flush=True,
+        )
+        tasks = [asyncio.create_task(self.run_device(device)) for device in self.devices.values()]
+        tasks += [asyncio.create_task(self.run_gateway(g, devices)) for g, devices in self.gateways.items()]
+        tasks.append(asyncio.create_task(self.report()))
+        if self.args.duration:
+            self.loop.call_later(self.args.duration, self.stopping.set)
+
+        await self.stopping.wait()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for client in self.clients:
+            client.loop_stop()
+            client.disconnect()
+        print(f"Stopped. Sent: {dict(self.sent)}", flush=True)
+
+
+# ================================================================
+# Gateway provisioning
+# ================================================================
+
+
+def _api(method: str, url: str, body: Optional[dict] = None, token: Optional[str] = None) -> Tuple[int, dict]:
+    request = urllib.request.Request(url, method=method, data=json.dumps(body).encode() if body else None)
+    request.add_header("Content-Type", "application/json")
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        return e.code, {}
+
+
+async def provision(args: argparse.Namespace, gateway_ids: List[str]) -> None:
+    """Create the simulated gateways through the API (existing ones are left alone)."""
+    status, body = _api("POST", f"{args.api}/token/", {"username": args.username, "password": args.password})
+    if status != 200:
+        raise SystemExit(f"Authentication failed ({status})")
+    token = body["access"]
+
+    semaphore = asyncio.Semaphore(args.provision_concurrency)
+    created = Counter()
+
+    async def create(gateway_id: str) -> None:
+        async with semaphore:
+            status, _ = await asyncio.to_thread(
+                _api, "POST", f"{args.api}/devices/gateways/",
+                {"gateway_id": gateway_id, "name": f"Simulated {gateway_id}"}, token,
+            )
+            created["created" if status == 201 else "existing" if status == 400 else f"http_{status}"] += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(create(gateway_id) for gateway_id in gateway_ids))
+    print(f"Provisioned gateways in {time.monotonic() - started:.1f}s: {dict(created)}", flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate a large fleet of IoT gateways and devices over MQTT")
+    parser.add_argument("--host", default="localhost", help="MQTT broker host")
+    parser.add_argument("--port", type=int, default=1883, help="MQTT broker port")
+    parser.add_argument("--gateways", type=int, default=100)
+    parser.add_argument("--devices-per-gateway", type=int, default=10)
+    parser.add_argument("--types", default=",".join(PROFILES), help="Comma-separated device types, assigned round-robin")
+    parser.add_argument("--prefix", default="SIM", help="Prefix of gateway and device ids")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for all payloads and schedules")
+    parser.add_argument("--interval-scale", type=float, default=1.0, help="Multiply every reading interval (0.1 = 10x the load)")
+    parser.add_argument("--heartbeat", type=float, default=60.0, help="Seconds between heartbeats (0 disables them)")
+    parser.add_argument("--batch", type=float, default=0, help="Send readings as gateway batches every N seconds")
+    parser.add_argument(
+        "--topics", choices=["legacy", "v2"], default="legacy",
+        help="Device topic layout: devices/{id}/... or gw/{gateway}/dev/{id}/...",
+    )
+    parser.add_argument("--connections", type=int, default=8, help="MQTT connections shared by the gateways")
+    parser.add_argument("--qos", type=int, choices=[0, 1], default=1)
+    parser.add_argument("--duration", type=float, default=0, help="Stop after N seconds (0 = until Ctrl+C)")
+    parser.add_argument("--stats-interval", type=float, default=10.0)
+    parser.add_argument("--provision", action="store_true", help="Create the gateways through the API first")
+    parser.add_argument("--api", default="http://localhost:8000/api")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--provision-concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    simulator = FleetSimulator(args)
+    if args.provision:
+        asyncio.run(provision(args, list(simulator.gateways)))
+    asyncio.run(simulator.run())
+
+
+if __name__ == "__main__":
+    main()
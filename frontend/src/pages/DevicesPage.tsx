@@ -13,6 +13,7 @@ type Device = {
   is_online: boolean
   model_definition?: { model_id: string, name: string }
   model_schema?: any
+  state?: { payload: any; timestamp: string; last_values: any } | null
 }
 
 type Telemetry = { id: number; device: number; timestamp: string; payload: any }
@@ -43,22 +44,17 @@ export default function DevicesPage() {
         setLoading(true)
         setError(null)
         
-        // Load devices
+        // Load devices; each carries its latest state, so no telemetry query is needed
         const devicesResponse = await api.get(`/devices/devices/`)
-        setDevices(devicesResponse.data.results || [])
+        const deviceList: Device[] = devicesResponse.data.results || []
+        setDevices(deviceList)
         
-        // Load latest telemetry for each device
-        const telemetryResponse = await api.get(`/devices/telemetry/`)
         const telemetryByDevice: { [deviceId: number]: Telemetry } = {}
-        
-        if (telemetryResponse.data.results && Array.isArray(telemetryResponse.data.results)) {
-          telemetryResponse.data.results.forEach((item: Telemetry) => {
-            if (item && item.device && (!telemetryByDevice[item.device] || 
-                new Date(item.timestamp) > new Date(telemetryByDevice[item.device].timestamp))) {
-              telemetryByDevice[item.device] = item
-            }
-          })
-        }
+        deviceList.forEach(d => {
+          if (d.state) {
+            telemetryByDevice[d.id] = { id: 0, device: d.id, timestamp: d.state.timestamp, payload: d.state.last_values }
+          }
+        })
         
         setLatestTelemetry(telemetryByDevice)
       } catch (error) {